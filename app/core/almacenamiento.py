@@ -0,0 +1,97 @@
+import os
+import shutil
+from pathlib import Path
+from app.core import config
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+# Las claves incluyen un identificador único, así que su contenido nunca cambia
+CACHE_CONTROL_INMUTABLE = "public, max-age=31536000, immutable"
+
+
+class AlmacenLocal:
+    """Guarda los archivos en un directorio local; se sirven desde la ruta /media."""
+
+    def __init__(self, directorio: str, url_base: str):
+        self.directorio = Path(directorio).resolve()
+        self.url_base = url_base
+
+    def ruta(self, clave: str) -> Path:
+        ruta = (self.directorio / clave).resolve()
+        # Evitar que una clave como "../x" salga del directorio
+        if not ruta.is_relative_to(self.directorio):
+            raise ValueError(f"Clave de archivo inválida: {clave}")
+        return ruta
+
+    def guardar(self, clave: str, datos: bytes, tipo: str):
+        ruta = self.ruta(clave)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        # Escritura atómica: nunca se sirve un archivo a medio escribir
+        temporal = ruta.with_name(ruta.name + ".tmp")
+        temporal.write_bytes(datos)
+        os.replace(temporal, ruta)
+
+    def leer(self, clave: str) -> bytes:
+        return self.ruta(clave).read_bytes()
+
+    def existe(self, clave: str) -> bool:
+        return self.ruta(clave).is_file()
+
+    def eliminar_prefijo(self, prefijo: str):
+        ruta = self.ruta(prefijo)
+        if ruta.is_dir():
+            shutil.rmtree(ruta, ignore_errors=True)
+
+    def url(self, clave: str) -> str:
+        return f"{self.url_base}/{clave}"
+
+
+class AlmacenS3:
+    """Guarda los archivos en un bucket S3 (o compatible); se sirven desde el bucket o una CDN."""
+
+    def __init__(self, bucket: str, url_base: str, endpoint: str = None):
+        if boto3 is None:
+            raise RuntimeError("IMAGENES_ALMACEN=s3 requiere el paquete boto3")
+        if not bucket:
+            raise RuntimeError("IMAGENES_ALMACEN=s3 requiere IMAGENES_S3_BUCKET")
+        self._s3 = boto3.client("s3", endpoint_url=endpoint or None)
+        self.bucket = bucket
+        self.url_base = url_base
+
+    def guardar(self, clave: str, datos: bytes, tipo: str):
+        self._s3.put_object(
+            Bucket=self.bucket,
+            Key=clave,
+            Body=datos,
+            ContentType=tipo,
+            CacheControl=CACHE_CONTROL_INMUTABLE
+        )
+
+    def leer(self, clave: str) -> bytes:
+        return self._s3.get_object(Bucket=self.bucket, Key=clave)["Body"].read()
+
+    def existe(self, clave: str) -> bool:
+        respuesta = self._s3.list_objects_v2(Bucket=self.bucket, Prefix=clave, MaxKeys=1)
+        return any(objeto["Key"] == clave for objeto in respuesta.get("Contents", []))
+
+    def eliminar_prefijo(self, prefijo: str):
+        paginador = self._s3.get_paginator("list_objects_v2")
+        for pagina in paginador.paginate(Bucket=self.bucket, Prefix=prefijo.rstrip("/") + "/"):
+            objetos = [{"Key": objeto["Key"]} for objeto in pagina.get("Contents", [])]
+            if objetos:
+                self._s3.delete_objects(Bucket=self.bucket, Delete={"Objects": objetos})
+
+    def url(self, clave: str) -> str:
+        return f"{self.url_base}/{clave}"
+
+
+def _crear_almacen():
+    if config.IMAGENES_ALMACEN == "s3":
+        return AlmacenS3(config.IMAGENES_S3_BUCKET, config.IMAGENES_URL_BASE, config.IMAGENES_S3_ENDPOINT)
+    return AlmacenLocal(config.IMAGENES_DIRECTORIO, config.IMAGENES_URL_BASE)
+
+
+almacen = _crear_almacen()
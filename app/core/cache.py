@@ -0,0 +1,252 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from app.core import config
+from app.core.cambios import escucha_cambios, notificar
+from app.core.coalescencia import clave_peticion, coalescencia, plazo_peticion, serializar
+from app.database.database import SessionLocal, aplicar_plazo
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Etiquetas de cada listado: la entidad propia y las que se embeben en la respuesta
+TAGS_PUBLICACIONES = ("publicaciones", "usuarios", "roles", "lineas")
+TAGS_PRODUCTOS = ("productos", "usuarios", "roles", "lineas", "tipologias")
+TAGS_EVENTOS = ("eventos", "usuarios", "roles")
+TAGS_LINEAS = ("lineas", "usuarios", "roles")
+TAGS_PORTAFOLIO = ("lineas", "publicaciones", "productos", "usuarios", "roles", "tipologias")
+TAGS_BUSQUEDA = ("usuarios", "lineas", "publicaciones", "productos", "eventos")
+
+
+class CacheMemoria:
+    """LRU en memoria del proceso, acotada por número de entradas y por bytes."""
+
+    def __init__(self, max_entradas: int, max_bytes: int):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._versiones = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira <= time.monotonic():
+                self._eliminar(clave)
+                return None
+            self._entradas.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave: str, valor: bytes, ttl: int):
+        if len(valor) > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._entradas:
+                self._eliminar(clave)
+            self._entradas[clave] = (time.monotonic() + ttl, valor)
+            self._bytes += len(valor)
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, antiguo) = self._entradas.popitem(last=False)
+                self._bytes -= len(antiguo)
+
+    def versiones(self, tags) -> list:
+        with self._lock:
+            return [self._versiones.get(tag, 0) for tag in tags]
+
+    def incrementar(self, tag: str):
+        with self._lock:
+            self._versiones[tag] = self._versiones.get(tag, 0) + 1
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def _eliminar(self, clave: str):
+        _, valor = self._entradas.pop(clave)
+        self._bytes -= len(valor)
+
+
+class CacheRedis:
+    """Backend compartido entre procesos; las versiones de etiqueta son contadores en Redis."""
+
+    def __init__(self, url: str, prefijo: str = "giit:cache:"):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requiere el paquete redis")
+        self._redis = redis.Redis.from_url(url)
+        self.prefijo = prefijo
+
+    # Si Redis falla, el listado se sirve desde la base de datos sin caché en lugar de dar 500
+
+    def obtener(self, clave: str):
+        try:
+            return self._redis.get(self.prefijo + clave)
+        except redis.RedisError as e:
+            logger.warning(f"Caché Redis no disponible al leer: {e}")
+            return None
+
+    def guardar(self, clave: str, valor: bytes, ttl: int):
+        try:
+            self._redis.set(self.prefijo + clave, valor, ex=ttl)
+        except redis.RedisError as e:
+            logger.warning(f"Caché Redis no disponible al guardar: {e}")
+
+    def versiones(self, tags):
+        """Versiones de las etiquetas; None si Redis no responde (la petición no usa la caché)."""
+        try:
+            valores = self._redis.mget([f"{self.prefijo}tag:{tag}" for tag in tags])
+        except redis.RedisError as e:
+            logger.warning(f"Caché Redis no disponible al leer versiones: {e}")
+            return None
+        return [int(valor) if valor is not None else 0 for valor in valores]
+
+    def incrementar(self, tag: str):
+        try:
+            self._redis.incr(f"{self.prefijo}tag:{tag}")
+        except redis.RedisError as e:
+            # Las entradas de la etiqueta siguen vigentes hasta CACHE_TTL
+            logger.error(f"No se pudo invalidar la etiqueta {tag} en Redis: {e}")
+
+    def vaciar(self):
+        # Compartida entre procesos: no pierde invalidaciones al reconectar un worker
+        pass
+
+
+class CacheRespuestas:
+    """
+    Caché de cuerpos JSON con invalidación por etiquetas. La clave de cada entrada
+    incluye la versión actual de sus etiquetas, así que invalidar una etiqueta solo
+    incrementa su versión y las entradas anteriores dejan de encontrarse.
+    """
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+
+    def clave(self, base: str, tags):
+        """Clave versionada de la entrada; None si no se pueden leer las versiones."""
+        if self.backend is None:
+            return None
+        versiones = self.backend.versiones(tags)
+        if versiones is None:
+            return None
+        return base + "#" + ",".join(f"{tag}:{version}" for tag, version in zip(tags, versiones))
+
+    def obtener(self, clave: str):
+        if clave is None:
+            return None
+        return self.backend.obtener(clave)
+
+    def guardar(self, clave: str, valor: bytes):
+        if clave is not None:
+            self.backend.guardar(clave, valor, self.ttl)
+
+    def invalidar(self, *tags):
+        if self.backend is not None:
+            for tag in tags:
+                self.backend.incrementar(tag)
+
+    def vaciar(self):
+        if self.backend is not None:
+            self.backend.vaciar()
+
+
+def _crear_backend():
+    if config.CACHE_BACKEND == "redis":
+        return CacheRedis(config.CACHE_REDIS_URL)
+    if config.CACHE_BACKEND == "memoria":
+        return CacheMemoria(config.CACHE_MAX_ENTRADAS, config.CACHE_MAX_BYTES)
+    return None
+
+
+cache = CacheRespuestas(_crear_backend(), config.CACHE_TTL)
+
+# Con el backend en memoria cada worker tiene su propia copia: las invalidaciones se
+# difunden a todos por LISTEN/NOTIFY. Al (re)conectar la escucha se vacía la copia
+# local, porque los avisos enviados mientras estaba desconectada se perdieron.
+DIFUNDIR_INVALIDACIONES = config.CACHE_NOTIFY and config.CACHE_BACKEND == "memoria"
+
+# Los resultados que la coalescencia reutiliza durante COALESCENCIA_TTL también son por worker
+DIFUNDIR_RUTAS = config.CACHE_NOTIFY and config.COALESCENCIA_TTL > 0
+
+
+def _invalidacion_recibida(datos: dict):
+    cache.invalidar(*datos.get("tags", []))
+    for ruta in datos.get("rutas", []):
+        coalescencia.olvidar(ruta)
+
+
+if DIFUNDIR_INVALIDACIONES or DIFUNDIR_RUTAS:
+    escucha_cambios.suscribir(
+        config.CACHE_CANAL,
+        _invalidacion_recibida,
+        al_conectar=cache.vaciar if DIFUNDIR_INVALIDACIONES else None
+    )
+
+
+def invalidar(*tags):
+    cache.invalidar(*tags)
+    if DIFUNDIR_INVALIDACIONES:
+        notificar(config.CACHE_CANAL, {"tags": list(tags)})
+
+
+def invalidar_ruta(ruta: str):
+    """Descarta el resultado coalescido de un listado sin etiquetas (respuesta_coalescida)."""
+    coalescencia.olvidar(ruta)
+    if DIFUNDIR_RUTAS:
+        notificar(config.CACHE_CANAL, {"rutas": [ruta]})
+
+
+def _respuesta(cuerpo: bytes, estado_cache: str, con_cabeceras: bool) -> Response:
+    cabeceras = {"X-Cache": estado_cache}
+    if con_cabeceras:
+        # Entrada con cabeceras: primera línea JSON con las cabeceras y después el cuerpo
+        linea, cuerpo = cuerpo.split(b"\n", 1)
+        cabeceras.update(json.loads(linea))
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
+
+def respuesta_cacheada(request: Request, adaptador: TypeAdapter, tags, consultar, cabeceras=None, pagina=None) -> Response:
+    """
+    Devuelve el cuerpo cacheado del listado o lo calcula una sola vez (single-flight)
+    con `consultar(db)` y lo guarda. Un acierto no toca la base de datos.
+    `cabeceras(resultado)`, si se indica, devuelve cabeceras que se cachean con el cuerpo.
+    Con `pagina`, el tamaño real de cada página calculada corrige su estimación por fila.
+    """
+    base = clave_peticion(request)
+    clave = cache.clave(base, tags)
+    cuerpo = cache.obtener(clave)
+    if cuerpo is not None:
+        return _respuesta(cuerpo, "HIT", cabeceras is not None)
+
+    def ejecutar():
+        # Se llena desde la primaria para no guardar datos atrasados de una réplica
+        db = SessionLocal()
+        aplicar_plazo(db, request)
+        try:
+            # Serializar con la sesión abierta: las relaciones se cargan de forma perezosa
+            datos = consultar(db)
+            resultado = serializar(adaptador, datos)
+        finally:
+            db.close()
+        if pagina is not None:
+            pagina.medir(len(resultado), len(datos))
+        if cabeceras is not None:
+            resultado = json.dumps(cabeceras(datos)).encode() + b"\n" + resultado
+        cache.guardar(clave, resultado)
+        return resultado
+
+    cuerpo = coalescencia.ejecutar(clave or base, ejecutar, plazo_peticion(request))
+    return _respuesta(cuerpo, "MISS", cabeceras is not None)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from datetime import datetime
+import psycopg2
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.core import config
+from app.database.database import SQLALCHEMY_DATABASE_URL, engine
+
+logger = logging.getLogger(__name__)
+
+
+class DifusorCambios:
+    """Reparte los eventos de cambio a los clientes SSE conectados a este proceso."""
+
+    def __init__(self, max_pendientes: int):
+        self.max_pendientes = max_pendientes
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self) -> asyncio.Queue:
+        cola = asyncio.Queue(maxsize=self.max_pendientes)
+        with self._lock:
+            self._suscriptores.add((asyncio.get_running_loop(), cola))
+        return cola
+
+    def cancelar(self, cola: asyncio.Queue):
+        with self._lock:
+            self._suscriptores = {(loop, c) for loop, c in self._suscriptores if c is not cola}
+
+    def publicar(self, evento: dict):
+        # Se llama desde hilos de trabajo: cada cola se alimenta en su propio event loop
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(_encolar, cola, evento)
+            except RuntimeError:
+                # El event loop ya se cerró
+                self.cancelar(cola)
+
+
+def _encolar(cola: asyncio.Queue, evento: dict):
+    if cola.full():
+        # Cliente lento: se descarta el evento más antiguo
+        cola.get_nowait()
+    cola.put_nowait(evento)
+
+
+class EscuchaCambios:
+    """
+    Hilo que hace LISTEN sobre los canales suscritos y entrega cada NOTIFY a la función
+    de su canal: los eventos de cambio van al difusor local y las invalidaciones de la
+    caché a app.core.cache, de modo que todos los procesos reciben los de cualquier otro.
+    """
+
+    def __init__(self):
+        self._canales = {}
+        self._al_conectar = []
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def suscribir(self, canal: str, funcion, al_conectar=None):
+        """
+        `funcion(datos)` recibe el payload JSON de cada NOTIFY del canal. `al_conectar()`
+        se llama tras cada LISTEN: las notificaciones enviadas mientras la conexión
+        estaba caída se perdieron y el suscriptor debe descartar su estado.
+        """
+        self._canales[canal] = funcion
+        if al_conectar is not None:
+            self._al_conectar.append(al_conectar)
+
+    def iniciar(self):
+        if self._hilo is not None or not self._canales:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="escucha-cambios", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join()
+        self._hilo = None
+
+    def _ejecutar(self):
+        espera = 1
+        while not self._detener.is_set():
+            try:
+                self._escuchar()
+                espera = 1
+            except Exception as e:
+                logger.error(f"Error en la escucha de cambios, reintentando en {espera}s: {e}")
+                self._detener.wait(espera)
+                espera = min(espera * 2, 30)
+
+    def _escuchar(self):
+        conn = psycopg2.connect(SQLALCHEMY_DATABASE_URL)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                for canal in self._canales:
+                    cursor.execute(f'LISTEN "{canal}"')
+            for al_conectar in self._al_conectar:
+                al_conectar()
+            while not self._detener.is_set():
+                if select.select([conn], [], [], 1)[0]:
+                    conn.poll()
+                    while conn.notifies:
+                        notificacion = conn.notifies.pop(0)
+                        funcion = self._canales.get(notificacion.channel)
+                        if funcion is not None:
+                            funcion(json.loads(notificacion.payload))
+        finally:
+            conn.close()
+
+
+difusor_cambios = DifusorCambios(config.CAMBIOS_MAX_PENDIENTES)
+escucha_cambios = EscuchaCambios()
+if config.CAMBIOS_NOTIFY:
+    escucha_cambios.suscribir(config.CAMBIOS_CANAL, difusor_cambios.publicar)
+
+
+def notificar(canal: str, datos: dict):
+    """
+    NOTIFY fuera de cualquier transacción de la petición, para avisos que se envían
+    después del commit. Un fallo se registra y no se propaga: la escritura ya se confirmó.
+    """
+    try:
+        with engine.begin() as conexion:
+            conexion.execute(text("SELECT pg_notify(:canal, :payload)"), {"canal": canal, "payload": json.dumps(datos)})
+    except Exception:
+        logger.exception(f"No se pudo notificar en el canal {canal}")
+
+
+def publicar_cambio(db: Session, entidad: str, id_registro: int, tipo: str, estado=None):
+    """
+    Registra un evento de cambio en la transacción actual. Se emite solo si la
+    transacción se confirma: con NOTIFY lo entrega PostgreSQL en el commit y,
+    sin él, se publica localmente tras el commit.
+    """
+    evento = {
+        "entidad": entidad,
+        "id": id_registro,
+        "tipo": tipo,
+        "estado": estado.value if hasattr(estado, "value") else estado,
+        "fecha": datetime.utcnow().isoformat()
+    }
+    if config.CAMBIOS_NOTIFY:
+        db.execute(
+            text("SELECT pg_notify(:canal, :payload)"),
+            {"canal": config.CAMBIOS_CANAL, "payload": json.dumps(evento)}
+        )
+    else:
+        event.listen(db, "after_commit", lambda session: difusor_cambios.publicar(evento), once=True)
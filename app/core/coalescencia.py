@@ -0,0 +1,127 @@
+import threading
+import time
+from urllib.parse import urlencode
+from fastapi import HTTPException, Request, Response, status
+from pydantic import TypeAdapter
+from app.core import config
+from app.database.database import leer_de_primaria, sesion_lectura
+
+# Por encima de este número de claves se purgan las entradas expiradas
+MAX_CLAVES_SIN_PURGAR = 256
+
+
+def _ruta_clave(clave: str) -> str:
+    # Claves de clave_peticion: "{origen}:{ruta}?{parámetros}"
+    return clave.split(":", 1)[-1].split("?", 1)[0]
+
+
+class _Llamada:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.expira = None
+
+
+class GrupoCoalescencia:
+    """
+    Single-flight: las llamadas concurrentes con la misma clave esperan a la primera
+    y comparten su resultado. Con ttl > 0 el resultado se reutiliza durante ese tiempo
+    y, al expirar, solo una llamada lo recalcula mientras las demás esperan. La espera
+    termina en el `plazo` de la llamada (instante de time.monotonic) o, sin él, tras
+    `espera_max` segundos: entonces la llamada responde 504 y la primera sigue sola.
+    """
+
+    def __init__(self, ttl: float = 0.0, espera_max: float = 30.0):
+        self.ttl = ttl
+        self.espera_max = espera_max
+        self._llamadas = {}
+        self._lock = threading.Lock()
+
+    def ejecutar(self, clave: str, funcion, plazo: float = None):
+        with self._lock:
+            ahora = time.monotonic()
+            llamada = self._llamadas.get(clave)
+            if llamada is not None and llamada.expira is not None and llamada.expira <= ahora:
+                llamada = None
+            lider = llamada is None
+            if lider:
+                if len(self._llamadas) >= MAX_CLAVES_SIN_PURGAR:
+                    self._purgar(ahora)
+                llamada = _Llamada()
+                self._llamadas[clave] = llamada
+
+        if not lider:
+            espera = self.espera_max if plazo is None else plazo - time.monotonic()
+            if not llamada.listo.wait(max(espera, 0)):
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail="La petición superó su tiempo máximo",
+                    headers={"Retry-After": str(config.LIMITES_RETRY_AFTER)}
+                )
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = funcion()
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                if llamada.error is None and self.ttl > 0:
+                    llamada.expira = time.monotonic() + self.ttl
+                elif self._llamadas.get(clave) is llamada:
+                    del self._llamadas[clave]
+            llamada.listo.set()
+        return llamada.resultado
+
+    def olvidar(self, ruta: str):
+        """Descarta los resultados reutilizables de una ruta (tras una escritura que la cambia)."""
+        with self._lock:
+            for clave in [clave for clave in self._llamadas if _ruta_clave(clave) == ruta]:
+                del self._llamadas[clave]
+
+    def _purgar(self, ahora: float):
+        expiradas = [
+            clave for clave, llamada in self._llamadas.items()
+            if llamada.expira is not None and llamada.expira <= ahora
+        ]
+        for clave in expiradas:
+            del self._llamadas[clave]
+
+
+coalescencia = GrupoCoalescencia(config.COALESCENCIA_TTL, config.COALESCENCIA_ESPERA_MAX)
+
+
+def plazo_peticion(request: Request):
+    """Instante límite de la petición fijado por LimitesMiddleware (None = sin plazo)."""
+    return request.scope.get("state", {}).get("plazo")
+
+
+def clave_peticion(request: Request) -> str:
+    """Clave de la petición: ruta + parámetros de consulta normalizados."""
+    parametros = sorted((k, v) for k, v in request.query_params.multi_items() if v != "")
+    # Las lecturas forzadas a la primaria no se mezclan con las de réplicas
+    origen = "primaria" if leer_de_primaria(request) else "lectura"
+    return f"{origen}:{request.url.path}?{urlencode(parametros)}"
+
+
+def serializar(adaptador: TypeAdapter, datos) -> bytes:
+    return adaptador.dump_json(adaptador.validate_python(datos, from_attributes=True))
+
+
+def respuesta_coalescida(request: Request, adaptador: TypeAdapter, consultar) -> Response:
+    """
+    Ejecuta `consultar(db)` una sola vez para todas las peticiones idénticas en curso
+    y devuelve el mismo cuerpo JSON ya serializado a cada una. La sesión se abre solo
+    en la petición que ejecuta la consulta, así las que esperan no ocupan conexiones.
+    """
+    def ejecutar():
+        with sesion_lectura(request) as db:
+            # Serializar con la sesión abierta: las relaciones se cargan de forma perezosa
+            return serializar(adaptador, consultar(db))
+
+    cuerpo = coalescencia.ejecutar(clave_peticion(request), ejecutar, plazo_peticion(request))
+    return Response(content=cuerpo, media_type="application/json")
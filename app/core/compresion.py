@@ -0,0 +1,180 @@
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.validadores import etag_codificado
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _CompresorBrotli:
+    def __init__(self, calidad: int):
+        self._compresor = brotli.Compressor(quality=calidad)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compresor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compresor.finish()
+
+
+class CompresionMiddleware:
+    """
+    Comprime las respuestas con br, zstd o gzip según el Accept-Encoding del cliente.
+    Solo se comprimen los tipos de contenido permitidos y las respuestas que superan
+    el tamaño mínimo, para no penalizar la latencia de las respuestas pequeñas.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimo_bytes: int = 1024,
+        tipos: list = None,
+        algoritmos: list = None,
+        nivel_gzip: int = 6,
+        nivel_brotli: int = 4,
+        nivel_zstd: int = 3
+    ):
+        self.app = app
+        self.minimo_bytes = minimo_bytes
+        self.tipos = tuple(tipos or ["application/json"])
+        self.niveles = {"gzip": nivel_gzip, "br": nivel_brotli, "zstd": nivel_zstd}
+
+        # Descartar los algoritmos cuyo paquete no está instalado
+        disponibles = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+        self.algoritmos = [a for a in (algoritmos or ["gzip"]) if disponibles.get(a)]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        codificacion = self.elegir_codificacion(headers.get("accept-encoding", ""))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        respuesta = _RespuestaComprimida(self, codificacion, send, headers.get("if-none-match", ""))
+        await self.app(scope, receive, respuesta.send)
+
+    def elegir_codificacion(self, accept_encoding: str):
+        aceptadas = {}
+        for parte in accept_encoding.split(","):
+            nombre, _, parametros = parte.strip().partition(";")
+            nombre = nombre.strip().lower()
+            if not nombre:
+                continue
+            calidad = 1.0
+            parametros = parametros.strip()
+            if parametros.startswith("q="):
+                try:
+                    calidad = float(parametros[2:])
+                except ValueError:
+                    calidad = 0.0
+            aceptadas[nombre] = calidad
+
+        for algoritmo in self.algoritmos:
+            if aceptadas.get(algoritmo, aceptadas.get("*", 0.0)) > 0:
+                return algoritmo
+        return None
+
+    def compresor(self, codificacion: str):
+        nivel = self.niveles[codificacion]
+        if codificacion == "br":
+            return _CompresorBrotli(nivel)
+        if codificacion == "zstd":
+            return zstandard.ZstdCompressor(level=nivel).compressobj()
+        return zlib.compressobj(nivel, zlib.DEFLATED, 31)
+
+    def tipo_permitido(self, content_type: str) -> bool:
+        tipo = content_type.split(";")[0].strip().lower()
+        return tipo in self.tipos
+
+
+class _RespuestaComprimida:
+    def __init__(self, middleware: CompresionMiddleware, codificacion: str, send: Send, if_none_match: str):
+        self.middleware = middleware
+        self.codificacion = codificacion
+        self._send = send
+        self.if_none_match = if_none_match
+        self.inicio = None
+        self.compresor = None
+        self.omitir = False
+
+    async def send(self, message: Message):
+        tipo = message["type"]
+
+        if tipo == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            # Respuestas ya codificadas, sin cuerpo o de tipos no permitidos pasan tal cual
+            self.omitir = (
+                "content-encoding" in headers
+                or message["status"] in (204, 304)
+                or not self.middleware.tipo_permitido(headers.get("content-type", ""))
+            )
+            if self.omitir:
+                etag = headers.get("etag")
+                if message["status"] == 304 and etag is not None:
+                    # El 304 no tiene cuerpo: repite el ETag de la representación que validó el cliente
+                    codificado = etag_codificado(etag, self.codificacion)
+                    if codificado in self.if_none_match:
+                        MutableHeaders(raw=message["headers"])["ETag"] = codificado
+                await self._send(message)
+            else:
+                # Esperar al primer bloque del cuerpo para decidir
+                self.inicio = message
+            return
+
+        if tipo != "http.response.body" or self.omitir:
+            await self._send(message)
+            return
+
+        cuerpo = message.get("body", b"")
+        hay_mas = message.get("more_body", False)
+
+        if self.inicio is not None:
+            inicio, self.inicio = self.inicio, None
+            headers = MutableHeaders(raw=inicio["headers"])
+            headers.add_vary_header("Accept-Encoding")
+
+            if not hay_mas:
+                # Respuesta completa en un solo bloque
+                if len(cuerpo) < self.middleware.minimo_bytes:
+                    self.omitir = True
+                    await self._send(inicio)
+                    await self._send(message)
+                    return
+                compresor = self.middleware.compresor(self.codificacion)
+                cuerpo = compresor.compress(cuerpo) + compresor.flush()
+                self._codificar(headers)
+                headers["Content-Length"] = str(len(cuerpo))
+                await self._send(inicio)
+                await self._send({"type": "http.response.body", "body": cuerpo})
+                return
+
+            # Respuesta en streaming: se comprime por bloques sin Content-Length
+            self.compresor = self.middleware.compresor(self.codificacion)
+            self._codificar(headers)
+            if "content-length" in headers:
+                del headers["content-length"]
+            await self._send(inicio)
+
+        comprimido = self.compresor.compress(cuerpo)
+        if not hay_mas:
+            comprimido += self.compresor.flush()
+        if comprimido or not hay_mas:
+            await self._send({"type": "http.response.body", "body": comprimido, "more_body": hay_mas})
+
+    def _codificar(self, headers: MutableHeaders):
+        # El cuerpo comprimido es otra representación: no puede compartir el ETag fuerte
+        headers["Content-Encoding"] = self.codificacion
+        if "etag" in headers:
+            headers["ETag"] = etag_codificado(headers["etag"], self.codificacion)
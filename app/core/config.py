@@ -0,0 +1,200 @@
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Pool de conexiones por proceso; el lanzador app.core.servidor los calcula según max_connections
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+
+# Con "true" importar main crea las tablas, aplica las migraciones y los datos por defecto
+# (cómodo en desarrollo). Por defecto no: el arranque en frío es más rápido y el esquema se
+# prepara en cada despliegue con python -m app.database.migraciones
+DB_INICIALIZAR = os.environ.get("DB_INICIALIZAR", "false").lower() == "true"
+
+# Segundos entre cada escritura en lote de Usuario.ultimo_acceso
+ULTIMO_ACCESO_INTERVALO = float(os.environ.get("ULTIMO_ACCESO_INTERVALO", "5"))
+
+# Compresión de respuestas
+# Tamaño mínimo (bytes) a partir del cual se comprime una respuesta
+COMPRESION_MINIMO_BYTES = int(os.environ.get("COMPRESION_MINIMO_BYTES", "1024"))
+# Tipos de contenido que se comprimen (separados por coma)
+COMPRESION_TIPOS = [
+    tipo.strip()
+    for tipo in os.environ.get(
+        "COMPRESION_TIPOS",
+        "application/json,text/html,text/plain,text/css,application/javascript"
+    ).split(",")
+    if tipo.strip()
+]
+# Algoritmos en orden de preferencia; br y zstd requieren los paquetes brotli y zstandard
+COMPRESION_ALGORITMOS = [
+    algoritmo.strip()
+    for algoritmo in os.environ.get("COMPRESION_ALGORITMOS", "br,zstd,gzip").split(",")
+    if algoritmo.strip()
+]
+COMPRESION_NIVEL_GZIP = int(os.environ.get("COMPRESION_NIVEL_GZIP", "6"))
+COMPRESION_NIVEL_BROTLI = int(os.environ.get("COMPRESION_NIVEL_BROTLI", "4"))
+COMPRESION_NIVEL_ZSTD = int(os.environ.get("COMPRESION_NIVEL_ZSTD", "3"))
+
+# Réplicas de lectura
+# URLs de réplicas PostgreSQL separadas por coma; vacío para usar solo la primaria
+DB_REPLICA_URLS = [
+    url.strip()
+    for url in os.environ.get("DB_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+# Segundos que una réplica caída queda fuera de la rotación
+DB_REPLICA_REINTENTO = float(os.environ.get("DB_REPLICA_REINTENTO", "30"))
+# Segundos tras una escritura durante los que el cliente lee de la primaria
+DB_REPLICA_VENTANA_ESCRITURA = int(os.environ.get("DB_REPLICA_VENTANA_ESCRITURA", "5"))
+# Cookie y header que fuerzan la lectura desde la primaria (read-your-writes)
+COOKIE_LEER_PRIMARIA = "giit_leer_primaria"
+HEADER_LEER_PRIMARIA = "x-leer-primaria"
+
+# Coalescencia (single-flight) de GETs idénticos
+# Segundos que se reutiliza un resultado ya calculado; 0 solo comparte las consultas en curso
+COALESCENCIA_TTL = float(os.environ.get("COALESCENCIA_TTL", "0"))
+# Segundos máximos que una petición espera el resultado de otra si su ruta no tiene plazo
+# (LimiteRuta); al vencer responde 504 en lugar de retener su hilo
+COALESCENCIA_ESPERA_MAX = float(os.environ.get("COALESCENCIA_ESPERA_MAX", "30"))
+
+# Caché de respuestas de los listados públicos
+# Backend: "memoria" (LRU por proceso), "redis" (compartido entre procesos) o "ninguno"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memoria")
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Segundos de vida de cada entrada; la invalidación por etiquetas es la vía principal
+CACHE_TTL = int(os.environ.get("CACHE_TTL", "300"))
+CACHE_MAX_ENTRADAS = int(os.environ.get("CACHE_MAX_ENTRADAS", "1024"))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Con el backend en memoria, las invalidaciones se envían a los demás workers por NOTIFY en este canal
+CACHE_NOTIFY = os.environ.get("CACHE_NOTIFY", "true").lower() == "true"
+CACHE_CANAL = os.environ.get("CACHE_CANAL", "giit_cache")
+
+# Flujo de eventos de cambios (/eventos-cambios)
+# Canal de PostgreSQL LISTEN/NOTIFY usado para repartir los eventos entre procesos
+CAMBIOS_CANAL = os.environ.get("CAMBIOS_CANAL", "giit_cambios")
+# Con "false" los eventos solo llegan a los clientes del mismo proceso
+CAMBIOS_NOTIFY = os.environ.get("CAMBIOS_NOTIFY", "true").lower() == "true"
+# Segundos entre comentarios keep-alive en el stream SSE
+CAMBIOS_KEEPALIVE = float(os.environ.get("CAMBIOS_KEEPALIVE", "15"))
+# Eventos pendientes por cliente antes de descartar los más antiguos
+CAMBIOS_MAX_PENDIENTES = int(os.environ.get("CAMBIOS_MAX_PENDIENTES", "100"))
+
+# Imágenes subidas (carrusel, fotos de perfil, logos, eventos y productos)
+# Almacén de los archivos: "local" (disco, servido en IMAGENES_RUTA_LOCAL) o "s3" (requiere boto3)
+IMAGENES_ALMACEN = os.environ.get("IMAGENES_ALMACEN", "local")
+IMAGENES_DIRECTORIO = os.environ.get("IMAGENES_DIRECTORIO", "media")
+IMAGENES_RUTA_LOCAL = "/media"
+# Prefijo público de las URLs; con s3 suele ser el dominio del bucket o de la CDN
+IMAGENES_URL_BASE = os.environ.get("IMAGENES_URL_BASE", IMAGENES_RUTA_LOCAL).rstrip("/")
+IMAGENES_S3_BUCKET = os.environ.get("IMAGENES_S3_BUCKET", "")
+# Endpoint alternativo compatible con S3 (MinIO, R2...); vacío para AWS
+IMAGENES_S3_ENDPOINT = os.environ.get("IMAGENES_S3_ENDPOINT", "")
+# Anchos (px) de las variantes para srcset y lado de la miniatura cuadrada
+IMAGENES_ANCHOS = sorted(
+    int(ancho)
+    for ancho in os.environ.get("IMAGENES_ANCHOS", "320,640,1280").split(",")
+    if ancho.strip()
+)
+IMAGENES_MINIATURA = int(os.environ.get("IMAGENES_MINIATURA", "160"))
+# Formatos de las variantes; avif se omite si Pillow no lo soporta
+IMAGENES_FORMATOS = [
+    formato.strip().lower()
+    for formato in os.environ.get("IMAGENES_FORMATOS", "avif,webp").split(",")
+    if formato.strip()
+]
+IMAGENES_CALIDAD = int(os.environ.get("IMAGENES_CALIDAD", "80"))
+# Tamaño máximo de un archivo subido
+IMAGENES_MAX_BYTES = int(os.environ.get("IMAGENES_MAX_BYTES", str(10 * 1024 * 1024)))
+# Máximo de píxeles (ancho x alto) de una imagen subida: decodificarla ocupa unos 4 bytes
+# por píxel, así que un archivo pequeño y muy comprimido puede necesitar cientos de MB
+IMAGENES_MAX_PIXELES = int(os.environ.get("IMAGENES_MAX_PIXELES", str(40_000_000)))
+
+# Cola de trabajos en segundo plano (tabla Trabajos)
+# Con "false" este proceso solo encola; los trabajos los ejecuta otro proceso
+TRABAJOS_ACTIVOS = os.environ.get("TRABAJOS_ACTIVOS", "true").lower() == "true"
+# Expone GET /trabajos/estadisticas (profundidad y retraso de la cola)
+TRABAJOS_ESTADISTICAS = os.environ.get("TRABAJOS_ESTADISTICAS", "true").lower() == "true"
+TRABAJOS_TRABAJADORES = int(os.environ.get("TRABAJOS_TRABAJADORES", "2"))
+# Segundos entre consultas a la tabla cuando la cola está vacía
+TRABAJOS_INTERVALO = float(os.environ.get("TRABAJOS_INTERVALO", "2"))
+TRABAJOS_MAX_INTENTOS = int(os.environ.get("TRABAJOS_MAX_INTENTOS", "5"))
+# Reintentos con backoff exponencial: base * 2^(intento - 1), hasta el máximo (segundos)
+TRABAJOS_BACKOFF_BASE = float(os.environ.get("TRABAJOS_BACKOFF_BASE", "5"))
+TRABAJOS_BACKOFF_MAX = float(os.environ.get("TRABAJOS_BACKOFF_MAX", "600"))
+# Segundos sin latido tras los que un trabajo en_proceso se da por abandonado (proceso caído) y se
+# reintenta, o se marca fallido si agotó sus intentos. Mientras se ejecuta, su proceso lo renueva cada tercio
+TRABAJOS_BLOQUEO_MAX = float(os.environ.get("TRABAJOS_BLOQUEO_MAX", "900"))
+# Días que se conservan los trabajos completados
+TRABAJOS_RETENCION_DIAS = int(os.environ.get("TRABAJOS_RETENCION_DIAS", "7"))
+
+# Límites por ruta (reglas en main.py): concurrencia por proceso y plazo de cada petición
+# Valores de la regla por defecto; concurrencia 0 = sin límite
+LIMITES_CONCURRENCIA = int(os.environ.get("LIMITES_CONCURRENCIA", "0"))
+LIMITES_PLAZO = float(os.environ.get("LIMITES_PLAZO", "30"))
+# Segundos que se sugieren en Retry-After de las respuestas 503/504
+LIMITES_RETRY_AFTER = int(os.environ.get("LIMITES_RETRY_AFTER", "2"))
+
+# Limitación de peticiones con token bucket (capacidad = ráfaga, tasa = tokens por segundo)
+# Backend: "memoria" (por proceso), "redis" (compartido entre procesos) o "ninguno"
+LIMITADOR_BACKEND = os.environ.get("LIMITADOR_BACKEND", "memoria")
+LIMITADOR_REDIS_URL = os.environ.get("LIMITADOR_REDIS_URL", CACHE_REDIS_URL)
+# Si Redis cae: true admite las peticiones sin limitar (y lo registra), false las rechaza con 429
+LIMITADOR_FALLO_ABIERTO = os.environ.get("LIMITADOR_FALLO_ABIERTO", "true").lower() == "true"
+# Segundos máximos para conectar con Redis y para cada llamada; al vencer se aplica LIMITADOR_FALLO_ABIERTO
+LIMITADOR_REDIS_TIMEOUT = float(os.environ.get("LIMITADOR_REDIS_TIMEOUT", "0.2"))
+# Claves (IP, email) que se guardan en memoria antes de purgar las inactivas y, si no basta, las menos recientes
+LIMITADOR_MAX_CLAVES = int(os.environ.get("LIMITADOR_MAX_CLAVES", "100000"))
+# /login por IP del cliente y por email
+LIMITADOR_LOGIN_IP_CAPACIDAD = int(os.environ.get("LIMITADOR_LOGIN_IP_CAPACIDAD", "20"))
+LIMITADOR_LOGIN_IP_TASA = float(os.environ.get("LIMITADOR_LOGIN_IP_TASA", "0.2"))
+LIMITADOR_LOGIN_EMAIL_CAPACIDAD = int(os.environ.get("LIMITADOR_LOGIN_EMAIL_CAPACIDAD", "5"))
+LIMITADOR_LOGIN_EMAIL_TASA = float(os.environ.get("LIMITADOR_LOGIN_EMAIL_TASA", "0.05"))
+# Escrituras (POST/PUT/PATCH/DELETE) por IP del cliente
+LIMITADOR_ESCRITURA_CAPACIDAD = int(os.environ.get("LIMITADOR_ESCRITURA_CAPACIDAD", "60"))
+LIMITADOR_ESCRITURA_TASA = float(os.environ.get("LIMITADOR_ESCRITURA_TASA", "2"))
+
+# Caracteres mínimos de q en /buscar; con menos no se consulta la base de datos
+BUSQUEDA_MIN_CARACTERES = int(os.environ.get("BUSQUEDA_MIN_CARACTERES", "2"))
+# Con "false" no se registra /buscar (ni se importa su módulo al arrancar)
+BUSQUEDA_ACTIVA = os.environ.get("BUSQUEDA_ACTIVA", "true").lower() == "true"
+
+# Ids máximos por petición en los endpoints de eliminación por lotes
+ELIMINACION_LOTE_MAX = int(os.environ.get("ELIMINACION_LOTE_MAX", "500"))
+
+# Paginación de los listados (app.core.paginacion): limit por defecto y máximo admitido;
+# por encima del máximo se responde 400 y hay que recorrer el listado con cursor
+PAGINACION_LIMITE_DEFECTO = int(os.environ.get("PAGINACION_LIMITE_DEFECTO", "100"))
+PAGINACION_LIMITE_MAX = int(os.environ.get("PAGINACION_LIMITE_MAX", "5000"))
+
+# Tamaño estimado máximo de una página materializada; las mayores se transmiten por lotes
+# (o se rechazan con 400 en los listados sin streaming)
+PAGINACION_PRESUPUESTO_BYTES = int(os.environ.get("PAGINACION_PRESUPUESTO_BYTES", str(1024 * 1024)))
+
+# Elementos de cada colección anidada en /lineas-investigacion/{id}/portafolio y /usuarios/{id}/perfil
+# (parámetro limit); los conteos de la respuesta tienen los totales
+COLECCION_LIMITE_DEFECTO = int(os.environ.get("COLECCION_LIMITE_DEFECTO", "50"))
+COLECCION_LIMITE_MAX = int(os.environ.get("COLECCION_LIMITE_MAX", "500"))
+
+# Filas que se leen y serializan juntas al transmitir una página por lotes
+PAGINACION_LOTE = int(os.environ.get("PAGINACION_LOTE", "200"))
+
+# Depuración de consultas (app.core.depuracion): token de administrador que se envía en
+# la cabecera X-Depuracion para capturar una petición y consultar /debug; vacío = desactivada
+DEPURACION_TOKEN = os.environ.get("DEPURACION_TOKEN", "")
+
+# Fracción de peticiones capturadas sin cabecera (0 = solo bajo demanda); ajustable en PUT /debug/muestreo
+DEPURACION_MUESTREO = float(os.environ.get("DEPURACION_MUESTREO", "0"))
+# Canal de NOTIFY con el que PUT /debug/muestreo llega a todos los workers
+DEPURACION_CANAL = os.environ.get("DEPURACION_CANAL", "giit_depuracion")
+
+# Peticiones más lentas que se conservan por proceso
+DEPURACION_MAX_CAPTURAS = int(os.environ.get("DEPURACION_MAX_CAPTURAS", "50"))
+
+# Consultas más lentas de cada petición que se repiten con EXPLAIN (ANALYZE, BUFFERS) y su plazo en ms
+DEPURACION_EXPLAIN_MAX = int(os.environ.get("DEPURACION_EXPLAIN_MAX", "5"))
+DEPURACION_EXPLAIN_TIMEOUT = int(os.environ.get("DEPURACION_EXPLAIN_TIMEOUT", "5000"))
+
+# Capturas pendientes de EXPLAIN por proceso; con la cola llena se descartan
+DEPURACION_COLA = int(os.environ.get("DEPURACION_COLA", "20"))
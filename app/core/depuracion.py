@@ -0,0 +1,319 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core import config
+from app.core.cambios import escucha_cambios, notificar
+from app.core.seguridad import CABECERA_DEPURACION, es_administrador
+
+logger = logging.getLogger(__name__)
+
+# Cabecera de respuesta con el id de la captura, para buscarla en /debug/slow-queries
+CABECERA_CAPTURA = "X-Depuracion-Id"
+
+# Solo se repiten con EXPLAIN ANALYZE las lecturas; estas funciones tienen efectos aunque estén en un SELECT
+FUNCIONES_CON_EFECTOS = ("pg_advisory", "pg_notify", "nextval", "setval")
+
+# Parámetros que no se guardan en claro
+PARAMETROS_OCULTOS = ("password",)
+
+_captura_actual = ContextVar("captura_depuracion", default=None)
+
+
+class Captura:
+    """SQL emitido por una petición: sentencia, parámetros y duración de cada consulta."""
+
+    def __init__(self, id_captura: int, metodo: str, ruta: str, muestreada: bool):
+        self.id = id_captura
+        self.metodo = metodo
+        self.ruta = ruta
+        self.muestreada = muestreada
+        self.fecha = datetime.utcnow()
+        self.pid = os.getpid()
+        self.duracion_ms = 0.0
+        # Código HTTP enviado, o "cancelada"/"error" si la petición terminó con una excepción
+        self.resultado = None
+        self.consultas = []
+
+    def resumen(self) -> dict:
+        return {
+            "id": self.id,
+            "pid": self.pid,
+            "metodo": self.metodo,
+            "ruta": self.ruta,
+            "fecha": self.fecha,
+            "muestreada": self.muestreada,
+            "resultado": self.resultado,
+            "duracion_ms": self.duracion_ms,
+            "duracion_sql_ms": sum(consulta["duracion_ms"] for consulta in self.consultas),
+            "consultas": self.consultas
+        }
+
+
+class RegistroLentas:
+    """
+    Las `maximo` peticiones capturadas más lentas de este proceso, en un montículo
+    acotado: una captura nueva solo entra si es más lenta que la más rápida guardada,
+    así que comprobarlo antes del EXPLAIN evita repetir consultas que se descartarían.
+
+    Las capturas admitidas se explican en un hilo de fondo, con una cola de `pendientes`
+    como máximo: la petición no espera al EXPLAIN ni retiene su hueco de concurrencia, y
+    si la cola está llena la captura se descarta.
+    """
+
+    def __init__(self, maximo: int, muestreo: float, pendientes: int):
+        self.maximo = maximo
+        self.muestreo = muestreo
+        self._capturas = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._cola = queue.Queue(maxsize=pendientes)
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def nueva(self, metodo: str, ruta: str, muestreada: bool) -> Captura:
+        return Captura(next(self._ids), metodo, ruta, muestreada)
+
+    def admite(self, duracion_ms: float) -> bool:
+        with self._lock:
+            return len(self._capturas) < self.maximo or duracion_ms > self._capturas[0][0]
+
+    def registrar(self, captura: Captura):
+        entrada = (captura.duracion_ms, captura.id, captura)
+        with self._lock:
+            if len(self._capturas) < self.maximo:
+                heapq.heappush(self._capturas, entrada)
+            elif captura.duracion_ms > self._capturas[0][0]:
+                heapq.heapreplace(self._capturas, entrada)
+
+    def listar(self) -> list:
+        with self._lock:
+            capturas = sorted(self._capturas, reverse=True)
+        return [captura.resumen() for _, _, captura in capturas]
+
+    def vaciar(self):
+        with self._lock:
+            self._capturas = []
+
+    def encolar(self, captura: Captura):
+        try:
+            self._cola.put_nowait(captura)
+        except queue.Full:
+            logger.warning(f"Cola de EXPLAIN llena: se descarta la captura {captura.id} ({captura.metodo} {captura.ruta})")
+
+    def procesar(self, captura: Captura):
+        # Mientras esperaba en la cola pudieron entrar capturas más lentas
+        if self.admite(captura.duracion_ms):
+            try:
+                explicar(captura)
+            except Exception:
+                logger.exception("No se pudieron explicar las consultas capturadas")
+            self.registrar(captura)
+        for consulta in captura.consultas:
+            consulta.pop("_explicable", None)
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="depuracion-explain", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Termina el EXPLAIN en curso y descarta las capturas que quedan en la cola."""
+        if self._hilo is None:
+            return
+        self._detener.set()
+        try:
+            self._cola.put_nowait(None)
+        except queue.Full:
+            pass
+        self._hilo.join()
+        self._hilo = None
+
+    def _ejecutar(self):
+        while True:
+            captura = self._cola.get()
+            if captura is None or self._detener.is_set():
+                return
+            self.procesar(captura)
+
+
+registro_lentas = RegistroLentas(
+    config.DEPURACION_MAX_CAPTURAS, config.DEPURACION_MUESTREO, config.DEPURACION_COLA
+)
+
+
+def _muestreo_recibido(datos: dict):
+    registro_lentas.muestreo = datos["muestreo"]
+
+
+# El muestreo se reparte a todos los workers; las capturas son de cada proceso. Un worker
+# que arranca después (o que perdió la escucha) usa DEPURACION_MUESTREO hasta el próximo cambio
+if config.DEPURACION_TOKEN:
+    escucha_cambios.suscribir(config.DEPURACION_CANAL, _muestreo_recibido)
+
+
+def cambiar_muestreo(fraccion: float):
+    registro_lentas.muestreo = fraccion
+    notificar(config.DEPURACION_CANAL, {"muestreo": fraccion})
+
+
+def _parametros(parametros, executemany: bool):
+    if executemany:
+        return f"{len(parametros)} filas"
+    if isinstance(parametros, dict):
+        return {
+            clave: "***" if any(oculto in clave for oculto in PARAMETROS_OCULTOS) else _valor(valor)
+            for clave, valor in parametros.items()
+        }
+    if isinstance(parametros, (list, tuple)):
+        return [_valor(valor) for valor in parametros]
+    return parametros
+
+
+def _valor(valor):
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    return str(valor)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    if _captura_actual.get() is not None:
+        context.depuracion_inicio = time.perf_counter()
+
+
+def _anotar(context, statement, parameters, executemany, error=None):
+    captura = _captura_actual.get()
+    inicio = getattr(context, "depuracion_inicio", None)
+    if captura is None or inicio is None:
+        return
+    duracion = (time.perf_counter() - inicio) * 1000
+    captura.consultas.append({
+        "sql": statement,
+        "parametros": _parametros(parameters, executemany),
+        "duracion_ms": duracion,
+        "plan": None,
+        "error": error,
+        # Los parámetros originales solo se usan para el EXPLAIN y no se exponen
+        "_explicable": None if executemany else parameters
+    })
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    _anotar(context, statement, parameters, executemany)
+
+
+@event.listens_for(Engine, "handle_error")
+def _al_fallar(contexto_error):
+    # Las consultas canceladas por statement_timeout (plazo de la petición) también se anotan
+    contexto = contexto_error.execution_context
+    if contexto is not None and contexto_error.statement is not None:
+        _anotar(
+            contexto, contexto_error.statement, contexto_error.parameters,
+            contexto.executemany, error=str(contexto_error.original_exception).strip()
+        )
+
+
+def _explicable(sql: str) -> bool:
+    inicio = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    minusculas = sql.lower()
+    return inicio in ("SELECT", "WITH") and not any(funcion in minusculas for funcion in FUNCIONES_CON_EFECTOS)
+
+
+def explicar(captura: Captura):
+    """
+    Repite las consultas más lentas de la captura con EXPLAIN (ANALYZE, BUFFERS) en una
+    transacción de solo lectura que se deshace. Se ejecuta en la primaria aunque la
+    consulta original fuera a una réplica.
+    """
+    from app.database.database import engine
+
+    candidatas = sorted(
+        (consulta for consulta in captura.consultas if consulta["_explicable"] is not None and _explicable(consulta["sql"])),
+        key=lambda consulta: consulta["duracion_ms"],
+        reverse=True
+    )[:config.DEPURACION_EXPLAIN_MAX]
+    if candidatas:
+        with engine.connect() as conexion:
+            conexion.exec_driver_sql("SET TRANSACTION READ ONLY")
+            conexion.exec_driver_sql(f"SET LOCAL statement_timeout = {config.DEPURACION_EXPLAIN_TIMEOUT}")
+            for consulta in candidatas:
+                try:
+                    with conexion.begin_nested():
+                        filas = conexion.exec_driver_sql(
+                            "EXPLAIN (ANALYZE, BUFFERS) " + consulta["sql"], consulta["_explicable"]
+                        ).all()
+                    consulta["plan"] = [fila[0] for fila in filas]
+                except DBAPIError as e:
+                    consulta["plan"] = [f"EXPLAIN falló: {e.orig}"]
+            conexion.rollback()
+    for consulta in captura.consultas:
+        consulta.pop("_explicable", None)
+
+
+class DepuracionMiddleware:
+    """
+    Captura el SQL de una petición cuando trae la cabecera X-Depuracion con el token de
+    administrador o, sin ella, con probabilidad registro_lentas.muestreo. Al terminar la
+    petición, también si se cancela por su plazo o falla, y si está entre las más lentas,
+    la encola para que el hilo del registro explique sus consultas y la guarde para
+    /debug/slow-queries. Sin DEPURACION_TOKEN no captura nada.
+    """
+
+    def __init__(self, app: ASGIApp, registro: RegistroLentas):
+        self.app = app
+        self.registro = registro
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not config.DEPURACION_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        solicitada = es_administrador(Headers(scope=scope).get(CABECERA_DEPURACION))
+        if not solicitada and (self.registro.muestreo <= 0 or random.random() >= self.registro.muestreo):
+            await self.app(scope, receive, send)
+            return
+
+        captura = self.registro.nueva(scope["method"], scope["path"], muestreada=not solicitada)
+
+        async def enviar(message: Message):
+            if message["type"] == "http.response.start":
+                captura.resultado = str(message["status"])
+                if solicitada:
+                    message["headers"] = [*message.get("headers", []), (CABECERA_CAPTURA.lower().encode(), str(captura.id).encode())]
+            await send(message)
+
+        token = _captura_actual.set(captura)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        except asyncio.CancelledError:
+            # LimitesMiddleware cancela la petición al vencer su plazo (504)
+            captura.resultado = "cancelada"
+            raise
+        except BaseException:
+            if captura.resultado is None:
+                captura.resultado = "error"
+            raise
+        finally:
+            _captura_actual.reset(token)
+            captura.duracion_ms = (time.perf_counter() - inicio) * 1000
+            # También las peticiones canceladas o fallidas, que son las que más interesa ver.
+            # El EXPLAIN se hace fuera de la petición: no retiene su conexión ni su hueco en los límites
+            if captura.consultas and self.registro.admite(captura.duracion_ms):
+                self.registro.encolar(captura)
@@ -0,0 +1,33 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core import config
+
+METODOS_LECTURA = ("GET", "HEAD", "OPTIONS")
+
+
+class EscrituraRecienteMiddleware:
+    """
+    Tras una escritura exitosa marca al cliente con una cookie de vida corta para que
+    get_read_db lo envíe a la primaria y vea sus propios cambios aunque las réplicas
+    tengan retraso.
+    """
+
+    def __init__(self, app: ASGIApp, ventana: int = 5):
+        self.app = app
+        self.ventana = ventana
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in METODOS_LECTURA:
+            await self.app(scope, receive, send)
+            return
+
+        async def enviar(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = MutableHeaders(raw=message["headers"])
+                headers.append(
+                    "Set-Cookie",
+                    f"{config.COOKIE_LEER_PRIMARIA}=1; Max-Age={self.ventana}; Path=/; HttpOnly; SameSite=Lax"
+                )
+            await send(message)
+
+        await self.app(scope, receive, enviar)
@@ -0,0 +1,163 @@
+import io
+import logging
+import uuid
+from contextlib import contextmanager
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+from sqlalchemy.orm import Session
+from app.core import config
+from app.core.almacenamiento import almacen
+from app.core.trabajos import cola_trabajos
+from app.core.variantes import FORMATO_MINIATURA, PATRON_ORIGINAL, TIPOS_MIME, urls_variantes
+
+logger = logging.getLogger(__name__)
+
+# Formatos aceptados en la subida y extensión con la que se guarda el original
+EXTENSIONES = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif", "AVIF": "avif"}
+
+# Valores de la etiqueta EXIF Orientation que giran la imagen 90 grados
+ORIENTACIONES_GIRADAS = (5, 6, 7, 8)
+
+
+class ProcesadorImagenes:
+    """
+    Guarda el original de cada imagen subida y encola la generación de sus variantes
+    (anchos para srcset en AVIF/WebP y una miniatura cuadrada), sin bloquear la subida.
+    Mientras las variantes no existen, la ruta /media sirve el original en su lugar.
+    """
+
+    def __init__(self, almacen, urls, miniatura: int, calidad: int, max_bytes: int, max_pixeles: int):
+        self.almacen = almacen
+        self.urls = urls
+        self.miniatura = miniatura
+        # Las URLs de las respuestas solo anuncian los formatos que se pueden generar
+        formatos = urls.formatos
+        urls.formatos = self.formatos = [formato for formato in formatos if features.check(formato)]
+        for formato in set(formatos) - set(self.formatos):
+            logger.warning(f"Pillow no soporta {formato}; no se generarán variantes en ese formato")
+        self.calidad = calidad
+        self.max_bytes = max_bytes
+        self.max_pixeles = max_pixeles
+
+    def subir(self, archivo: UploadFile, carpeta: str, db: Session) -> str:
+        """
+        Valida y guarda el original y devuelve la URL pública. Sus variantes se encolan en
+        la transacción de `db`: solo se generan si la petición confirma la imagen.
+        """
+        datos = archivo.file.read(self.max_bytes + 1)
+        if len(datos) > self.max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"La imagen supera el tamaño máximo de {self.max_bytes} bytes"
+            )
+
+        # Image.open solo lee la cabecera; la decodificación ocurre en segundo plano
+        try:
+            with Image.open(io.BytesIO(datos)) as imagen:
+                formato = imagen.format
+                pixeles = imagen.width * imagen.height
+                ancho = imagen.height if imagen.getexif().get(0x0112) in ORIENTACIONES_GIRADAS else imagen.width
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El archivo no es una imagen válida"
+            )
+        # Se comprueba con las dimensiones de la cabecera, antes de que nada la decodifique
+        if pixeles > self.max_pixeles:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"La imagen supera el máximo de {self.max_pixeles} píxeles"
+            )
+        extension = EXTENSIONES.get(formato)
+        if extension is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Formato de imagen no soportado: {formato}"
+            )
+
+        clave = f"{carpeta}/{uuid.uuid4().hex}/original-{ancho}w.{extension}"
+        self.almacen.guardar(clave, datos, TIPOS_MIME[extension])
+        cola_trabajos.encolar("imagenes.variantes", {"clave": clave}, db=db)
+        return self.almacen.url(clave)
+
+    def eliminar(self, url: str):
+        """Borra en segundo plano el original y las variantes de una imagen gestionada."""
+        coincidencia = self.urls.coincidencia(url)
+        if coincidencia is not None:
+            cola_trabajos.encolar("imagenes.eliminar", {"prefijo": coincidencia["base"]})
+
+    def descartar(self, url: str):
+        """Borra en el acto un original recién subido que no llegó a guardarse en la base de datos."""
+        coincidencia = self.urls.coincidencia(url)
+        if coincidencia is None:
+            return
+        try:
+            self.almacen.eliminar_prefijo(coincidencia["base"])
+        except Exception:
+            logger.exception(f"No se pudo borrar la imagen descartada {url}")
+
+    def generar_variantes(self, clave: str):
+        coincidencia = PATRON_ORIGINAL.match(clave)
+        base = coincidencia["base"]
+        with Image.open(io.BytesIO(self.almacen.leer(clave))) as original:
+            # Originales subidos antes de que existiera el límite, o con un límite mayor
+            if original.width * original.height > self.max_pixeles:
+                logger.warning(f"{clave} supera {self.max_pixeles} píxeles; no se generan sus variantes")
+                return
+            imagen = ImageOps.exif_transpose(original)
+            if imagen.mode not in ("RGB", "RGBA"):
+                imagen = imagen.convert("RGBA" if imagen.has_transparency_data else "RGB")
+
+            for ancho in self.urls.anchos_variantes(int(coincidencia["ancho"])):
+                redimensionada = imagen
+                if imagen.width > ancho:
+                    alto = max(1, round(imagen.height * ancho / imagen.width))
+                    redimensionada = imagen.resize((ancho, alto), Image.LANCZOS)
+                for formato in self.formatos:
+                    self._guardar(f"{base}/{ancho}.{formato}", redimensionada, formato)
+
+            miniatura = ImageOps.fit(imagen, (self.miniatura, self.miniatura), Image.LANCZOS)
+            self._guardar(f"{base}/miniatura.{FORMATO_MINIATURA}", miniatura, FORMATO_MINIATURA)
+
+    def _guardar(self, clave: str, imagen: Image.Image, formato: str):
+        salida = io.BytesIO()
+        imagen.save(salida, format=formato.upper(), quality=self.calidad)
+        self.almacen.guardar(clave, salida.getvalue(), TIPOS_MIME[formato])
+
+
+procesador_imagenes = ProcesadorImagenes(
+    almacen,
+    urls_variantes,
+    miniatura=config.IMAGENES_MINIATURA,
+    calidad=config.IMAGENES_CALIDAD,
+    max_bytes=config.IMAGENES_MAX_BYTES,
+    max_pixeles=config.IMAGENES_MAX_PIXELES
+)
+
+
+@cola_trabajos.tarea("imagenes.variantes")
+def generar_variantes(clave: str):
+    procesador_imagenes.generar_variantes(clave)
+
+
+@cola_trabajos.tarea("imagenes.eliminar")
+def eliminar_archivos(prefijo: str):
+    procesador_imagenes.almacen.eliminar_prefijo(prefijo)
+
+
+@contextmanager
+def imagen_subida(archivo: UploadFile, carpeta: str, db: Session):
+    """
+    Sube la imagen y entrega su URL al bloque, que la guarda y confirma la transacción.
+    Si el bloque falla (p. ej. el commit), el original se borra para no dejarlo huérfano.
+    """
+    url = procesador_imagenes.subir(archivo, carpeta, db)
+    try:
+        yield url
+    except BaseException:
+        procesador_imagenes.descartar(url)
+        raise
+
+
+def eliminar_imagen(url: str):
+    procesador_imagenes.eliminar(url)
@@ -0,0 +1,254 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+METODOS_ESCRITURA = ("POST", "PUT", "PATCH", "DELETE")
+
+MENSAJE_LIMITE = "Demasiadas peticiones, reintente más tarde"
+
+# Token bucket atómico en Redis; el instante sale del reloj del servidor Redis
+SCRIPT_REDIS = """
+local capacidad = tonumber(ARGV[1])
+local tasa = tonumber(ARGV[2])
+local reloj = redis.call('TIME')
+local ahora = tonumber(reloj[1]) + tonumber(reloj[2]) / 1000000
+local cubo = redis.call('HMGET', KEYS[1], 't', 'i')
+local tokens = tonumber(cubo[1]) or capacidad
+local instante = tonumber(cubo[2]) or ahora
+tokens = math.min(capacidad, tokens + (ahora - instante) * tasa)
+local espera = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    espera = (1 - tokens) / tasa
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'i', tostring(ahora))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidad / tasa) + 1)
+return tostring(espera)
+"""
+
+
+class Limite:
+    """Token bucket: admite ráfagas de `capacidad` peticiones y repone `tasa` por segundo."""
+
+    def __init__(self, nombre: str, capacidad: int, tasa: float):
+        self.nombre = nombre
+        self.capacidad = capacidad
+        self.tasa = tasa
+        self.permitidas = 0
+        self.rechazadas = 0
+
+
+class CubosMemoria:
+    """
+    Cubos en un OrderedDict del proceso, del menos al más recientemente usado. Una clave
+    ausente equivale a un cubo lleno.
+    """
+
+    # Solo memoria y un lock: se consulta directamente desde el bucle de eventos
+    bloqueante = False
+
+    def __init__(self, max_claves: int):
+        self.max_claves = max_claves
+        self._cubos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, clave: str, capacidad: int, tasa: float) -> float:
+        ahora = time.monotonic()
+        with self._lock:
+            cubo = self._cubos.get(clave)
+            if cubo is None:
+                if len(self._cubos) >= self.max_claves:
+                    self._purgar(ahora)
+                # [tokens, instante, segundos hasta volver a estar lleno]
+                self._cubos[clave] = [capacidad - 1, ahora, capacidad / tasa]
+                return 0.0
+            self._cubos.move_to_end(clave)
+            tokens = min(capacidad, cubo[0] + (ahora - cubo[1]) * tasa)
+            cubo[1] = ahora
+            if tokens >= 1:
+                cubo[0] = tokens - 1
+                return 0.0
+            cubo[0] = tokens
+            return (1 - tokens) / tasa
+
+    def claves(self) -> int:
+        return len(self._cubos)
+
+    def _purgar(self, ahora: float):
+        # Los cubos que ya se habrían llenado no aportan nada
+        self._cubos = OrderedDict(
+            (clave, cubo) for clave, cubo in self._cubos.items()
+            if ahora - cubo[1] < cubo[2]
+        )
+        # Con demasiadas claves activas (p. ej. muchas IPs) se descartan las usadas hace
+        # más tiempo, hasta el 90 % del máximo para no repetir la purga en cada clave nueva.
+        # Vaciarlo todo devolvería un cubo lleno a quien estaba agotando el suyo.
+        while len(self._cubos) >= self.max_claves * 0.9:
+            self._cubos.popitem(last=False)
+
+
+class CubosRedis:
+    """
+    Cubos compartidos entre procesos. Si Redis no responde en `timeout` segundos (o
+    falla), `fallo_abierto` decide si la petición se admite (sin límite mientras dure la
+    caída) o se rechaza.
+    """
+
+    # Cada consumo es una llamada de red: el middleware la hace en el threadpool
+    bloqueante = True
+
+    def __init__(self, url: str, fallo_abierto: bool = True, timeout: float = 0.2, prefijo: str = "giit:limite:"):
+        if redis is None:
+            raise RuntimeError("LIMITADOR_BACKEND=redis requiere el paquete redis")
+        self._redis = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._script = self._redis.register_script(SCRIPT_REDIS)
+        self.fallo_abierto = fallo_abierto
+        self.prefijo = prefijo
+
+    def consumir(self, clave: str, capacidad: int, tasa: float) -> float:
+        try:
+            return float(self._script(keys=[self.prefijo + clave], args=[capacidad, tasa]))
+        except redis.RedisError as e:
+            if self.fallo_abierto:
+                logger.warning("Limitador sin Redis (%s): se admite %s sin limitar", e, clave)
+                return 0.0
+            logger.error("Limitador sin Redis (%s): se rechaza %s", e, clave)
+            return 1 / tasa
+
+    def claves(self) -> int:
+        return None
+
+
+class Limitador:
+    def __init__(self, backend):
+        self.backend = backend
+        self.limites = {}
+        self._lock = threading.Lock()
+
+    def limite(self, nombre: str, capacidad: int, tasa: float) -> Limite:
+        limite = Limite(nombre, capacidad, tasa)
+        self.limites[nombre] = limite
+        return limite
+
+    def consumir(self, limite: Limite, clave: str) -> float:
+        """Consume un token; devuelve 0 si se permite o los segundos hasta el próximo token."""
+        if self.backend is None:
+            return 0.0
+        espera = self.backend.consumir(f"{limite.nombre}:{clave}", limite.capacidad, limite.tasa)
+        with self._lock:
+            if espera:
+                limite.rechazadas += 1
+            else:
+                limite.permitidas += 1
+        return espera
+
+    async def consumir_async(self, limite: Limite, clave: str) -> float:
+        """consumir() para código async: con un backend de red no bloquea el bucle de eventos."""
+        if self.backend is not None and self.backend.bloqueante:
+            return await run_in_threadpool(self.consumir, limite, clave)
+        return self.consumir(limite, clave)
+
+    def estadisticas(self) -> dict:
+        return {
+            "backend": config.LIMITADOR_BACKEND,
+            "claves": self.backend.claves() if self.backend is not None else 0,
+            "limites": {
+                nombre: {
+                    "capacidad": limite.capacidad,
+                    "tasa": limite.tasa,
+                    "permitidas": limite.permitidas,
+                    "rechazadas": limite.rechazadas
+                }
+                for nombre, limite in self.limites.items()
+            }
+        }
+
+
+def _crear_backend():
+    if config.LIMITADOR_BACKEND == "redis":
+        return CubosRedis(config.LIMITADOR_REDIS_URL, config.LIMITADOR_FALLO_ABIERTO, config.LIMITADOR_REDIS_TIMEOUT)
+    if config.LIMITADOR_BACKEND == "memoria":
+        return CubosMemoria(config.LIMITADOR_MAX_CLAVES)
+    return None
+
+
+limitador = Limitador(_crear_backend())
+
+LIMITE_LOGIN_IP = limitador.limite("login_ip", config.LIMITADOR_LOGIN_IP_CAPACIDAD, config.LIMITADOR_LOGIN_IP_TASA)
+LIMITE_LOGIN_EMAIL = limitador.limite("login_email", config.LIMITADOR_LOGIN_EMAIL_CAPACIDAD, config.LIMITADOR_LOGIN_EMAIL_TASA)
+LIMITE_ESCRITURA = limitador.limite("escritura", config.LIMITADOR_ESCRITURA_CAPACIDAD, config.LIMITADOR_ESCRITURA_TASA)
+
+
+def ip_cliente(scope: Scope) -> str:
+    # Detrás de un proxy, uvicorn --proxy-headers ya pone aquí la IP de X-Forwarded-For
+    cliente = scope.get("client")
+    return cliente[0] if cliente else "desconocido"
+
+
+def limitar(limite: Limite, clave: str):
+    """Lanza 429 con Retry-After si `clave` agotó su cubo en `limite`."""
+    espera = limitador.consumir(limite, clave)
+    if espera:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=MENSAJE_LIMITE,
+            headers={"Retry-After": str(math.ceil(espera))}
+        )
+
+
+def limitar_login(request: Request, email: str):
+    limitar(LIMITE_LOGIN_IP, ip_cliente(request.scope))
+    limitar(LIMITE_LOGIN_EMAIL, email.strip().lower())
+
+
+class LimitadorEscriturasMiddleware:
+    """
+    Aplica el límite de escrituras por IP a los métodos POST, PUT, PATCH y DELETE, salvo
+    en las rutas `excluidas` (las que ya tienen sus propios límites, como /login).
+    """
+
+    def __init__(self, app: ASGIApp, limite: Limite, excluidas: tuple = ()):
+        self.app = app
+        self.limite = limite
+        self.excluidas = excluidas
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in METODOS_ESCRITURA
+            or scope["path"] in self.excluidas
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        espera = await limitador.consumir_async(self.limite, ip_cliente(scope))
+        if not espera:
+            await self.app(scope, receive, send)
+            return
+
+        cuerpo = json.dumps({"detail": MENSAJE_LIMITE}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_429_TOO_MANY_REQUESTS,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"retry-after", str(math.ceil(espera)).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
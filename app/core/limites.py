@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE de PostgreSQL para query_canceled (statement_timeout)
+QUERY_CANCELED = "57014"
+
+MENSAJE_OCUPADO = "Servidor ocupado, reintente más tarde"
+MENSAJE_PLAZO = "La petición superó su tiempo máximo"
+
+
+class LimiteRuta:
+    """
+    Regla de LimitesMiddleware para las rutas que empiezan por `prefijo` (y, si se
+    indican `sufijos`, terminan en alguno de ellos, para rutas con ids en medio).
+    `concurrencia` es el máximo de peticiones simultáneas por proceso (0 = sin límite)
+    y `plazo` los segundos que puede durar cada una (None = sin plazo).
+    """
+
+    def __init__(self, prefijo: str, metodos: tuple = None, concurrencia: int = 0, plazo: float = None, sufijos: tuple = None):
+        self.prefijo = prefijo
+        self.metodos = metodos
+        self.sufijos = sufijos
+        self.concurrencia = concurrencia
+        self.plazo = plazo
+        self.activas = 0
+
+    def coincide(self, metodo: str, ruta: str) -> bool:
+        return (
+            ruta.startswith(self.prefijo)
+            and (not self.sufijos or ruta.endswith(self.sufijos))
+            and (not self.metodos or metodo in self.metodos)
+        )
+
+
+class LimitesMiddleware:
+    """
+    Aplica la primera regla que coincide con la petición: rechaza con 503 cuando la ruta
+    ya tiene su máximo de peticiones en curso y responde 504 si no empieza a responder
+    dentro del plazo. El plazo queda en request.state.plazo para que get_db lo propague
+    a PostgreSQL como statement_timeout y la consulta se cancele también en el servidor.
+    """
+
+    def __init__(self, app: ASGIApp, reglas: list, retry_after: int = 2):
+        self.app = app
+        self.reglas = reglas
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        regla = next((regla for regla in self.reglas if regla.coincide(scope["method"], scope["path"])), None)
+        if regla is None or (not regla.concurrencia and regla.plazo is None):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._ocupar(regla):
+            await self._responder(send, status.HTTP_503_SERVICE_UNAVAILABLE, MENSAJE_OCUPADO)
+            return
+
+        if regla.plazo is None:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self._liberar(regla)
+            return
+
+        scope.setdefault("state", {})["plazo"] = time.monotonic() + regla.plazo
+        iniciada = False
+
+        async def enviar(message: Message):
+            nonlocal iniciada
+            if message["type"] == "http.response.start":
+                iniciada = True
+            await send(message)
+
+        tarea = asyncio.ensure_future(self.app(scope, receive, enviar))
+        # El cupo se libera cuando la petición termina de verdad, no al responder 504:
+        # un endpoint síncrono sigue ocupando su hilo y su conexión hasta acabar
+        tarea.add_done_callback(lambda _: self._liberar(regla))
+        try:
+            await asyncio.wait({tarea}, timeout=regla.plazo)
+        except asyncio.CancelledError:
+            tarea.cancel()
+            raise
+
+        # Ya terminada, o respondiendo (streaming): el plazo no corta una respuesta iniciada
+        if tarea.done() or iniciada:
+            await tarea
+            return
+        tarea.cancel()
+        await self._responder(send, status.HTTP_504_GATEWAY_TIMEOUT, MENSAJE_PLAZO)
+
+    def _ocupar(self, regla: LimiteRuta) -> bool:
+        with self._lock:
+            if regla.concurrencia and regla.activas >= regla.concurrencia:
+                return False
+            regla.activas += 1
+            return True
+
+    def _liberar(self, regla: LimiteRuta):
+        with self._lock:
+            regla.activas -= 1
+
+    async def _responder(self, send: Send, codigo: int, mensaje: str):
+        cuerpo = json.dumps({"detail": mensaje}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": codigo,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"retry-after", str(self.retry_after).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
+
+
+async def consulta_cancelada_handler(request: Request, exc: OperationalError):
+    """Una consulta cancelada por statement_timeout se responde como 504; el resto de errores, como 500."""
+    if getattr(exc.orig, "pgcode", None) != QUERY_CANCELED:
+        logger.error("Error de base de datos en %s %s", request.method, request.url.path, exc_info=exc)
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"detail": "Internal Server Error"}
+        )
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"detail": MENSAJE_PLAZO},
+        headers={"Retry-After": str(config.LIMITES_RETRY_AFTER)}
+    )
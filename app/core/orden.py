@@ -0,0 +1,122 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from fastapi import HTTPException, status
+from sqlalchemy import Date, DateTime, func, literal_column, tuple_
+
+# Cabecera con el cursor de la página siguiente (ausente en la última página)
+CABECERA_CURSOR = "X-Siguiente-Cursor"
+
+
+def _minimo(columna):
+    if isinstance(columna.type, DateTime):
+        return literal_column("'-infinity'::timestamp")
+    if isinstance(columna.type, Date):
+        return literal_column("'-infinity'::date")
+    return None
+
+
+def expresion_orden(columna):
+    """
+    Expresión por la que se ordena una columna. Las fechas nulas se ordenan como
+    '-infinity' (las más antiguas): así la clave nunca es NULL y la comparación por
+    tuplas del cursor es válida. Debe coincidir con los índices de INDICES_ORDEN.
+    """
+    minimo = _minimo(columna)
+    return func.coalesce(columna, minimo) if minimo is not None else columna
+
+
+class Ordenamiento:
+    """
+    Orden por una lista blanca de campos (`sort=campo` o `sort=-campo`) y paginación por
+    cursor sobre (campo, clave primaria). Cada campo tiene un índice (campo, clave
+    primaria) en las migraciones, así ORDER BY ... LIMIT y la continuación desde el
+    cursor se resuelven recorriendo el índice en cualquiera de los dos sentidos.
+    """
+
+    def __init__(self, clave_primaria, campos: list):
+        self.clave_primaria = clave_primaria
+        self.campos = {columna.key: columna for columna in campos}
+
+    def aplicar(self, query, sort: str = None, cursor: str = None):
+        if sort is None and cursor is None:
+            return query
+        campo, descendente = self._campo(sort)
+        expresion = expresion_orden(campo) if campo is not None else None
+        clave = (expresion, self.clave_primaria) if expresion is not None else (self.clave_primaria,)
+
+        if cursor is not None:
+            valores = self._decodificar(cursor, sort, campo)
+            fila = tuple_(*clave)
+            query = query.filter(fila < tuple_(*valores) if descendente else fila > tuple_(*valores))
+
+        return query.order_by(*(columna.desc() if descendente else columna for columna in clave))
+
+    def cabeceras(self, filas: list, limit: int, sort: str = None) -> dict:
+        cursor = self.siguiente_cursor(filas, limit, sort)
+        return {CABECERA_CURSOR: cursor} if cursor else {}
+
+    def cabeceras_consulta(self, query, skip: int, limit: int, sort: str = None) -> dict:
+        """
+        Mismas cabeceras que `cabeceras` sin materializar la página: solo se lee su última
+        fila. La usan las páginas transmitidas por lotes, que envían las cabeceras primero.
+        """
+        ultima = query.offset(skip + limit - 1).limit(1).first()
+        return self.cabeceras([ultima], 1, sort) if ultima is not None else {}
+
+    def siguiente_cursor(self, filas: list, limit: int, sort: str = None):
+        """Cursor que continúa tras la última fila; None si no hay más páginas."""
+        if not filas or len(filas) < limit:
+            return None
+        campo, _ = self._campo(sort)
+        ultima = filas[-1]
+        valores = [getattr(ultima, self.clave_primaria.key)]
+        if campo is not None:
+            valor = getattr(ultima, campo.key)
+            valores.insert(0, valor.isoformat() if isinstance(valor, (date, datetime)) else valor)
+        contenido = json.dumps({"sort": sort, "valores": valores}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(contenido.encode()).decode().rstrip("=")
+
+    def _campo(self, sort: str):
+        # Sin sort (solo cursor) se ordena por la clave primaria
+        if sort is None:
+            return None, False
+        descendente = sort.startswith("-")
+        campo = self.campos.get(sort.lstrip("-"))
+        if campo is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Orden no permitido: {sort}. Valores válidos: {', '.join(self.campos)} (con - para descendente)"
+            )
+        return campo, descendente
+
+    def _decodificar(self, cursor: str, sort: str, campo) -> list:
+        try:
+            contenido = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if contenido["sort"] != sort:
+                raise ValueError("el cursor pertenece a otro orden")
+            valores = contenido["valores"]
+            if len(valores) != (2 if campo is not None else 1):
+                raise ValueError("número de valores incorrecto")
+            valores[-1] = int(valores[-1])
+            if campo is not None:
+                valores[0] = self._valor_campo(campo, valores[0])
+            return valores
+        except (binascii.Error, UnicodeDecodeError, TypeError, KeyError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+
+    def _valor_campo(self, campo, valor):
+        if valor is None:
+            # Misma representación que expresion_orden para las fechas nulas
+            return _minimo(campo)
+        if isinstance(campo.type, DateTime):
+            return datetime.fromisoformat(valor)
+        if isinstance(campo.type, Date):
+            return date.fromisoformat(valor)
+        if not isinstance(valor, str):
+            raise ValueError("valor de cursor inválido")
+        return valor
@@ -0,0 +1,137 @@
+from fastapi import HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from app.core import config
+from app.core.coalescencia import serializar
+from app.database.database import sesion_lectura
+
+# Cabecera que indica que la página se transmitió por lotes en lugar de cachearse
+CABECERA_PAGINACION = "X-Paginacion"
+
+# Peso de cada página medida en la media móvil de bytes por fila
+PESO_MEDIDA = 0.2
+
+
+class Pagina:
+    def __init__(self, skip: int, limit: int, streaming: bool, paginacion=None):
+        self.skip = skip
+        self.limit = limit
+        self.streaming = streaming
+        self.paginacion = paginacion
+
+    def aplicar(self, query):
+        return query.offset(self.skip).limit(self.limit)
+
+    def medir(self, bytes_pagina: int, filas: int):
+        if self.paginacion is not None:
+            self.paginacion.medir(bytes_pagina, filas)
+
+
+class Paginacion:
+    """
+    Dependencia de skip/limit de los listados. `bytes_por_fila` es el tamaño medio de
+    una fila serializada con sus relaciones: si limit * bytes_por_fila supera
+    PAGINACION_PRESUPUESTO_BYTES la página no se materializa entera, se transmite por
+    lotes (Pagina.streaming) o, en los listados sin streaming, se rechaza con 400.
+    El valor inicial es una estimación; cada página servida la corrige con su tamaño real.
+    """
+
+    def __init__(self, bytes_por_fila: int, streaming: bool = True):
+        self.bytes_por_fila = bytes_por_fila
+        self.streaming = streaming
+
+    def __call__(
+        self,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(config.PAGINACION_LIMITE_DEFECTO, ge=1)
+    ) -> Pagina:
+        if limit > config.PAGINACION_LIMITE_MAX:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"limit no puede superar {config.PAGINACION_LIMITE_MAX}; usa cursor para recorrer el listado"
+            )
+        excede = limit * self.bytes_por_fila > config.PAGINACION_PRESUPUESTO_BYTES
+        if excede and not self.streaming:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"La página supera el tamaño máximo de respuesta; usa limit <= {self.limite_presupuesto}"
+            )
+        return Pagina(skip, limit, excede, self)
+
+    @property
+    def limite_presupuesto(self) -> int:
+        return max(1, int(config.PAGINACION_PRESUPUESTO_BYTES // self.bytes_por_fila))
+
+    def medir(self, bytes_pagina: int, filas: int):
+        """Acerca bytes_por_fila (media móvil, por proceso) al tamaño real de una página serializada."""
+        if filas:
+            self.bytes_por_fila += PESO_MEDIDA * (bytes_pagina / filas - self.bytes_por_fila)
+
+    def respuesta(self, adaptador: TypeAdapter, filas: list) -> Response:
+        """
+        Respuesta de los listados sin streaming: serializa la página y comprueba su tamaño
+        real contra el presupuesto, que la estimación previa de __call__ puede no detectar.
+        """
+        cuerpo = serializar(adaptador, filas)
+        self.medir(len(cuerpo), len(filas))
+        if len(cuerpo) > config.PAGINACION_PRESUPUESTO_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"La página supera el tamaño máximo de respuesta; usa limit <= {self.limite_presupuesto}"
+            )
+        return Response(content=cuerpo, media_type="application/json")
+
+
+def limite_coleccion(limit: int = Query(config.COLECCION_LIMITE_DEFECTO, ge=1)) -> int:
+    """
+    Elementos de cada colección anidada en un detalle (portafolio, perfil). Los totales
+    vienen en los conteos; el resto se recorre con los listados y su cursor.
+    """
+    if limit > config.COLECCION_LIMITE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit no puede superar {config.COLECCION_LIMITE_MAX}; usa los listados para recorrer la colección"
+        )
+    return limit
+
+
+def respuesta_streaming(request: Request, adaptador: TypeAdapter, filtrar, pagina: Pagina, convertir=None, cabeceras=None) -> StreamingResponse:
+    """
+    Transmite la página como un array JSON sin materializarla: `filtrar(db)` devuelve la
+    consulta ya filtrada y ordenada, que se recorre con un cursor de servidor de
+    PAGINACION_LOTE filas; cada lote se convierte (`convertir(fila)`), se serializa con
+    `adaptador` (el mismo List[...] del listado cacheado) y se envía. La memoria queda
+    acotada a un lote. `cabeceras(query)` se resuelve antes de empezar a enviar.
+    """
+    cabeceras_respuesta = {CABECERA_PAGINACION: "streaming"}
+    if cabeceras is not None:
+        with sesion_lectura(request) as db:
+            cabeceras_respuesta.update(cabeceras(filtrar(db)))
+
+    def serializar_lote(lote: list) -> bytes:
+        # Sin los corchetes del array: los lotes se unen con comas dentro de uno solo
+        return serializar(adaptador, lote)[1:-1]
+
+    def generar():
+        yield b"["
+        enviados = filas = 0
+        with sesion_lectura(request) as db:
+            query = pagina.aplicar(filtrar(db)).yield_per(config.PAGINACION_LOTE)
+            lote = []
+            separador = b""
+            for fila in query:
+                lote.append(convertir(fila) if convertir is not None else fila)
+                if len(lote) >= config.PAGINACION_LOTE:
+                    bloque = separador + serializar_lote(lote)
+                    enviados, filas = enviados + len(bloque), filas + len(lote)
+                    yield bloque
+                    separador = b","
+                    lote = []
+            if lote:
+                bloque = separador + serializar_lote(lote)
+                enviados, filas = enviados + len(bloque), filas + len(lote)
+                yield bloque
+        yield b"]"
+        pagina.medir(enviados, filas)
+
+    return StreamingResponse(generar(), media_type="application/json", headers=cabeceras_respuesta)
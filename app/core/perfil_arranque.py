@@ -0,0 +1,139 @@
+"""
+Perfil del arranque en frío: python -m app.core.perfil_arranque
+
+Importa main en un proceso nuevo con `python -X importtime`, mide el tiempo hasta
+responder la primera petición y muestra los módulos que más tardan en importarse.
+Con --presupuesto termina con código 1 si el arranque lo supera (útil en CI).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Ruta de la primera petición: lee de la base de datos, así el tiempo incluye abrir la
+# primera conexión del pool y cargar los mapeos de SQLAlchemy, no solo la importación
+RUTA_PRIMERA_PETICION = "/roles/"
+
+# Código que ejecuta el proceso medido: importa la aplicación y atiende GET <ruta> en
+# memoria, sin socket, para medir solo el coste propio del arranque
+PROGRAMA_MEDIDO = """
+import asyncio, json, sys, time
+ruta = sys.argv[1]
+inicio = time.perf_counter()
+from main import app
+importado = time.perf_counter()
+
+async def primera_peticion():
+    mensajes = []
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": ruta, "raw_path": ruta.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        mensajes.append(mensaje)
+
+    await app(scope, receive, send)
+    return mensajes[0]["status"]
+
+estado = asyncio.run(primera_peticion())
+fin = time.perf_counter()
+print(json.dumps({"importacion": importado - inicio, "primera_peticion": fin - importado, "estado": estado}))
+"""
+
+
+def medir(directorio: str, ruta: str = RUTA_PRIMERA_PETICION) -> tuple:
+    """Ejecuta el programa medido y devuelve (tiempos, líneas de -X importtime)."""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROGRAMA_MEDIDO, ruta],
+        cwd=directorio,
+        capture_output=True,
+        text=True
+    )
+    if resultado.returncode != 0:
+        sys.stderr.write(resultado.stderr)
+        raise SystemExit(f"La aplicación no arrancó (código {resultado.returncode})")
+    tiempos = json.loads(resultado.stdout.strip().splitlines()[-1])
+    return tiempos, resultado.stderr.splitlines()
+
+
+def leer_importtime(lineas: list) -> list:
+    """Convierte la salida de -X importtime en (módulo, propio_us, acumulado_us)."""
+    modulos = []
+    for linea in lineas:
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        modulos.append((nombre.strip(), int(propio), int(acumulado)))
+    return modulos
+
+
+def por_paquete(modulos: list) -> list:
+    """Tiempo propio sumado por paquete de primer nivel (fastapi, sqlalchemy, app...)."""
+    totales = defaultdict(int)
+    for nombre, propio, _ in modulos:
+        totales[nombre.split(".")[0]] += propio
+    return sorted(totales.items(), key=lambda item: item[1], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.core.perfil_arranque",
+        description="Coste de importación por módulo y tiempo hasta la primera petición"
+    )
+    parser.add_argument("--top", type=int, default=25, help="Módulos a mostrar")
+    parser.add_argument(
+        "--presupuesto", type=float, default=None,
+        help="Milisegundos máximos hasta la primera petición; si se superan, termina con código 1"
+    )
+    parser.add_argument(
+        "--ruta", default=RUTA_PRIMERA_PETICION,
+        help=f"Ruta GET de la primera petición (por defecto {RUTA_PRIMERA_PETICION})"
+    )
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    tiempos, lineas = medir(os.getcwd(), args.ruta)
+    modulos = leer_importtime(lineas)
+    total_ms = (tiempos["importacion"] + tiempos["primera_peticion"]) * 1000
+
+    propios = sorted(modulos, key=lambda modulo: modulo[1], reverse=True)[:args.top]
+    paquetes = por_paquete(modulos)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "importacion_ms": tiempos["importacion"] * 1000,
+            "primera_peticion_ms": tiempos["primera_peticion"] * 1000,
+            "total_ms": total_ms,
+            "estado": tiempos["estado"],
+            "modulos": [{"modulo": n, "propio_us": p, "acumulado_us": a} for n, p, a in propios],
+            "paquetes": [{"paquete": n, "propio_us": p} for n, p in paquetes]
+        }, indent=2))
+    else:
+        print(f"Importación de main:  {tiempos['importacion'] * 1000:8.1f} ms")
+        print(f"Primera petición:     {tiempos['primera_peticion'] * 1000:8.1f} ms (estado {tiempos['estado']})")
+        print(f"Total:                {total_ms:8.1f} ms")
+        print(f"\nMódulos con más tiempo propio ({len(modulos)} importados):")
+        print(f"{'propio ms':>10} {'acumulado ms':>13}  módulo")
+        for nombre, propio, acumulado in propios:
+            print(f"{propio / 1000:10.1f} {acumulado / 1000:13.1f}  {nombre}")
+        print("\nTiempo propio por paquete:")
+        for nombre, propio in paquetes:
+            print(f"{propio / 1000:10.1f}  {nombre}")
+
+    if tiempos["estado"] != 200:
+        print(f"\nGET {args.ruta} respondió {tiempos['estado']}", file=sys.stderr)
+        raise SystemExit(1)
+    if args.presupuesto is not None and total_ms > args.presupuesto:
+        print(f"\nEl arranque ({total_ms:.1f} ms) supera el presupuesto de {args.presupuesto:.1f} ms", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+from contextlib import contextmanager
+from fastapi import HTTPException, status
+from sqlalchemy import exists, or_, select, union
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# SQLSTATE de PostgreSQL para foreign_key_violation
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def es_violacion_fk(e: IntegrityError) -> bool:
+    return getattr(e.orig, "pgcode", None) == FOREIGN_KEY_VIOLATION
+
+
+def verificar_referencias(db: Session, referencias):
+    """
+    Comprueba en una sola consulta que existen todas las filas referenciadas.
+    `referencias` es una lista de (columna_pk, valor, mensaje); los valores None se omiten.
+    Lanza 404 con el mensaje de la primera referencia que no exista.
+    """
+    pendientes = [(columna, valor, mensaje) for columna, valor, mensaje in referencias if valor is not None]
+    if not pendientes:
+        return
+
+    fila = db.execute(
+        select(*[exists().where(columna == valor) for columna, valor, _ in pendientes])
+    ).one()
+    for existe, (_, _, mensaje) in zip(fila, pendientes):
+        if not existe:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=mensaje
+            )
+
+
+@contextmanager
+def traducir_errores_fk(db: Session, mensajes_fk: dict):
+    """
+    Traduce las violaciones de foreign key del flush/commit del bloque (p. ej. si la
+    fila referenciada se borró después de verificar_referencias) al mismo 404 que la
+    verificación previa. `mensajes_fk` relaciona el nombre de la columna FK con su mensaje.
+    """
+    try:
+        yield
+    except IntegrityError as e:
+        db.rollback()
+        if es_violacion_fk(e):
+            restriccion = getattr(getattr(e.orig, "diag", None), "constraint_name", None) or ""
+            for columna, mensaje in mensajes_fk.items():
+                if restriccion.endswith(f"_{columna}_fkey"):
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=mensaje
+                    ) from e
+        raise
+
+
+def verificar_dependientes(db: Session, columnas_fk: list, valor, mensaje: str):
+    """
+    Comprueba en una sola consulta EXISTS si alguna fila referencia `valor` desde
+    cualquiera de `columnas_fk`, sin cargar esas filas. Lanza 400 con `mensaje` si la hay.
+    """
+    if db.execute(select(or_(*[exists().where(columna == valor) for columna in columnas_fk]))).scalar():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=mensaje
+        )
+
+
+def ids_con_dependientes(db: Session, columnas_fk: list, ids: list) -> set:
+    """De `ids`, los que alguna fila referencia desde `columnas_fk` (una sola consulta)."""
+    if not ids:
+        return set()
+    return set(db.execute(union(*[select(columna).where(columna.in_(ids)) for columna in columnas_fk])).scalars())
+
+
+@contextmanager
+def traducir_errores_dependientes(db: Session, mensaje: str):
+    """
+    Traduce la violación de foreign key de un DELETE (un dependiente creado después de
+    verificar_dependientes) al mismo 400 que la verificación previa, en lugar de un 500.
+    """
+    try:
+        yield
+    except IntegrityError as e:
+        db.rollback()
+        if es_violacion_fk(e):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=mensaje
+            ) from e
+        raise
+
+
+def eliminar_lote(db: Session, clave_primaria, ids: list, columnas_fk: list, no_encontrado: str, con_dependientes: str):
+    """
+    Elimina las filas de `ids` que no tienen dependientes y devuelve (resultados por id,
+    filas eliminadas). Las filas y sus dependientes se consultan una sola vez para todo
+    el lote; cada borrado va en su propio savepoint, así una violación de foreign key
+    (un dependiente creado entre la consulta y el borrado) solo afecta a ese id.
+    """
+    ids = list(dict.fromkeys(ids))
+    modelo = clave_primaria.class_
+    filas = {getattr(fila, clave_primaria.key): fila for fila in db.query(modelo).filter(clave_primaria.in_(ids))}
+    bloqueados = ids_con_dependientes(db, columnas_fk, list(filas))
+
+    resultados = []
+    eliminadas = []
+    for id_registro in ids:
+        fila = filas.get(id_registro)
+        if fila is None:
+            resultados.append({"id": id_registro, "estado": "no_encontrado", "detalle": no_encontrado})
+            continue
+        if id_registro in bloqueados:
+            resultados.append({"id": id_registro, "estado": "con_dependientes", "detalle": con_dependientes})
+            continue
+        try:
+            with db.begin_nested():
+                db.delete(fila)
+        except IntegrityError as e:
+            if not es_violacion_fk(e):
+                raise
+            resultados.append({"id": id_registro, "estado": "con_dependientes", "detalle": con_dependientes})
+            continue
+        resultados.append({"id": id_registro, "estado": "eliminado", "detalle": None})
+        eliminadas.append(fila)
+
+    db.commit()
+    return resultados, eliminadas
@@ -0,0 +1,315 @@
+"""
+Medidas de rendimiento: python -m app.core.rendimiento
+
+Atiende peticiones en memoria contra la aplicación (sin socket, como perfil_arranque)
+sobre la base de datos configurada y mide:
+
+- compresion:    coste de CPU de comprimir un listado real con cada algoritmo disponible
+- escritura:     latencia (p50/p95), consultas SQL y rendimiento de las rutas de escritura
+- serializacion: coste por fila de validar y serializar el listado de productos
+
+Las escrituras crean sus propias filas y las eliminan al terminar. Necesita al menos un
+usuario y una tipología (python -m app.database.migraciones crea los datos por defecto).
+Repetir la misma orden antes y después de un cambio permite comparar los resultados.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+# Sin el limitador de escrituras por IP: todas las peticiones salen de la misma dirección
+os.environ.setdefault("LIMITADOR_BACKEND", "ninguno")
+
+MEDIDAS = ("compresion", "escritura", "serializacion")
+
+# Listado real que se comprime y serializa
+RUTA_LISTADO = "/productos/"
+
+
+class ClienteASGI:
+    """Peticiones directas a la aplicación ASGI; cuenta las sentencias SQL de cada una."""
+
+    def __init__(self, app):
+        self.app = app
+        self.sentencias = 0
+
+    def contar(self, conn, cursor, statement, parameters, context, executemany):
+        self.sentencias += 1
+
+    async def peticion(self, metodo: str, ruta: str, cuerpo=None, consulta: str = "") -> tuple:
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else b""
+        scope = {
+            "type": "http", "http_version": "1.1", "method": metodo, "scheme": "http",
+            "path": ruta, "raw_path": ruta.encode(), "root_path": "",
+            "query_string": consulta.encode(),
+            "headers": [(b"host", b"localhost"), (b"content-type", b"application/json"),
+                        (b"content-length", str(len(datos)).encode())],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        mensajes = []
+        enviado = False
+
+        async def receive():
+            nonlocal enviado
+            if enviado:
+                return {"type": "http.disconnect"}
+            enviado = True
+            return {"type": "http.request", "body": datos, "more_body": False}
+
+        async def send(mensaje):
+            mensajes.append(mensaje)
+
+        await self.app(scope, receive, send)
+        estado = mensajes[0]["status"]
+        respuesta = b"".join(m.get("body", b"") for m in mensajes if m["type"] == "http.response.body")
+        return estado, respuesta
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def medir_compresion(cliente: ClienteASGI, repeticiones: int, limite: int) -> list:
+    """Tamaño, ratio y milisegundos por respuesta de cada algoritmo con su nivel configurado."""
+    from app.core import config
+    from app.core.compresion import CompresionMiddleware
+
+    estado, cuerpo = asyncio.run(cliente.peticion("GET", RUTA_LISTADO, consulta=f"limit={limite}"))
+    if estado != 200:
+        raise SystemExit(f"GET {RUTA_LISTADO} respondió {estado}")
+
+    compresion = CompresionMiddleware(
+        None,
+        algoritmos=["br", "zstd", "gzip"],
+        nivel_gzip=config.COMPRESION_NIVEL_GZIP,
+        nivel_brotli=config.COMPRESION_NIVEL_BROTLI,
+        nivel_zstd=config.COMPRESION_NIVEL_ZSTD
+    )
+    resultados = []
+    for algoritmo in compresion.algoritmos:
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            compresor = compresion.compresor(algoritmo)
+            comprimido = compresor.compress(cuerpo) + compresor.flush()
+            tiempos.append(time.perf_counter() - inicio)
+        mediana = statistics.median(tiempos)
+        resultados.append({
+            "algoritmo": algoritmo,
+            "nivel": compresion.niveles[algoritmo],
+            "bytes": len(cuerpo),
+            "bytes_comprimidos": len(comprimido),
+            "ratio": len(cuerpo) / len(comprimido),
+            "ms": mediana * 1000,
+            "mb_s": len(cuerpo) / mediana / 1e6
+        })
+    return resultados
+
+
+def _escrituras(usuario: int, tipologia: int) -> list:
+    """(entidad, petición que crea la fila, operaciones sobre ella, ruta de borrado, clave primaria)."""
+    return [
+        (
+            "productos",
+            ("POST", "/productos/", {
+                "nombre": "Medida de rendimiento", "id_tipologia": tipologia,
+                "id_responsable": usuario, "estado_desarrollo": "idea"
+            }),
+            [
+                ("PUT", "/productos/{id}", {
+                    "nombre": "Medida de rendimiento (editado)", "id_tipologia": tipologia,
+                    "id_responsable": usuario, "estado_desarrollo": "desarrollo"
+                }, ""),
+                ("PATCH", "/productos/{id}", {"descripcion": "parcial"}, ""),
+                ("PUT", "/productos/{id}/aprobar", None, f"id_aprobador={usuario}"),
+            ],
+            "/productos/{id}",
+            "id_producto"
+        ),
+        (
+            "publicaciones",
+            ("POST", "/publicaciones/", {
+                "titulo": "Medida de rendimiento", "autores": "GIIT", "id_autor_principal": usuario
+            }),
+            [
+                ("PUT", "/publicaciones/{id}", {
+                    "titulo": "Medida de rendimiento (editado)", "autores": "GIIT", "id_autor_principal": usuario
+                }, ""),
+                ("PATCH", "/publicaciones/{id}", {"resumen": "parcial"}, ""),
+                ("PUT", "/publicaciones/{id}/aprobar", None, f"id_aprobador={usuario}"),
+            ],
+            "/publicaciones/{id}",
+            "id_publicacion"
+        ),
+    ]
+
+
+def medir_escritura(cliente: ClienteASGI, repeticiones: int, concurrencia: int) -> tuple:
+    """Latencia y sentencias SQL de cada ruta de escritura, y peticiones por segundo."""
+    from app.database.database import SessionLocal
+    from app.models import models
+
+    db = SessionLocal()
+    try:
+        usuario = db.query(models.Usuario.id_usuario).order_by(models.Usuario.id_usuario).first()
+        tipologia = db.query(models.Tipologia.id_tipologia).order_by(models.Tipologia.id_tipologia).first()
+    finally:
+        db.close()
+    if usuario is None or tipologia is None:
+        raise SystemExit("Se necesita al menos un usuario y una tipología en la base de datos")
+
+    muestras = {}
+
+    async def registrar(nombre: str, metodo: str, ruta: str, cuerpo, consulta: str = ""):
+        sentencias = cliente.sentencias
+        inicio = time.perf_counter()
+        estado, respuesta = await cliente.peticion(metodo, ruta, cuerpo, consulta)
+        duracion = time.perf_counter() - inicio
+        if estado >= 400:
+            raise SystemExit(f"{metodo} {ruta} respondió {estado}: {respuesta[:200]!r}")
+        muestra = muestras.setdefault(nombre, {"tiempos": [], "sentencias": []})
+        muestra["tiempos"].append(duracion)
+        # Con concurrencia > 1 las sentencias de peticiones simultáneas se mezclan
+        muestra["sentencias"].append(cliente.sentencias - sentencias)
+        return respuesta
+
+    async def ciclo(escritura):
+        _, (metodo, ruta, cuerpo), operaciones, ruta_borrado, clave = escritura
+        creada = json.loads(await registrar(f"{metodo} {ruta}", metodo, ruta, cuerpo))
+        id_fila = creada[clave]
+        for metodo_op, ruta_op, cuerpo_op, consulta in operaciones:
+            await registrar(f"{metodo_op} {ruta_op}", metodo_op, ruta_op.format(id=id_fila), cuerpo_op, consulta)
+        await registrar(f"DELETE {ruta_borrado}", "DELETE", ruta_borrado.format(id=id_fila), None)
+
+    async def ejecutar():
+        escrituras = _escrituras(usuario[0], tipologia[0])
+        # Calentamiento: primera conexión del pool, mapeos y cachés de sentencias compiladas
+        for escritura in escrituras:
+            await ciclo(escritura)
+        muestras.clear()
+
+        inicio = time.perf_counter()
+        pendientes = [escritura for _ in range(repeticiones) for escritura in escrituras]
+        for i in range(0, len(pendientes), concurrencia):
+            await asyncio.gather(*(ciclo(escritura) for escritura in pendientes[i:i + concurrencia]))
+        return time.perf_counter() - inicio
+
+    total = asyncio.run(ejecutar())
+    peticiones = sum(len(muestra["tiempos"]) for muestra in muestras.values())
+    resultados = [
+        {
+            "ruta": nombre,
+            "peticiones": len(muestra["tiempos"]),
+            "p50_ms": percentil(muestra["tiempos"], 50) * 1000,
+            "p95_ms": percentil(muestra["tiempos"], 95) * 1000,
+            "sentencias": statistics.median(muestra["sentencias"])
+        }
+        for nombre, muestra in muestras.items()
+    ]
+    return resultados, {"peticiones": peticiones, "segundos": total, "peticiones_s": peticiones / total}
+
+
+def medir_serializacion(repeticiones: int, limite: int) -> dict:
+    """Microsegundos por fila de validar y serializar el listado de productos (sin la consulta)."""
+    from sqlalchemy.orm import joinedload
+    from app.core.coalescencia import serializar
+    from app.database.database import SessionLocal
+    from app.models import models
+    from app.routes.productos import _producto_response, productos_adapter
+
+    db = SessionLocal()
+    try:
+        filas = db.query(models.Producto).options(
+            joinedload(models.Producto.responsable).joinedload(models.Usuario.rol),
+            joinedload(models.Producto.tipologia),
+            joinedload(models.Producto.linea).joinedload(models.LineaInvestigacion.responsable).joinedload(models.Usuario.rol),
+            joinedload(models.Producto.aprobador)
+        ).order_by(models.Producto.id_producto).limit(limite).all()
+        if not filas:
+            raise SystemExit("No hay productos que serializar")
+
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            cuerpo = serializar(productos_adapter, [_producto_response(fila) for fila in filas])
+            tiempos.append(time.perf_counter() - inicio)
+    finally:
+        db.close()
+    mediana = statistics.median(tiempos)
+    return {
+        "filas": len(filas),
+        "bytes_por_fila": len(cuerpo) / len(filas),
+        "ms": mediana * 1000,
+        "us_por_fila": mediana / len(filas) * 1e6
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.core.rendimiento",
+        description="Compresión, latencia de escrituras y coste de serialización por fila"
+    )
+    parser.add_argument(
+        "medidas", nargs="*", default=list(MEDIDAS),
+        help=f"Medidas a ejecutar (por defecto todas: {', '.join(MEDIDAS)})"
+    )
+    parser.add_argument("--repeticiones", type=int, default=50, help="Repeticiones de cada medida")
+    parser.add_argument("--limite", type=int, default=100, help=f"Filas del listado {RUTA_LISTADO}")
+    parser.add_argument(
+        "--concurrencia", type=int, default=1,
+        help="Ciclos de escritura simultáneos (1 = latencia sin contención)"
+    )
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+    desconocidas = set(args.medidas) - set(MEDIDAS)
+    if desconocidas:
+        parser.error(f"medidas desconocidas: {', '.join(sorted(desconocidas))}")
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    from sqlalchemy import event
+    from app.database.database import engine
+    from main import app
+
+    cliente = ClienteASGI(app)
+    event.listen(engine, "before_cursor_execute", cliente.contar)
+
+    resultados = {}
+    if "compresion" in args.medidas:
+        resultados["compresion"] = medir_compresion(cliente, args.repeticiones, args.limite)
+    if "escritura" in args.medidas:
+        rutas, total = medir_escritura(cliente, args.repeticiones, args.concurrencia)
+        resultados["escritura"] = {"rutas": rutas, "total": total}
+    if "serializacion" in args.medidas:
+        resultados["serializacion"] = medir_serializacion(args.repeticiones, args.limite)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    if "compresion" in resultados:
+        print(f"Compresión de GET {RUTA_LISTADO}?limit={args.limite}:")
+        print(f"{'algoritmo':>10} {'nivel':>6} {'bytes':>10} {'comprimido':>11} {'ratio':>7} {'ms':>8} {'MB/s':>8}")
+        for r in resultados["compresion"]:
+            print(
+                f"{r['algoritmo']:>10} {r['nivel']:>6} {r['bytes']:>10} {r['bytes_comprimidos']:>11} "
+                f"{r['ratio']:>7.1f} {r['ms']:>8.2f} {r['mb_s']:>8.1f}"
+            )
+    if "escritura" in resultados:
+        total = resultados["escritura"]["total"]
+        print(f"\nEscrituras (concurrencia {args.concurrencia}):")
+        print(f"{'p50 ms':>8} {'p95 ms':>8} {'SQL':>5}  ruta")
+        for r in resultados["escritura"]["rutas"]:
+            print(f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['sentencias']:>5g}  {r['ruta']}")
+        print(f"{total['peticiones']} peticiones en {total['segundos']:.2f} s: {total['peticiones_s']:.1f} peticiones/s")
+    if "serializacion" in resultados:
+        r = resultados["serializacion"]
+        print(f"\nSerialización de {r['filas']} productos: {r['ms']:.2f} ms, "
+              f"{r['us_por_fila']:.1f} µs/fila, {r['bytes_por_fila']:.0f} bytes/fila")
+
+
+if __name__ == "__main__":
+    main()
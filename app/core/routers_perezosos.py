@@ -0,0 +1,59 @@
+import importlib
+from fastapi import FastAPI
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from starlette.types import Receive, Scope, Send
+
+
+class RouterPerezoso(BaseRoute):
+    """
+    Reserva las rutas bajo `prefijo` para el router de `modulo` sin importarlo. La primera
+    petición que llega al prefijo importa el módulo, sustituye esta reserva por las rutas
+    del router (en la misma posición) y vuelve a enrutar la petición.
+    """
+
+    def __init__(self, app: FastAPI, prefijo: str, modulo: str, **opciones):
+        self.app = app
+        self.prefijo = prefijo.rstrip("/")
+        self.modulo = modulo
+        self.opciones = opciones
+        self.cargado = False
+
+    def matches(self, scope: Scope):
+        if scope["type"] == "http":
+            ruta = scope["path"]
+            if ruta == self.prefijo or ruta.startswith(self.prefijo + "/"):
+                return Match.FULL, {}
+        return Match.NONE, {}
+
+    def url_path_for(self, name: str, **path_params):
+        raise NoMatchFound(name, path_params)
+
+    def cargar(self):
+        if self.cargado:
+            return
+        self.cargado = True
+        router = importlib.import_module(self.modulo).router
+        rutas = self.app.router.routes
+        posicion = rutas.index(self)
+        antes = len(rutas)
+        self.app.include_router(router, **self.opciones)
+        # include_router añade al final: se mueven al lugar de la reserva, que se quita
+        nuevas = rutas[antes:]
+        del rutas[antes:]
+        rutas[posicion:posicion + 1] = nuevas
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send):
+        self.cargar()
+        await self.app.router(scope, receive, send)
+
+
+def incluir_perezoso(app: FastAPI, prefijo: str, modulo: str, **opciones):
+    """Registra el router de `modulo` (su atributo `router`) para que se importe en su primera petición."""
+    app.router.routes.append(RouterPerezoso(app, prefijo, modulo, **opciones))
+
+
+def cargar_perezosos(app: FastAPI):
+    """Importa todos los routers pendientes (p. ej. antes de generar el esquema OpenAPI)."""
+    for ruta in list(app.router.routes):
+        if isinstance(ruta, RouterPerezoso):
+            ruta.cargar()
@@ -0,0 +1,22 @@
+import hmac
+from fastapi import HTTPException, Request, status
+from app.core import config
+
+# Cabecera con el token de administrador (DEPURACION_TOKEN): da acceso a /debug y a las
+# estadísticas operativas, y activa la captura de SQL de la petición (app.core.depuracion)
+CABECERA_DEPURACION = "X-Depuracion"
+
+
+def es_administrador(token) -> bool:
+    return bool(config.DEPURACION_TOKEN) and token is not None and hmac.compare_digest(token, config.DEPURACION_TOKEN)
+
+
+def requerir_administrador(request: Request):
+    """Dependencia de las rutas de administración: sin DEPURACION_TOKEN configurado no existen."""
+    if not config.DEPURACION_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not es_administrador(request.headers.get(CABECERA_DEPURACION)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requiere el token de depuración"
+        )
@@ -0,0 +1,308 @@
+"""
+Lanzador de producción: python -m app.core.servidor
+
+Arranca un proceso maestro que abre el socket, importa la aplicación una sola vez
+(precarga) y hace fork de N workers uvicorn que comparten el código ya importado.
+El maestro reinicia los workers que mueren y con SIGHUP los reemplaza uno a uno
+sin dejar de aceptar conexiones.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from dotenv import load_dotenv
+
+logger = logging.getLogger("app.core.servidor")
+
+# Conexiones adicionales por worker fuera del pool (LISTEN de app.core.cambios)
+CONEXIONES_FUERA_POOL = 1
+
+# Tope del pool fijo por worker; el resto del reparto va a max_overflow
+POOL_SIZE_MAX = 5
+
+# Espera máxima a que un worker nuevo esté listo durante un reinicio
+ESPERA_ARRANQUE = 60
+
+# Segundos mínimos entre reinicios de un worker que muere repetidamente
+ESPERA_REINICIO = 1.0
+
+
+def max_connections() -> int:
+    """Lee max_connections de PostgreSQL con una conexión temporal."""
+    import psycopg2
+
+    conexion = psycopg2.connect(
+        host=os.environ["DB_HOST"],
+        port=os.environ["DB_PORT"],
+        dbname=os.environ["DB_NAME"],
+        user=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWORD"]
+    )
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute("SHOW max_connections")
+            return int(cursor.fetchone()[0])
+    finally:
+        conexion.close()
+
+
+def repartir_conexiones(maximo: int, reservadas: int, workers: int) -> tuple:
+    """
+    Reparte max_connections entre los workers dejando `reservadas` libres para
+    administración, migraciones y otros clientes. Devuelve (pool_size, max_overflow).
+    """
+    por_worker = (maximo - reservadas) // workers - CONEXIONES_FUERA_POOL
+    if por_worker < 1:
+        raise SystemExit(
+            f"max_connections={maximo} no alcanza para {workers} workers "
+            f"con {reservadas} conexiones reservadas"
+        )
+    pool_size = min(POOL_SIZE_MAX, por_worker)
+    return pool_size, por_worker - pool_size
+
+
+def crear_socket(host: str, port: int) -> socket.socket:
+    familia = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(familia, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def cargar_app():
+    from main import app
+    return app
+
+
+def liberar_conexiones(close: bool):
+    """
+    Descarta las conexiones del pool. En el maestro se cierran antes del fork; en el
+    worker se olvidan sin cerrarlas (close=False) para no romper las del proceso padre.
+    """
+    from app.database.database import engine, replica_engines
+
+    for motor in [engine, *replica_engines]:
+        motor.dispose(close=close)
+
+
+class Maestro:
+    def __init__(self, sock: socket.socket, args):
+        self.sock = sock
+        self.args = args
+        self.workers = {}
+        self.retirados = set()
+        self.ultimo_reinicio = 0.0
+        self.salir = False
+        self.recargar = False
+
+    def ejecutar(self):
+        signal.signal(signal.SIGTERM, self._senal_salir)
+        signal.signal(signal.SIGINT, self._senal_salir)
+        signal.signal(signal.SIGHUP, self._senal_recargar)
+
+        for _ in range(self.args.workers):
+            self._arrancar_worker()
+
+        while not self.salir:
+            if self.recargar:
+                self.recargar = False
+                self._reinicio_gradual()
+            self._recoger_muertos()
+            time.sleep(0.5)
+
+        self._detener_todos()
+
+    def _senal_salir(self, signum, frame):
+        self.salir = True
+
+    def _senal_recargar(self, signum, frame):
+        self.recargar = True
+
+    def _arrancar_worker(self, esperar: bool = False):
+        lectura, escritura = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(lectura)
+            try:
+                ejecutar_worker(self.sock, self.args, escritura)
+            except BaseException:
+                logger.exception("Error en el worker")
+                os._exit(1)
+            os._exit(0)
+
+        os.close(escritura)
+        self.workers[pid] = time.monotonic()
+        logger.info(f"Worker {pid} arrancado")
+        listo = True
+        if esperar:
+            listo = self._esperar_listo(lectura)
+        os.close(lectura)
+        return pid, listo
+
+    def _esperar_listo(self, lectura: int) -> bool:
+        import select
+
+        limite = time.monotonic() + ESPERA_ARRANQUE
+        while time.monotonic() < limite:
+            preparados, _, _ = select.select([lectura], [], [], 0.5)
+            if preparados:
+                # Un byte indica que escucha; EOF sin byte, que murió antes de arrancar
+                return os.read(lectura, 1) == b"1"
+        return False
+
+    def _reinicio_gradual(self):
+        logger.info("Reinicio gradual de workers")
+        for pid in list(self.workers):
+            if self.salir:
+                return
+            if pid not in self.workers:
+                continue
+            nuevo, listo = self._arrancar_worker(esperar=True)
+            if not listo:
+                logger.error(f"El worker {nuevo} no arrancó; se detiene y se conserva el worker {pid}")
+                # Sin esto seguiría contado como worker aunque nunca atienda peticiones
+                self.retirados.add(nuevo)
+                self._enviar(nuevo, signal.SIGTERM)
+                return
+            self.retirados.add(pid)
+            self._enviar(pid, signal.SIGTERM)
+
+    def _recoger_muertos(self):
+        while True:
+            try:
+                pid, estado = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.workers.pop(pid, None)
+            if pid in self.retirados:
+                self.retirados.discard(pid)
+                continue
+            if self.salir:
+                continue
+            logger.warning(f"Worker {pid} terminó con estado {os.waitstatus_to_exitcode(estado)}; se reinicia")
+            # Evitar un bucle de fork si el worker falla al arrancar
+            espera = self.ultimo_reinicio + ESPERA_REINICIO - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            self.ultimo_reinicio = time.monotonic()
+            self._arrancar_worker()
+
+    def _detener_todos(self):
+        for pid in self.workers:
+            self._enviar(pid, signal.SIGTERM)
+        limite = time.monotonic() + self.args.timeout_gracia + 5
+        while self.workers and time.monotonic() < limite:
+            self._recoger_muertos()
+            time.sleep(0.1)
+        for pid in self.workers:
+            logger.warning(f"Worker {pid} no terminó a tiempo; se fuerza la salida")
+            self._enviar(pid, signal.SIGKILL)
+        self.sock.close()
+
+    def _enviar(self, pid: int, senal: int):
+        try:
+            os.kill(pid, senal)
+        except ProcessLookupError:
+            pass
+
+
+def ejecutar_worker(sock: socket.socket, args, aviso: int):
+    import uvicorn
+
+    # uvicorn instala sus propios manejadores al arrancar
+    for senal in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(senal, signal.SIG_DFL)
+
+    app = cargar_app()
+    if not args.sin_precarga:
+        liberar_conexiones(close=False)
+
+    class Servidor(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            try:
+                if self.started:
+                    os.write(aviso, b"1")
+            except BrokenPipeError:
+                # El maestro solo espera el aviso durante un reinicio gradual
+                pass
+            os.close(aviso)
+
+    servidor = Servidor(uvicorn.Config(
+        app,
+        lifespan="on",
+        proxy_headers=True,
+        log_level=args.log_level,
+        timeout_graceful_shutdown=args.timeout_gracia
+    ))
+    servidor.run(sockets=[sock])
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        prog="python -m app.core.servidor",
+        description="Servidor de producción con varios workers uvicorn"
+    )
+    parser.add_argument("--host", default=os.environ.get("SERVIDOR_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SERVIDOR_PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.environ.get("SERVIDOR_WORKERS", os.cpu_count() or 1)),
+        help="Número de workers (por defecto, uno por núcleo)"
+    )
+    parser.add_argument(
+        "--reservadas", type=int, default=int(os.environ.get("SERVIDOR_CONEXIONES_RESERVADAS", "10")),
+        help="Conexiones de PostgreSQL que no se reparten entre los workers"
+    )
+    parser.add_argument(
+        "--timeout-gracia", type=int, default=int(os.environ.get("SERVIDOR_TIMEOUT_GRACIA", "30")),
+        help="Segundos que un worker espera a las peticiones en curso al detenerse"
+    )
+    parser.add_argument(
+        "--sin-precarga", action="store_true",
+        help="Cada worker importa la aplicación; SIGHUP carga así el código nuevo"
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(process)d] %(message)s")
+
+    # El tamaño del pool se fija antes de importar la aplicación, que crea el engine al importarse
+    if "DB_POOL_SIZE" not in os.environ:
+        pool_size, max_overflow = repartir_conexiones(max_connections(), args.reservadas, args.workers)
+        os.environ["DB_POOL_SIZE"] = str(pool_size)
+        os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+    logger.info(
+        f"{args.workers} workers con pool_size={os.environ['DB_POOL_SIZE']} "
+        f"max_overflow={os.environ.get('DB_MAX_OVERFLOW', '10')}"
+    )
+
+    sock = crear_socket(args.host, args.port)
+    logger.info(f"Escuchando en {args.host}:{args.port}")
+
+    if args.sin_precarga:
+        # El esquema se prepara una sola vez y en otro proceso: el maestro no debe importar
+        # la aplicación, o los workers heredarían el código viejo tras un SIGHUP
+        if os.environ.get("DB_INICIALIZAR", "false").lower() == "true":
+            subprocess.run([sys.executable, "-m", "app.database.migraciones"], check=True)
+    else:
+        # Importar en el maestro ejecuta una sola vez el create_all y las migraciones;
+        # los workers heredan los módulos cargados por copy-on-write
+        cargar_app()
+        liberar_conexiones(close=True)
+    # Ningún worker repite la inicialización (ni los que se reinician con SIGHUP)
+    os.environ["DB_INICIALIZAR"] = "false"
+
+    Maestro(sock, args).ejecutar()
+
+
+if __name__ == "__main__":
+    main()
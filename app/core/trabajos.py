@@ -0,0 +1,269 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, event, func, or_, select
+from sqlalchemy.orm import Session
+from app.core import config
+from app.database.database import SessionLocal
+from app.models import models
+
+logger = logging.getLogger(__name__)
+
+# Marca en session.info de que la transacción encoló trabajos
+ENCOLADOS = "trabajos_encolados"
+
+# Segundos entre limpiezas de los trabajos completados antiguos
+INTERVALO_LIMPIEZA = 3600
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos persistida en la tabla Trabajos. Cada proceso arranca un pool de hilos
+    que reclama trabajos con FOR UPDATE SKIP LOCKED, así varios procesos comparten la cola
+    sin ejecutar dos veces el mismo trabajo. Los fallos se reintentan con backoff exponencial.
+    """
+
+    def __init__(
+        self,
+        trabajadores: int,
+        intervalo: float,
+        max_intentos: int,
+        backoff_base: float,
+        backoff_max: float,
+        bloqueo_max: float,
+        retencion_dias: int
+    ):
+        self.trabajadores = trabajadores
+        self.intervalo = intervalo
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bloqueo_max = bloqueo_max
+        self.retencion_dias = retencion_dias
+        self._tareas = {}
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilos = []
+        self._ultima_limpieza = 0.0
+        self._lock = threading.Lock()
+
+    def tarea(self, tipo: str):
+        """Decorador que registra la función que ejecuta los trabajos de `tipo`."""
+        def registrar(funcion):
+            self._tareas[tipo] = funcion
+            return funcion
+        return registrar
+
+    def encolar(self, tipo: str, datos: dict = None, db: Session = None, retraso: float = 0, max_intentos: int = None):
+        """
+        Encola un trabajo. Con `db` se añade a la transacción de la petición y solo existe
+        si esta se confirma; sin `db` se confirma en una transacción propia.
+        """
+        trabajo = models.Trabajo(
+            tipo=tipo,
+            datos=datos or {},
+            max_intentos=max_intentos or self.max_intentos,
+            disponible_en=datetime.utcnow() + timedelta(seconds=retraso)
+        )
+        if db is not None:
+            db.add(trabajo)
+            db.info[ENCOLADOS] = True
+            return trabajo
+
+        with SessionLocal() as sesion:
+            sesion.add(trabajo)
+            sesion.commit()
+        self._despertar.set()
+        return trabajo
+
+    def despertar(self):
+        self._despertar.set()
+
+    def iniciar(self):
+        if self._hilos:
+            return
+        self._detener.clear()
+        for numero in range(self.trabajadores):
+            hilo = threading.Thread(target=self._ejecutar, name=f"trabajos-{numero}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self):
+        if not self._hilos:
+            return
+        self._detener.set()
+        self._despertar.set()
+        for hilo in self._hilos:
+            hilo.join()
+        self._hilos = []
+
+    def estadisticas(self, db: Session) -> dict:
+        """Profundidad de la cola por estado y retraso del trabajo disponible más antiguo."""
+        ahora = datetime.utcnow()
+        conteos = dict(
+            db.query(models.Trabajo.estado, func.count())
+            .group_by(models.Trabajo.estado)
+            .all()
+        )
+        disponibles, mas_antiguo = db.query(func.count(), func.min(models.Trabajo.disponible_en)).filter(
+            models.Trabajo.estado == models.TrabajoEstado.pendiente,
+            models.Trabajo.disponible_en <= ahora
+        ).one()
+        return {
+            "pendientes": conteos.get(models.TrabajoEstado.pendiente, 0),
+            "disponibles": disponibles,
+            "en_proceso": conteos.get(models.TrabajoEstado.en_proceso, 0),
+            "completados": conteos.get(models.TrabajoEstado.completado, 0),
+            "fallidos": conteos.get(models.TrabajoEstado.fallido, 0),
+            "retraso_segundos": (ahora - mas_antiguo).total_seconds() if mas_antiguo else 0.0,
+            "trabajadores": len(self._hilos)
+        }
+
+    def _ejecutar(self):
+        while not self._detener.is_set():
+            try:
+                reclamado = self._reclamar()
+            except Exception as e:
+                logger.error(f"Error al reclamar trabajos: {e}")
+                reclamado = None
+            if reclamado is None:
+                self._limpiar()
+                self._despertar.wait(self.intervalo)
+                self._despertar.clear()
+                continue
+            self._procesar(*reclamado)
+
+    def _reclamar(self):
+        Trabajo = models.Trabajo
+        while True:
+            ahora = datetime.utcnow()
+            abandonado = and_(
+                Trabajo.estado == models.TrabajoEstado.en_proceso,
+                Trabajo.fecha_inicio < ahora - timedelta(seconds=self.bloqueo_max)
+            )
+            with SessionLocal() as db:
+                trabajo = db.execute(
+                    select(Trabajo)
+                    .where(or_(
+                        and_(Trabajo.estado == models.TrabajoEstado.pendiente, Trabajo.disponible_en <= ahora),
+                        # Trabajos de un proceso que murió a mitad de ejecución: los que siguen
+                        # vivos renuevan fecha_inicio (_latido) y nunca llegan a bloqueo_max
+                        abandonado
+                    ))
+                    .order_by(Trabajo.disponible_en)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                ).scalar_one_or_none()
+                if trabajo is None:
+                    return None
+                if trabajo.estado == models.TrabajoEstado.en_proceso and trabajo.intentos >= trabajo.max_intentos:
+                    # Un trabajo que tumba a su proceso (p. ej. sin memoria) no se reintenta sin fin
+                    trabajo.estado = models.TrabajoEstado.fallido
+                    trabajo.fecha_fin = ahora
+                    trabajo.ultimo_error = f"Abandonado tras {trabajo.intentos} intentos: el proceso no terminó el trabajo"
+                    db.commit()
+                    logger.error(f"Trabajo {trabajo.id_trabajo} ({trabajo.tipo}) fallido: {trabajo.ultimo_error}")
+                    continue
+                trabajo.estado = models.TrabajoEstado.en_proceso
+                trabajo.intentos += 1
+                trabajo.fecha_inicio = ahora
+                db.commit()
+                return trabajo.id_trabajo, trabajo.tipo, trabajo.datos, trabajo.intentos, trabajo.max_intentos
+
+    def _latido(self, id_trabajo: int, intentos: int, terminado: threading.Event):
+        # Renueva fecha_inicio mientras el trabajo se ejecuta, para que otro proceso no lo
+        # reclame como abandonado aunque tarde más de bloqueo_max
+        while not terminado.wait(self.bloqueo_max / 3):
+            try:
+                with SessionLocal() as db:
+                    db.query(models.Trabajo).filter(
+                        models.Trabajo.id_trabajo == id_trabajo,
+                        models.Trabajo.intentos == intentos
+                    ).update({"fecha_inicio": datetime.utcnow()})
+                    db.commit()
+            except Exception as e:
+                logger.error(f"Error al renovar el trabajo {id_trabajo}: {e}")
+
+    def _procesar(self, id_trabajo: int, tipo: str, datos: dict, intentos: int, max_intentos: int):
+        error = None
+        funcion = self._tareas.get(tipo)
+        if funcion is None:
+            error = f"Tipo de trabajo no registrado: {tipo}"
+        else:
+            terminado = threading.Event()
+            latido = threading.Thread(
+                target=self._latido, args=(id_trabajo, intentos, terminado),
+                name=f"trabajos-latido-{id_trabajo}", daemon=True
+            )
+            latido.start()
+            try:
+                funcion(**datos)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                terminado.set()
+                latido.join()
+
+        valores = {"fecha_fin": datetime.utcnow(), "ultimo_error": error}
+        if error is None:
+            valores["estado"] = models.TrabajoEstado.completado
+        elif intentos < max_intentos:
+            espera = min(self.backoff_max, self.backoff_base * 2 ** (intentos - 1))
+            # Jitter para que los reintentos de muchos trabajos no coincidan
+            valores["estado"] = models.TrabajoEstado.pendiente
+            valores["disponible_en"] = datetime.utcnow() + timedelta(seconds=espera * random.uniform(0.5, 1.0))
+            logger.warning(f"Trabajo {id_trabajo} ({tipo}) falló, intento {intentos}/{max_intentos}: {error}")
+        else:
+            valores["estado"] = models.TrabajoEstado.fallido
+            logger.error(f"Trabajo {id_trabajo} ({tipo}) fallido tras {intentos} intentos: {error}")
+
+        try:
+            with SessionLocal() as db:
+                # Solo el intento reclamado por este hilo registra su resultado: si otro proceso
+                # lo reclamó después, su intento tiene otro número
+                actualizados = db.query(models.Trabajo).filter(
+                    models.Trabajo.id_trabajo == id_trabajo,
+                    models.Trabajo.intentos == intentos
+                ).update(valores)
+                db.commit()
+            if not actualizados:
+                logger.warning(f"Trabajo {id_trabajo} ({tipo}): el intento {intentos} ya no es el vigente, se descarta su resultado")
+        except Exception as e:
+            # Queda en_proceso y se reintentará cuando supere TRABAJOS_BLOQUEO_MAX
+            logger.error(f"Error al registrar el resultado del trabajo {id_trabajo}: {e}")
+
+    def _limpiar(self):
+        with self._lock:
+            if time.monotonic() - self._ultima_limpieza < INTERVALO_LIMPIEZA:
+                return
+            self._ultima_limpieza = time.monotonic()
+        limite = datetime.utcnow() - timedelta(days=self.retencion_dias)
+        try:
+            with SessionLocal() as db:
+                db.query(models.Trabajo).filter(
+                    models.Trabajo.estado == models.TrabajoEstado.completado,
+                    models.Trabajo.fecha_fin < limite
+                ).delete(synchronize_session=False)
+                db.commit()
+        except Exception as e:
+            logger.error(f"Error al limpiar trabajos completados: {e}")
+
+
+cola_trabajos = ColaTrabajos(
+    trabajadores=config.TRABAJOS_TRABAJADORES,
+    intervalo=config.TRABAJOS_INTERVALO,
+    max_intentos=config.TRABAJOS_MAX_INTENTOS,
+    backoff_base=config.TRABAJOS_BACKOFF_BASE,
+    backoff_max=config.TRABAJOS_BACKOFF_MAX,
+    bloqueo_max=config.TRABAJOS_BLOQUEO_MAX,
+    retencion_dias=config.TRABAJOS_RETENCION_DIAS
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _despertar_tras_commit(session):
+    # Los trabajos encolados dentro de una petición solo son visibles tras su commit
+    if session.info.pop(ENCOLADOS, False):
+        cola_trabajos.despertar()
@@ -0,0 +1,78 @@
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import DateTime, Integer, column, update, values
+from app.core import config
+from app.database.database import engine
+from app.models import models
+
+logger = logging.getLogger(__name__)
+
+
+class RegistroUltimoAcceso:
+    """
+    Acumula en memoria el último acceso de cada usuario y lo escribe en la base de datos
+    en lote desde un hilo de fondo, para que el login no espere a un UPDATE.
+    """
+
+    def __init__(self, intervalo: float):
+        self.intervalo = intervalo
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def registrar(self, id_usuario: int, fecha: datetime = None):
+        with self._lock:
+            self._pendientes[id_usuario] = fecha or datetime.utcnow()
+
+    def escribir(self):
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        if not pendientes:
+            return
+
+        # Un único UPDATE ... FROM (VALUES ...) para todo el lote
+        accesos = values(
+            column("id_usuario", Integer),
+            column("fecha", DateTime),
+            name="accesos"
+        ).data(list(pendientes.items()))
+        tabla = models.Usuario.__table__
+        stmt = (
+            update(tabla)
+            .where(tabla.c.id_usuario == accesos.c.id_usuario)
+            .values(ultimo_acceso=accesos.c.fecha)
+        )
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt)
+        except Exception as e:
+            logger.error(f"Error al registrar ultimo_acceso: {e}")
+            # Reencolar sin pisar accesos más recientes
+            with self._lock:
+                for id_usuario, fecha in pendientes.items():
+                    self._pendientes.setdefault(id_usuario, fecha)
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="ultimo-acceso", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join()
+        self._hilo = None
+        self.escribir()
+
+    def _ejecutar(self):
+        while not self._detener.wait(self.intervalo):
+            self.escribir()
+
+
+registro_ultimo_acceso = RegistroUltimoAcceso(config.ULTIMO_ACCESO_INTERVALO)
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response, status
+
+
+def validadores(fila):
+    """
+    Convierte una fila (versión, versión, ..., fecha de última modificación) en un
+    ETag y una fecha Last-Modified. Las versiones nulas (relaciones opcionales) se
+    representan con 0.
+    """
+    *versiones, ultima_modificacion = fila
+    etag = '"' + "-".join(str(version or 0) for version in versiones) + '"'
+    return etag, ultima_modificacion
+
+
+# Codificaciones de CompresionMiddleware: el cuerpo comprimido lleva su propio ETag fuerte,
+# el de la representación sin comprimir con el sufijo "-<codificación>"
+CODIFICACIONES = ("gzip", "br", "zstd")
+
+
+def etag_codificado(etag: str, codificacion: str) -> str:
+    return etag[:-1] + "-" + codificacion + '"' if etag.endswith('"') else etag
+
+
+def _sin_codificacion(etiqueta: str) -> str:
+    for codificacion in CODIFICACIONES:
+        sufijo = "-" + codificacion + '"'
+        if etiqueta.endswith(sufijo):
+            return etiqueta[:-len(sufijo)] + '"'
+    return etiqueta
+
+
+def _formatear_fecha(fecha: datetime) -> str:
+    return format_datetime(fecha.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def no_modificado(request: Request, etag: str, ultima_modificacion: datetime = None) -> bool:
+    # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etiquetas = [_sin_codificacion(etiqueta.strip().removeprefix("W/")) for etiqueta in if_none_match.split(",")]
+        return etag in etiquetas
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or ultima_modificacion is None:
+        return False
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        desde = desde.replace(tzinfo=timezone.utc)
+    # Las fechas HTTP tienen resolución de segundos
+    return ultima_modificacion.replace(microsecond=0, tzinfo=timezone.utc) <= desde
+
+
+def agregar_validadores(response: Response, etag: str, ultima_modificacion: datetime = None):
+    response.headers["ETag"] = etag
+    if ultima_modificacion is not None:
+        response.headers["Last-Modified"] = _formatear_fecha(ultima_modificacion)
+
+
+def respuesta_no_modificado(etag: str, ultima_modificacion: datetime = None) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    agregar_validadores(response, etag, ultima_modificacion)
+    return response
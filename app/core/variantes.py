@@ -0,0 +1,61 @@
+import re
+from app.core import config
+from app.core.almacenamiento import almacen
+
+# Tipos MIME de los archivos guardados, por extensión
+TIPOS_MIME = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp", "gif": "image/gif", "avif": "image/avif"}
+FORMATO_MINIATURA = "webp"
+
+# Clave del original: {carpeta}/{id}/original-{ancho}w.{ext}. Guardar el ancho en la clave
+# permite construir el srcset sin consultar el almacén ni la base de datos.
+PATRON_ORIGINAL = re.compile(r"^(?P<base>.+)/original-(?P<ancho>\d+)w\.[a-z]+$")
+
+
+class UrlsVariantes:
+    """
+    Construye las URLs de las variantes de una imagen subida a partir de la URL del
+    original. No depende de Pillow: lo usan los esquemas de respuesta, que se importan
+    aunque el proceso no procese imágenes. ProcesadorImagenes (app.core.imagenes)
+    genera los archivos con estos mismos nombres y reduce `formatos` a los que soporta.
+    """
+
+    def __init__(self, almacen, anchos: list, formatos: list):
+        self.almacen = almacen
+        self.anchos = anchos
+        self.formatos = formatos
+
+    def coincidencia(self, url: str):
+        prefijo = self.almacen.url_base + "/"
+        if not url or not url.startswith(prefijo):
+            return None
+        return PATRON_ORIGINAL.match(url[len(prefijo):])
+
+    def anchos_variantes(self, ancho_original: int) -> list:
+        # No se amplía: los anchos mayores que el original se sustituyen por el propio original
+        anchos = [ancho for ancho in self.anchos if ancho < ancho_original]
+        if not self.anchos or ancho_original <= self.anchos[-1]:
+            anchos.append(ancho_original)
+        return anchos
+
+    def variantes(self, url: str):
+        """URLs de la miniatura y srcset por formato; None si la URL no es de una imagen subida."""
+        coincidencia = self.coincidencia(url)
+        if coincidencia is None:
+            return None
+        base = coincidencia["base"]
+        anchos = self.anchos_variantes(int(coincidencia["ancho"]))
+        return {
+            "original": url,
+            "miniatura": self.almacen.url(f"{base}/miniatura.{FORMATO_MINIATURA}"),
+            "srcset": {
+                formato: ", ".join(f"{self.almacen.url(f'{base}/{ancho}.{formato}')} {ancho}w" for ancho in anchos)
+                for formato in self.formatos
+            }
+        }
+
+
+urls_variantes = UrlsVariantes(almacen, anchos=config.IMAGENES_ANCHOS, formatos=config.IMAGENES_FORMATOS)
+
+
+def variantes_imagen(url: str):
+    return urls_variantes.variantes(url)
@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine
+from fastapi import HTTPException, Request, status
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from contextlib import contextmanager
+from app.core import config
+import itertools
+import logging
 import os
+import threading
+import time
 
 load_dotenv()
 
@@ -16,15 +25,46 @@ SQLALCHEMY_DATABASE_URL = (
     f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _url_psycopg2(url: str):
+    # SQLAlchemy 2.1 usa psycopg 3 para "postgresql://"; el driver instalado es psycopg2.
+    # SQLALCHEMY_DATABASE_URL queda sin driver porque cambios.py la pasa a psycopg2.connect
+    url = make_url(url)
+    return url.set(drivername="postgresql+psycopg2") if url.drivername == "postgresql" else url
+
+
+engine = create_engine(
+    _url_psycopg2(SQLALCHEMY_DATABASE_URL),
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW
+)
+# expire_on_commit=False: tras el commit los objetos conservan sus valores (los generados por
+# el servidor llegan por RETURNING), así las respuestas no necesitan un refresh()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Réplicas de lectura opcionales, usadas en round-robin por get_read_db
+replica_engines = [
+    create_engine(_url_psycopg2(url), pool_pre_ping=True, pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW)
+    for url in config.DB_REPLICA_URLS
+]
+ReplicaSessions = [
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    for replica_engine in replica_engines
+]
+_replica_turno = itertools.cycle(range(len(ReplicaSessions)))
+_replica_lock = threading.Lock()
+_replica_caida_hasta = [0.0] * len(ReplicaSessions)
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
 def init_db():
     from app.models import models
+    from app.database.migraciones import aplicar_migraciones
     
     Base.metadata.create_all(bind=engine)
+    aplicar_migraciones(engine)
     
     # Crear una sesión para insertar datos por defecto
     db = SessionLocal()
@@ -84,9 +124,78 @@ def init_db():
     finally:
         db.close()
 
-def get_db():
+def aplicar_plazo(db, request: Request):
+    """
+    Propaga el plazo de la petición (fijado por LimitesMiddleware) a PostgreSQL:
+    cada transacción de la sesión empieza con SET LOCAL statement_timeout igual al
+    tiempo que le queda, así una consulta desbocada se cancela en el servidor.
+    """
+    plazo = request.scope.get("state", {}).get("plazo")
+    if plazo is None:
+        return
+
+    def statement_timeout(session, transaction, connection):
+        restante = int((plazo - time.monotonic()) * 1000)
+        if restante <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="La petición superó su tiempo máximo",
+                headers={"Retry-After": str(config.LIMITES_RETRY_AFTER)}
+            )
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {restante}")
+
+    event.listen(db, "after_begin", statement_timeout)
+    # Las sesiones de réplica ya abrieron su transacción al comprobar la conexión
+    if db.in_transaction():
+        statement_timeout(db, None, db.connection())
+
+def get_db(request: Request):
     db = SessionLocal()
     try:
+        aplicar_plazo(db, request)
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+def leer_de_primaria(request: Request) -> bool:
+    # Escape hatch read-your-writes: cookie puesta tras una escritura o header explícito
+    return (
+        request.cookies.get(config.COOKIE_LEER_PRIMARIA) is not None
+        or request.headers.get(config.HEADER_LEER_PRIMARIA) is not None
+    )
+
+def _sesion_replica():
+    for _ in range(len(ReplicaSessions)):
+        with _replica_lock:
+            indice = next(_replica_turno)
+        if time.monotonic() < _replica_caida_hasta[indice]:
+            continue
+
+        db = ReplicaSessions[indice]()
+        try:
+            # Forzar la conexión para detectar réplicas caídas antes de usarlas
+            db.connection()
+            return db
+        except OperationalError as e:
+            db.close()
+            _replica_caida_hasta[indice] = time.monotonic() + config.DB_REPLICA_REINTENTO
+            logger.warning(f"Réplica {indice} no disponible, se usará otra: {e}")
+
+    # Sin réplicas disponibles: usar la primaria
+    return SessionLocal()
+
+@contextmanager
+def sesion_lectura(request: Request):
+    if not ReplicaSessions or leer_de_primaria(request):
+        db = SessionLocal()
+    else:
+        db = _sesion_replica()
+    try:
+        aplicar_plazo(db, request)
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    with sesion_lectura(request) as db:
+        yield db
@@ -0,0 +1,125 @@
+import logging
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# Tablas versionadas y la columna con la que se inicializa fecha_actualizacion
+TABLAS_VERSIONADAS = {
+    "Publicaciones": "fecha_registro",
+    "Productos": "fecha_registro",
+    "Eventos": "fecha_registro",
+    "Usuarios": "fecha_registro",
+    "LineasInvestigacion": "fecha_creacion",
+    "Roles": "timezone('utc', now())",
+    "Tipologias": "timezone('utc', now())",
+}
+
+TABLAS_SINCRONIZADAS = ("Publicaciones", "Productos", "Eventos", "Eliminaciones")
+
+# Campos admitidos en sort= por tabla: (clave primaria, {campo: expresión}). Las fechas se
+# indexan con coalesce(..., '-infinity'), la misma expresión que usa expresion_orden
+INDICES_ORDEN = {
+    "Publicaciones": ("id_publicacion", {
+        "fecha_publicacion": "coalesce(fecha_publicacion, '-infinity'::date)",
+        "fecha_registro": "coalesce(fecha_registro, '-infinity'::timestamp)",
+        "titulo": "titulo",
+    }),
+    "Productos": ("id_producto", {
+        "fecha_creacion": "coalesce(fecha_creacion, '-infinity'::date)",
+        "fecha_registro": "coalesce(fecha_registro, '-infinity'::timestamp)",
+        "nombre": "nombre",
+    }),
+    "Eventos": ("id_evento", {
+        "fecha_inicio": "coalesce(fecha_inicio, '-infinity'::date)",
+        "fecha_registro": "coalesce(fecha_registro, '-infinity'::timestamp)",
+        "nombre": "nombre",
+    }),
+    "Usuarios": ("id_usuario", {
+        "fecha_registro": "coalesce(fecha_registro, '-infinity'::timestamp)",
+        "apellido": "apellido",
+        "nombre": "nombre",
+    }),
+}
+
+# Cambios de esquema sobre tablas existentes que create_all no aplica.
+# Cada sentencia es idempotente y se ejecuta en cada arranque desde init_db.
+MIGRACIONES = [
+    # Versiones y fecha de actualización para /sync y los validadores HTTP (ETag)
+    'CREATE SEQUENCE IF NOT EXISTS version_sync_seq',
+    *[
+        sentencia
+        for tabla, fecha_inicial in TABLAS_VERSIONADAS.items()
+        for sentencia in (
+            f'ALTER TABLE "{tabla}" ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT nextval(\'version_sync_seq\')',
+            f'ALTER TABLE "{tabla}" ADD COLUMN IF NOT EXISTS fecha_actualizacion TIMESTAMP WITHOUT TIME ZONE',
+            f'UPDATE "{tabla}" SET fecha_actualizacion = {fecha_inicial} WHERE fecha_actualizacion IS NULL',
+        )
+    ],
+    # Carga inicial de los contadores de /usuarios/{id}/perfil; después los mantiene cada flush
+    '''INSERT INTO "EstadisticasUsuarios" (id_usuario, entidad, anio, estado, total)
+    SELECT * FROM (
+        SELECT id_autor_principal, 'publicaciones', coalesce(extract(year FROM fecha_publicacion)::int, 0), coalesce(estado::text, ''), count(*)
+        FROM "Publicaciones" GROUP BY 1, 3, 4
+        UNION ALL
+        SELECT id_responsable, 'productos', coalesce(extract(year FROM fecha_creacion)::int, 0), coalesce(estado_aprobacion::text, ''), count(*)
+        FROM "Productos" GROUP BY 1, 3, 4
+        UNION ALL
+        SELECT id_creador, 'eventos', coalesce(extract(year FROM fecha_inicio)::int, 0), '', count(*)
+        FROM "Eventos" GROUP BY 1, 3
+    ) AS conteos
+    WHERE NOT EXISTS (SELECT 1 FROM "EstadisticasUsuarios")''',
+    # Índices de sort= y de la paginación por cursor (app/core/orden.py)
+    *[
+        f'CREATE INDEX IF NOT EXISTS "ix_{tabla}_orden_{campo}" ON "{tabla}" (({expresion}), {clave_primaria})'
+        for tabla, (clave_primaria, campos) in INDICES_ORDEN.items()
+        for campo, expresion in campos.items()
+    ],
+    # Transacción de la última escritura, por la que avanza /sync (models.XID_ACTUAL). Las
+    # filas existentes toman el xid de esta migración y se envían de nuevo a los clientes
+    *[
+        sentencia
+        for tabla in TABLAS_SINCRONIZADAS
+        for sentencia in (
+            f'ALTER TABLE "{tabla}" ADD COLUMN IF NOT EXISTS xid_sync BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint)',
+            f'CREATE INDEX IF NOT EXISTS "ix_{tabla}_sync" ON "{tabla}" (xid_sync, version)',
+            f'DROP INDEX IF EXISTS "ix_{tabla}_xid_sync"',
+            f'DROP INDEX IF EXISTS "ix_{tabla}_version"',
+        )
+    ],
+]
+
+# Texto en el que busca /buscar por cada tabla. Las expresiones deben coincidir con las de
+# app/routes/busqueda.py para que PostgreSQL use los índices trigram en los LIKE
+TEXTOS_BUSQUEDA = {
+    "Usuarios": "lower(nombre || ' ' || apellido || ' ' || coalesce(especialidad, ''))",
+    "LineasInvestigacion": "lower(nombre)",
+    "Publicaciones": "lower(titulo)",
+    "Productos": "lower(nombre)",
+    "Eventos": "lower(nombre)",
+}
+
+# Índices GIN trigram para /buscar. pg_trgm es una extensión contrib: si no está instalada
+# en el servidor, la búsqueda funciona igual pero recorriendo las tablas
+MIGRACIONES_BUSQUEDA = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    *[
+        f'CREATE INDEX IF NOT EXISTS "ix_{tabla}_busqueda" ON "{tabla}" USING gin (({texto}) gin_trgm_ops)'
+        for tabla, texto in TEXTOS_BUSQUEDA.items()
+    ],
+]
+
+def aplicar_migraciones(engine):
+    # Todas las sentencias en un solo envío: una ida y vuelta en lugar de una por sentencia
+    with engine.begin() as conn:
+        conn.exec_driver_sql(";\n".join(MIGRACIONES))
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(";\n".join(MIGRACIONES_BUSQUEDA))
+    except DBAPIError as e:
+        logger.warning(f"No se crearon los índices de búsqueda (pg_trgm): {e.orig}")
+
+
+if __name__ == "__main__":
+    from app.database.database import init_db
+
+    init_db()
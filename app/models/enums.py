@@ -0,0 +1,40 @@
+import enum
+
+# Enums compartidos por los modelos SQLAlchemy y los esquemas Pydantic: al ser la misma
+# clase, la validación de las respuestas acepta el valor leído de la base de datos sin convertirlo
+
+class UsuarioEstado(str, enum.Enum):
+    activo = "activo"
+    inactivo = "inactivo"
+    pendiente = "pendiente"
+
+class LineaInvestigacionEstado(str, enum.Enum):
+    activa = "activa"
+    inactiva = "inactiva"
+
+class PublicacionEstado(str, enum.Enum):
+    pendiente = "pendiente"
+    aprobada = "aprobada"
+    rechazada = "rechazada"
+
+class ProductoEstadoDesarrollo(str, enum.Enum):
+    idea = "idea"
+    desarrollo = "desarrollo"
+    pruebas = "pruebas"
+    completado = "completado"
+
+class ProductoEstado(str, enum.Enum):
+    pendiente = "pendiente"
+    aprobado = "aprobado"
+    rechazado = "rechazado"
+
+class SemilleroEstado(str, enum.Enum):
+    activo = "activo"
+    inactivo = "inactivo"
+    en_proceso = "en_proceso"
+
+class TrabajoEstado(str, enum.Enum):
+    pendiente = "pendiente"
+    en_proceso = "en_proceso"
+    completado = "completado"
+    fallido = "fallido"
@@ -1,38 +1,29 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, Date, ForeignKey, Enum, Index, JSON, Sequence, cast, delete, event, func, inspect, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, relationship
 from datetime import datetime
 from app.database.database import Base
-import enum
-
-class UsuarioEstado(str, enum.Enum):
-    activo = "activo"
-    inactivo = "inactivo"
-    pendiente = "pendiente"
-
-class LineaInvestigacionEstado(str, enum.Enum):
-    activa = "activa"
-    inactiva = "inactiva"
-
-class PublicacionEstado(str, enum.Enum):
-    pendiente = "pendiente"
-    aprobada = "aprobada"
-    rechazada = "rechazada"
-
-class ProductoEstadoDesarrollo(str, enum.Enum):
-    idea = "idea"
-    desarrollo = "desarrollo"
-    pruebas = "pruebas"
-    completado = "completado"
-
-class ProductoEstado(str, enum.Enum):
-    pendiente = "pendiente"
-    aprobado = "aprobado"
-    rechazado = "rechazado"
-
-class SemilleroEstado(str, enum.Enum):
-    activo = "activo"
-    inactivo = "inactivo"
-    en_proceso = "en_proceso"
+from app.models.enums import (
+    UsuarioEstado,
+    LineaInvestigacionEstado,
+    PublicacionEstado,
+    ProductoEstadoDesarrollo,
+    ProductoEstado,
+    SemilleroEstado,
+    TrabajoEstado
+)
+
+# Secuencia global de versiones: sincronización incremental (/sync) y ETags
+version_sync = Sequence("version_sync_seq", metadata=Base.metadata)
+# Los modelos versionados usan eager_defaults: INSERT/UPDATE ... RETURNING devuelve la versión
+# asignada por el servidor sin un SELECT posterior
+
+# Transacción que escribió la fila por última vez (xid de 64 bits, sin vuelta). /sync avanza
+# por este valor y no por version: las versiones se reparten antes del commit y una menor
+# puede confirmarse después que una mayor, mientras que pg_snapshot_xmin marca el límite
+# por debajo del cual todas las transacciones ya terminaron
+XID_ACTUAL = "pg_current_xact_id()::text::bigint"
+xid_actual = cast(cast(func.pg_current_xact_id(), Text), BigInteger)
 
 class Rol(Base):
     __tablename__ = "Roles"
@@ -40,8 +31,14 @@ class Rol(Base):
     id_rol = Column(Integer, primary_key=True, index=True)
     nombre_rol = Column(String(50), unique=True, nullable=False)
     descripcion = Column(Text)
+    version = Column(BigInteger, server_default=version_sync.next_value(), onupdate=version_sync.next_value(), nullable=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    usuarios = relationship("Usuario", back_populates="rol")
+    __mapper_args__ = {"eager_defaults": True}
+
+    # passive_deletes="all": al borrar no se cargan ni se anulan los dependientes; la
+    # foreign key rechaza el DELETE y las rutas lo traducen a 400 (app.core.referencias)
+    usuarios = relationship("Usuario", back_populates="rol", passive_deletes="all")
 
 class Usuario(Base):
     __tablename__ = "Usuarios"
@@ -59,20 +56,27 @@ class Usuario(Base):
     estado = Column(Enum(UsuarioEstado), default=UsuarioEstado.pendiente)
     fecha_registro = Column(DateTime, default=datetime.utcnow)
     ultimo_acceso = Column(DateTime)
+    version = Column(BigInteger, server_default=version_sync.next_value(), onupdate=version_sync.next_value(), nullable=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __mapper_args__ = {"eager_defaults": True}
 
     rol = relationship("Rol", back_populates="usuarios")
+    # Las foreign keys opcionales (responsable de línea, aprobador) se anulan al borrar el
+    # usuario; las obligatorias usan passive_deletes="all" y las protege la ruta
     lineas_investigacion = relationship("LineaInvestigacion", back_populates="responsable")
     publicaciones_autor = relationship("Publicacion", 
                                      foreign_keys="Publicacion.id_autor_principal",
-                                     back_populates="autor_principal")
+                                     back_populates="autor_principal",
+                                     passive_deletes="all")
     publicaciones_aprobador = relationship("Publicacion",
                                          foreign_keys="Publicacion.id_aprobador",
                                          back_populates="aprobador")
     productos_aprobador = relationship("Producto",
                                      foreign_keys="Producto.id_aprobador",
                                      back_populates="aprobador")
-    eventos = relationship("Evento", back_populates="creador")
-    productos = relationship("Producto", foreign_keys="Producto.id_responsable", back_populates="responsable")
+    eventos = relationship("Evento", back_populates="creador", passive_deletes="all")
+    productos = relationship("Producto", foreign_keys="Producto.id_responsable", back_populates="responsable", passive_deletes="all")
 
 class LineaInvestigacion(Base):
     __tablename__ = "LineasInvestigacion"
@@ -84,10 +88,14 @@ class LineaInvestigacion(Base):
     id_responsable = Column(Integer, ForeignKey("Usuarios.id_usuario"))
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
     estado = Column(Enum(LineaInvestigacionEstado), default=LineaInvestigacionEstado.activa)
+    version = Column(BigInteger, server_default=version_sync.next_value(), onupdate=version_sync.next_value(), nullable=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __mapper_args__ = {"eager_defaults": True}
 
     responsable = relationship("Usuario", back_populates="lineas_investigacion")
-    publicaciones = relationship("Publicacion", back_populates="linea")
-    productos = relationship("Producto", back_populates="linea")
+    publicaciones = relationship("Publicacion", back_populates="linea", passive_deletes="all")
+    productos = relationship("Producto", back_populates="linea", passive_deletes="all")
 
 class Publicacion(Base):
     __tablename__ = "Publicaciones"
@@ -105,6 +113,13 @@ class Publicacion(Base):
     fecha_registro = Column(DateTime, default=datetime.utcnow)
     fecha_aprobacion = Column(DateTime)
     id_aprobador = Column(Integer, ForeignKey("Usuarios.id_usuario"))
+    version = Column(BigInteger, server_default=version_sync.next_value(), onupdate=version_sync.next_value(), nullable=False)
+    xid_sync = Column(BigInteger, server_default=text(f"({XID_ACTUAL})"), onupdate=xid_actual, nullable=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Orden en que /sync recorre los cambios
+    __table_args__ = (Index("ix_Publicaciones_sync", "xid_sync", "version"),)
+    __mapper_args__ = {"eager_defaults": True}
 
     linea = relationship("LineaInvestigacion", back_populates="publicaciones")
     autor_principal = relationship("Usuario", foreign_keys=[id_autor_principal], back_populates="publicaciones_autor")
@@ -125,6 +140,12 @@ class Evento(Base):
     foto_evento = Column(String(255))
     id_creador = Column(Integer, ForeignKey("Usuarios.id_usuario"), nullable=False)
     fecha_registro = Column(DateTime, default=datetime.utcnow)
+    version = Column(BigInteger, server_default=version_sync.next_value(), onupdate=version_sync.next_value(), nullable=False)
+    xid_sync = Column(BigInteger, server_default=text(f"({XID_ACTUAL})"), onupdate=xid_actual, nullable=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (Index("ix_Eventos_sync", "xid_sync", "version"),)
+    __mapper_args__ = {"eager_defaults": True}
 
     creador = relationship("Usuario", back_populates="eventos")
 
@@ -133,8 +154,12 @@ class Tipologia(Base):
 
     id_tipologia = Column(Integer, primary_key=True, index=True)
     nombre = Column(String(50), unique=True, nullable=False)
+    version = Column(BigInteger, server_default=version_sync.next_value(), onupdate=version_sync.next_value(), nullable=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __mapper_args__ = {"eager_defaults": True}
 
-    productos = relationship("Producto", back_populates="tipologia")
+    productos = relationship("Producto", back_populates="tipologia", passive_deletes="all")
 
 class Producto(Base):
     __tablename__ = "Productos"
@@ -154,6 +179,12 @@ class Producto(Base):
     repositorio = Column(String(255))
     imagen_referencia = Column(String(255))
     fecha_registro = Column(DateTime, default=datetime.utcnow)
+    version = Column(BigInteger, server_default=version_sync.next_value(), onupdate=version_sync.next_value(), nullable=False)
+    xid_sync = Column(BigInteger, server_default=text(f"({XID_ACTUAL})"), onupdate=xid_actual, nullable=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (Index("ix_Productos_sync", "xid_sync", "version"),)
+    __mapper_args__ = {"eager_defaults": True}
 
     tipologia = relationship("Tipologia", back_populates="productos")
     linea = relationship("LineaInvestigacion", back_populates="productos")
@@ -166,4 +197,140 @@ class CarruselFoto(Base):
     id = Column(Integer, primary_key=True, index=True)
     url = Column(String(500), nullable=False)
     orden = Column(Integer, nullable=False, unique=True)
-    fecha_creacion = Column(DateTime, default=datetime.utcnow) 
\ No newline at end of file
+    fecha_creacion = Column(DateTime, default=datetime.utcnow)
+
+class Eliminacion(Base):
+    """Tombstone de un registro eliminado, para que /sync pueda informar las bajas."""
+    __tablename__ = "Eliminaciones"
+
+    id_eliminacion = Column(Integer, primary_key=True, index=True)
+    entidad = Column(String(50), nullable=False)
+    id_registro = Column(Integer, nullable=False)
+    version = Column(BigInteger, server_default=version_sync.next_value(), nullable=False)
+    xid_sync = Column(BigInteger, server_default=text(f"({XID_ACTUAL})"), nullable=False)
+    fecha_eliminacion = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_Eliminaciones_sync", "xid_sync", "version"),)
+
+class Trabajo(Base):
+    """Trabajo en segundo plano de la cola persistente (app.core.trabajos)."""
+    __tablename__ = "Trabajos"
+
+    id_trabajo = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String(100), nullable=False)
+    datos = Column(JSON, nullable=False, default=dict)
+    estado = Column(Enum(TrabajoEstado), default=TrabajoEstado.pendiente, nullable=False)
+    intentos = Column(Integer, default=0, nullable=False)
+    max_intentos = Column(Integer, nullable=False)
+    disponible_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+    ultimo_error = Column(Text)
+    fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    fecha_inicio = Column(DateTime)
+    fecha_fin = Column(DateTime)
+
+    # Los trabajadores buscan por estado y fecha de disponibilidad
+    __table_args__ = (Index("ix_Trabajos_estado_disponible_en", "estado", "disponible_en"),)
+
+class EstadisticaUsuario(Base):
+    """
+    Contadores desnormalizados por usuario para /usuarios/{id}/perfil: publicaciones (como
+    autor principal), productos (como responsable) y eventos (como creador) por año y estado.
+    Se mantienen en cada flush (_actualizar_estadisticas). anio 0 = sin fecha; los eventos
+    no tienen estado y usan "".
+    """
+    __tablename__ = "EstadisticasUsuarios"
+
+    id_usuario = Column(Integer, primary_key=True)
+    entidad = Column(String(20), primary_key=True)
+    anio = Column(Integer, primary_key=True)
+    estado = Column(String(20), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+MODELOS_SINCRONIZADOS = (Publicacion, Producto, Evento, Eliminacion)
+
+# Entidades contadas en EstadisticaUsuario: (modelo, columna del usuario, columna de fecha, columna de estado)
+ESTADISTICAS_USUARIO = {
+    "publicaciones": (Publicacion, "id_autor_principal", "fecha_publicacion", "estado"),
+    "productos": (Producto, "id_responsable", "fecha_creacion", "estado_aprobacion"),
+    "eventos": (Evento, "id_creador", "fecha_inicio", None),
+}
+
+def _conservar_anterior(target, value, oldvalue, initiator):
+    return value
+
+# Con active_history, asignar una de estas columnas estando expirada (p. ej. tras un
+# commit) carga antes su valor confirmado; sin él, el historial no tendría el valor
+# anterior y el contador se movería al año o estado nuevo sin restarse del viejo
+for _modelo, *_columnas in ESTADISTICAS_USUARIO.values():
+    for _columna in filter(None, _columnas):
+        event.listen(getattr(_modelo, _columna), "set", _conservar_anterior, active_history=True, retval=True)
+
+def _valor_columna(obj, atributo: str, anterior: bool):
+    if anterior:
+        # Valor confirmado en la base de datos, antes de los cambios de este flush;
+        # load_history lo lee de la base de datos si el atributo está expirado
+        historial = inspect(obj).attrs[atributo].load_history()
+        if historial.deleted:
+            return historial.deleted[0]
+        if historial.unchanged:
+            return historial.unchanged[0]
+    valor = getattr(obj, atributo)
+    if valor is None and not anterior:
+        # Un objeto nuevo aún no tiene el default de la columna, que se aplica en el INSERT
+        default = obj.__table__.c[atributo].default
+        if default is not None and default.is_scalar:
+            valor = default.arg
+    return valor
+
+def _clave_estadistica(obj, entidad: str, anterior: bool = False):
+    _, columna_usuario, columna_fecha, columna_estado = ESTADISTICAS_USUARIO[entidad]
+    fecha = _valor_columna(obj, columna_fecha, anterior)
+    estado = _valor_columna(obj, columna_estado, anterior) if columna_estado else None
+    return (
+        _valor_columna(obj, columna_usuario, anterior),
+        entidad,
+        fecha.year if fecha is not None else 0,
+        getattr(estado, "value", estado) or ""
+    )
+
+@event.listens_for(Session, "before_flush")
+def _actualizar_estadisticas(session, flush_context, instances):
+    # Las variaciones de este flush se aplican con un upsert en la misma transacción:
+    # si la escritura falla, los contadores vuelven atrás con ella
+    variaciones = {}
+
+    def sumar(clave, cantidad):
+        if clave[0] is not None:
+            variaciones[clave] = variaciones.get(clave, 0) + cantidad
+
+    for entidad, (modelo, *_) in ESTADISTICAS_USUARIO.items():
+        for obj in session.new:
+            if isinstance(obj, modelo):
+                sumar(_clave_estadistica(obj, entidad), 1)
+        for obj in session.deleted:
+            if isinstance(obj, modelo):
+                sumar(_clave_estadistica(obj, entidad, anterior=True), -1)
+        for obj in session.dirty:
+            if isinstance(obj, modelo) and session.is_modified(obj):
+                anterior = _clave_estadistica(obj, entidad, anterior=True)
+                actual = _clave_estadistica(obj, entidad)
+                if anterior != actual:
+                    sumar(anterior, -1)
+                    sumar(actual, 1)
+
+    usuarios_eliminados = [obj.id_usuario for obj in session.deleted if isinstance(obj, Usuario)]
+    if usuarios_eliminados:
+        session.execute(delete(EstadisticaUsuario).where(EstadisticaUsuario.id_usuario.in_(usuarios_eliminados)))
+
+    # Orden fijo de las filas: dos transacciones concurrentes bloquean en el mismo orden
+    filas = [
+        {"id_usuario": id_usuario, "entidad": entidad, "anio": anio, "estado": estado, "total": total}
+        for (id_usuario, entidad, anio, estado), total in sorted(variaciones.items())
+        if total != 0
+    ]
+    if filas:
+        sentencia = insert(EstadisticaUsuario).values(filas)
+        session.execute(sentencia.on_conflict_do_update(
+            index_elements=["id_usuario", "entidad", "anio", "estado"],
+            set_={"total": EstadisticaUsuario.total + sentencia.excluded.total}
+        ))
@@ -1,15 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session, joinedload
 from app.database.database import get_db
+from app.core.limitador import limitar_login
+from app.core.ultimo_acceso import registro_ultimo_acceso
 from app.models import models
 from app.schemas import schemas
 
 router = APIRouter()
 
 @router.post("/login", response_model=schemas.LoginResponse)
-def login(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
-    # Buscar usuario por email
-    usuario = db.query(models.Usuario).filter(models.Usuario.email == login_data.email).first()
+def login(login_data: schemas.LoginRequest, request: Request, db: Session = Depends(get_db)):
+    # Limitar intentos por IP y por email antes de tocar la base de datos (429 con Retry-After)
+    limitar_login(request, login_data.email)
+    
+    # Buscar usuario por email junto con su rol en una sola consulta
+    usuario = (
+        db.query(models.Usuario)
+        .options(joinedload(models.Usuario.rol))
+        .filter(models.Usuario.email == login_data.email)
+        .first()
+    )
     
     if not usuario:
         return schemas.LoginResponse(
@@ -24,8 +34,10 @@ def login(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
             mensaje="Credenciales inválidas"
         )
     
-    # Obtener el rol del usuario
-    rol = db.query(models.Rol).filter(models.Rol.id_rol == usuario.id_rol).first()
+    # El último acceso se escribe en lote en segundo plano
+    registro_ultimo_acceso.registrar(usuario.id_usuario)
+    
+    rol = usuario.rol
     
     return schemas.LoginResponse(
         success=True,
@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Query, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import case, func, literal, null, or_, select, union_all
+from sqlalchemy.orm import Session
+from typing import List
+from app.core import config
+from app.core.cache import TAGS_BUSQUEDA, respuesta_cacheada
+from app.models import models
+from app.schemas import schemas
+
+router = APIRouter()
+
+resultados_adapter = TypeAdapter(List[schemas.ResultadoBusqueda])
+
+# Texto buscable de cada entidad: las mismas expresiones que los índices trigram de
+# app/database/migraciones.py (TEXTOS_BUSQUEDA), si no PostgreSQL no puede usarlos
+TEXTO_USUARIO = func.lower(
+    models.Usuario.nombre + " " + models.Usuario.apellido + " " + func.coalesce(models.Usuario.especialidad, "")
+)
+
+# (tipo, id, título, subtítulo, texto buscable, filtro). Solo se listan los registros
+# visibles en el sitio: usuarios y líneas activos, publicaciones y productos aprobados
+ENTIDADES = [
+    (
+        "usuario",
+        models.Usuario.id_usuario,
+        models.Usuario.nombre + " " + models.Usuario.apellido,
+        models.Usuario.especialidad,
+        TEXTO_USUARIO,
+        models.Usuario.estado == models.UsuarioEstado.activo
+    ),
+    (
+        "linea",
+        models.LineaInvestigacion.id_linea,
+        models.LineaInvestigacion.nombre,
+        null(),
+        func.lower(models.LineaInvestigacion.nombre),
+        models.LineaInvestigacion.estado == models.LineaInvestigacionEstado.activa
+    ),
+    (
+        "publicacion",
+        models.Publicacion.id_publicacion,
+        models.Publicacion.titulo,
+        models.Publicacion.autores,
+        func.lower(models.Publicacion.titulo),
+        models.Publicacion.estado == models.PublicacionEstado.aprobada
+    ),
+    (
+        "producto",
+        models.Producto.id_producto,
+        models.Producto.nombre,
+        null(),
+        func.lower(models.Producto.nombre),
+        models.Producto.estado_aprobacion == models.ProductoEstado.aprobado
+    ),
+    (
+        "evento",
+        models.Evento.id_evento,
+        models.Evento.nombre,
+        models.Evento.lugar,
+        func.lower(models.Evento.nombre),
+        None
+    ),
+]
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _consulta_busqueda(termino: str, limite: int):
+    """
+    Una sola consulta UNION ALL: cada entidad aporta como mucho `limite` coincidencias
+    por prefijo (del texto completo o de cualquiera de sus palabras) y se ordenan juntas,
+    primero las que empiezan por el término y después las más cortas.
+    """
+    al_inicio = _escapar_like(termino) + "%"
+    en_palabra = "% " + al_inicio
+
+    subconsultas = []
+    for tipo, id_entidad, titulo, subtitulo, texto, filtro in ENTIDADES:
+        empieza = texto.like(al_inicio, escape="\\")
+        rango = case((empieza, 0), else_=1)
+        consulta = select(
+            literal(tipo).label("tipo"),
+            id_entidad.label("id"),
+            titulo.label("titulo"),
+            subtitulo.label("subtitulo"),
+            rango.label("rango")
+        ).where(or_(empieza, texto.like(en_palabra, escape="\\")))
+        if filtro is not None:
+            consulta = consulta.where(filtro)
+        subconsultas.append(consulta.order_by(rango, func.length(titulo)).limit(limite))
+
+    resultados = union_all(*subconsultas).subquery()
+    return (
+        select(resultados.c.tipo, resultados.c.id, resultados.c.titulo, resultados.c.subtitulo)
+        .order_by(resultados.c.rango, func.length(resultados.c.titulo), resultados.c.titulo)
+        .limit(limite)
+    )
+
+@router.get("/buscar", response_model=List[schemas.ResultadoBusqueda])
+def buscar(
+    request: Request,
+    q: str = Query(..., max_length=100),
+    limite: int = Query(10, ge=1, le=25)
+):
+    """
+    Búsqueda por prefijo en usuarios, líneas, publicaciones, productos y eventos para
+    el autocompletado. Cada término consultado queda cacheado hasta que cambie alguna
+    de esas entidades.
+    """
+    termino = " ".join(q.lower().split())
+    if len(termino) < config.BUSQUEDA_MIN_CARACTERES:
+        return Response(content=b"[]", media_type="application/json")
+
+    def consultar(db: Session):
+        return db.execute(_consulta_busqueda(termino, limite)).all()
+
+    return respuesta_cacheada(request, resultados_adapter, TAGS_BUSQUEDA, consultar)
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List
-from app.database.database import get_db
+from app.core.cache import invalidar_ruta
+from app.core.coalescencia import respuesta_coalescida
+from app.core.imagenes import eliminar_imagen, imagen_subida
+from app.database.database import get_db, get_read_db
 from app.models import models
 from app.schemas import schemas
 
 router = APIRouter(prefix="/carrusel", tags=["Carrusel"])
 
+# Ruta del listado coalescido; las escrituras descartan su resultado reutilizado
+RUTA_LISTADO = "/carrusel/"
+
+fotos_adapter = TypeAdapter(List[schemas.CarruselFoto])
+
 @router.post("/", response_model=schemas.CarruselFoto, status_code=status.HTTP_201_CREATED)
 def crear_foto_carrusel(foto: schemas.CarruselFotoCreate, db: Session = Depends(get_db)):
     """
@@ -20,22 +29,46 @@ def crear_foto_carrusel(foto: schemas.CarruselFotoCreate, db: Session = Depends(
             detail=f"Ya existe una foto con el orden {foto.orden}"
         )
     
-    db_foto = models.CarruselFoto(**foto.dict())
+    db_foto = models.CarruselFoto(**foto.model_dump())
     db.add(db_foto)
     db.commit()
-    db.refresh(db_foto)
+    invalidar_ruta(RUTA_LISTADO)
+    return db_foto
+
+@router.post("/imagen", response_model=schemas.CarruselFoto, status_code=status.HTTP_201_CREATED)
+def subir_foto_carrusel(orden: int = Form(...), archivo: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Subir una imagen y crear con ella una foto del carrusel.
+    Las variantes (srcset y miniatura) se generan en segundo plano.
+    """
+    # Verificar si ya existe una foto con ese orden
+    foto_existente = db.query(models.CarruselFoto).filter(models.CarruselFoto.orden == orden).first()
+    if foto_existente:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ya existe una foto con el orden {orden}"
+        )
+    
+    with imagen_subida(archivo, "carrusel", db) as url:
+        db_foto = models.CarruselFoto(url=url, orden=orden)
+        db.add(db_foto)
+        db.commit()
+    invalidar_ruta(RUTA_LISTADO)
     return db_foto
 
 @router.get("/", response_model=List[schemas.CarruselFoto])
-def obtener_fotos_carrusel(db: Session = Depends(get_db)):
+def obtener_fotos_carrusel(request: Request):
     """
     Obtener todas las fotos del carrusel ordenadas por el campo orden
     """
-    fotos = db.query(models.CarruselFoto).order_by(models.CarruselFoto.orden).all()
-    return fotos
+    # Las peticiones idénticas concurrentes comparten una sola consulta
+    def consultar(db: Session):
+        return db.query(models.CarruselFoto).order_by(models.CarruselFoto.orden).all()
+    
+    return respuesta_coalescida(request, fotos_adapter, consultar)
 
 @router.get("/{foto_id}", response_model=schemas.CarruselFoto)
-def obtener_foto_carrusel(foto_id: int, db: Session = Depends(get_db)):
+def obtener_foto_carrusel(foto_id: int, db: Session = Depends(get_read_db)):
     """
     Obtener una foto específica del carrusel por ID
     """
@@ -71,11 +104,31 @@ def actualizar_foto_carrusel(foto_id: int, foto: schemas.CarruselFotoCreate, db:
                 detail=f"Ya existe una foto con el orden {foto.orden}"
             )
     
-    for key, value in foto.dict().items():
+    for key, value in foto.model_dump().items():
         setattr(db_foto, key, value)
     
     db.commit()
-    db.refresh(db_foto)
+    invalidar_ruta(RUTA_LISTADO)
+    return db_foto
+
+@router.put("/{foto_id}/imagen", response_model=schemas.CarruselFoto)
+def reemplazar_imagen_carrusel(foto_id: int, archivo: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Reemplazar la imagen de una foto del carrusel conservando su orden
+    """
+    db_foto = db.query(models.CarruselFoto).filter(models.CarruselFoto.id == foto_id).first()
+    if not db_foto:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Foto no encontrada"
+        )
+    
+    url_anterior = db_foto.url
+    with imagen_subida(archivo, "carrusel", db) as url:
+        db_foto.url = url
+        db.commit()
+    invalidar_ruta(RUTA_LISTADO)
+    eliminar_imagen(url_anterior)
     return db_foto
 
 @router.delete("/{foto_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -92,6 +145,8 @@ def eliminar_foto_carrusel(foto_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_foto)
     db.commit()
+    invalidar_ruta(RUTA_LISTADO)
+    eliminar_imagen(db_foto.url)
     return None
 
 @router.put("/{foto_id}/orden/{nuevo_orden}")
@@ -119,5 +174,5 @@ def cambiar_orden_foto(foto_id: int, nuevo_orden: int, db: Session = Depends(get
     
     setattr(db_foto, 'orden', nuevo_orden)
     db.commit()
-    db.refresh(db_foto)
+    invalidar_ruta(RUTA_LISTADO)
     return {"message": f"Orden de la foto {foto_id} cambiado a {nuevo_orden}"} 
\ No newline at end of file
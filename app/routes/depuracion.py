@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, status
+from typing import List
+from app.core import depuracion
+from app.core.seguridad import requerir_administrador
+from app.schemas import schemas
+
+router = APIRouter(dependencies=[Depends(requerir_administrador)])
+
+@router.get("/debug/slow-queries", response_model=List[schemas.CapturaDepuracion])
+def capturas_lentas():
+    """
+    Peticiones capturadas más lentas del worker que atiende esta llamada (su `pid` viene
+    en cada captura), de la más lenta a la más rápida, con el SQL, los parámetros, la
+    duración y el plan (EXPLAIN ANALYZE) de sus consultas. Con varios workers cada uno
+    guarda las suyas: repetir la llamada puede mostrar las de otro proceso.
+    """
+    return depuracion.registro_lentas.listar()
+
+@router.delete("/debug/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+def vaciar_capturas_lentas():
+    """Vacía las capturas del worker que atiende esta llamada."""
+    depuracion.registro_lentas.vaciar()
+    return None
+
+@router.put("/debug/muestreo", response_model=schemas.MuestreoDepuracion)
+def cambiar_muestreo(muestreo: schemas.MuestreoDepuracion):
+    """
+    Cambia en caliente la fracción de peticiones capturadas sin cabecera en todos los
+    workers (por NOTIFY). Los que arrancan después vuelven a DEPURACION_MUESTREO.
+    """
+    depuracion.cambiar_muestreo(muestreo.fraccion)
+    return muestreo
@@ -1,23 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.database.database import get_db
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
+from app.core.orden import Ordenamiento
+from app.core.paginacion import Pagina, Paginacion, respuesta_streaming
+from app.core.cache import TAGS_EVENTOS, invalidar, respuesta_cacheada
+from app.core.referencias import traducir_errores_fk
+from app.core.validadores import agregar_validadores, no_modificado, respuesta_no_modificado, validadores
+from app.core.imagenes import eliminar_imagen, imagen_subida
+from app.database.database import get_db, get_read_db
 from app.models import models
 from app.schemas import schemas
 from datetime import date
 
 router = APIRouter()
 
+# Mensajes de las foreign keys de Evento
+MENSAJES_FK = {
+    "id_creador": "El creador especificado no existe"
+}
+
+eventos_adapter = TypeAdapter(List[schemas.Evento])
+
+# Campos de sort= admitidos; cada uno tiene su índice en app/database/migraciones.py
+ORDEN_EVENTOS = Ordenamiento(
+    models.Evento.id_evento,
+    [models.Evento.fecha_inicio, models.Evento.fecha_registro, models.Evento.nombre]
+)
+
+# Evento con su creador y las variantes de la foto: unos 1000 bytes serializado
+PAGINACION_EVENTOS = Paginacion(bytes_por_fila=1000)
+
+def _cargar_evento(db: Session, evento_id: int):
+    # Relaciones de schemas.Evento en una sola consulta, en lugar de refresh() + cargas perezosas
+    return (
+        db.query(models.Evento)
+        .options(joinedload(models.Evento.creador).joinedload(models.Usuario.rol))
+        .populate_existing()
+        .filter(models.Evento.id_evento == evento_id)
+        .one()
+    )
+
 @router.post("/eventos/", response_model=schemas.Evento, status_code=status.HTTP_201_CREATED)
 def create_evento(evento: schemas.EventoCreate, db: Session = Depends(get_db)):
-    # Verificar si el creador existe
-    creador = db.query(models.Usuario).filter(models.Usuario.id_usuario == evento.id_creador).first()
-    if not creador:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El creador especificado no existe"
-        )
-    
     # Verificar que la fecha de inicio no sea posterior a la fecha de fin
     if evento.fecha_inicio and evento.fecha_fin and evento.fecha_inicio > evento.fecha_fin:
         raise HTTPException(
@@ -25,44 +51,93 @@ def create_evento(evento: schemas.EventoCreate, db: Session = Depends(get_db)):
             detail="La fecha de inicio no puede ser posterior a la fecha de fin"
         )
     
-    db_evento = models.Evento(**evento.dict())
-    db.add(db_evento)
-    db.commit()
-    db.refresh(db_evento)
-    return db_evento
+    # La existencia del creador la garantiza su foreign key; evita una consulta previa
+    db_evento = models.Evento(**evento.model_dump())
+    with traducir_errores_fk(db, MENSAJES_FK):
+        db.add(db_evento)
+        db.commit()
+    invalidar("eventos")
+    return _cargar_evento(db, db_evento.id_evento)
 
 @router.get("/eventos/", response_model=List[schemas.Evento])
 def read_eventos(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    pagina: Pagina = Depends(PAGINACION_EVENTOS),
     fecha_inicio: date = None,
     fecha_fin: date = None,
     tipo_evento: str = None,
     id_creador: int = None,
-    db: Session = Depends(get_db)
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    query = db.query(models.Evento)
+    def filtrar(db: Session):
+        query = db.query(models.Evento).options(joinedload(models.Evento.creador).joinedload(models.Usuario.rol))
+        
+        if fecha_inicio:
+            query = query.filter(models.Evento.fecha_inicio >= fecha_inicio)
+        if fecha_fin:
+            query = query.filter(models.Evento.fecha_fin <= fecha_fin)
+        if tipo_evento:
+            query = query.filter(models.Evento.tipo_evento == tipo_evento)
+        if id_creador:
+            query = query.filter(models.Evento.id_creador == id_creador)
+        
+        return ORDEN_EVENTOS.aplicar(query, sort, cursor)
+    
+    # Páginas por encima del presupuesto: por lotes y sin caché
+    if pagina.streaming:
+        return respuesta_streaming(
+            request, eventos_adapter, filtrar, pagina,
+            cabeceras=lambda query: ORDEN_EVENTOS.cabeceras_consulta(query, pagina.skip, pagina.limit, sort)
+        )
     
-    if fecha_inicio:
-        query = query.filter(models.Evento.fecha_inicio >= fecha_inicio)
-    if fecha_fin:
-        query = query.filter(models.Evento.fecha_fin <= fecha_fin)
-    if tipo_evento:
-        query = query.filter(models.Evento.tipo_evento == tipo_evento)
-    if id_creador:
-        query = query.filter(models.Evento.id_creador == id_creador)
+    # Respuesta cacheada; se invalida desde las rutas de escritura
+    def consultar(db: Session):
+        return pagina.aplicar(filtrar(db)).all()
     
-    eventos = query.offset(skip).limit(limit).all()
-    return eventos
+    return respuesta_cacheada(
+        request, eventos_adapter, TAGS_EVENTOS, consultar,
+        cabeceras=lambda filas: ORDEN_EVENTOS.cabeceras(filas, pagina.limit, sort),
+        pagina=pagina
+    )
+
+def _validadores_evento(db: Session, evento_id: int):
+    return db.execute(
+        select(
+            models.Evento.version,
+            models.Usuario.version,
+            models.Rol.version,
+            func.greatest(
+                models.Evento.fecha_actualizacion,
+                models.Usuario.fecha_actualizacion,
+                models.Rol.fecha_actualizacion
+            )
+        )
+        .join(models.Usuario, models.Evento.id_creador == models.Usuario.id_usuario)
+        .join(models.Rol, models.Usuario.id_rol == models.Rol.id_rol)
+        .where(models.Evento.id_evento == evento_id)
+    ).first()
 
 @router.get("/eventos/{evento_id}", response_model=schemas.Evento)
-def read_evento(evento_id: int, db: Session = Depends(get_db)):
+def read_evento(evento_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # Validadores (ETag / Last-Modified) con una sola consulta estrecha, sin cargar relaciones
+    fila = _validadores_evento(db, evento_id)
+    if fila is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento no encontrado"
+        )
+    etag, ultima_modificacion = validadores(fila)
+    if no_modificado(request, etag, ultima_modificacion):
+        return respuesta_no_modificado(etag, ultima_modificacion)
+    
     db_evento = db.query(models.Evento).filter(models.Evento.id_evento == evento_id).first()
     if db_evento is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Evento no encontrado"
         )
+    agregar_validadores(response, etag, ultima_modificacion)
     return db_evento
 
 @router.put("/eventos/{evento_id}", response_model=schemas.Evento)
@@ -74,14 +149,6 @@ def update_evento(evento_id: int, evento: schemas.EventoCreate, db: Session = De
             detail="Evento no encontrado"
         )
     
-    # Verificar si el creador existe
-    creador = db.query(models.Usuario).filter(models.Usuario.id_usuario == evento.id_creador).first()
-    if not creador:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El creador especificado no existe"
-        )
-    
     # Verificar que la fecha de inicio no sea posterior a la fecha de fin
     if evento.fecha_inicio and evento.fecha_fin and evento.fecha_inicio > evento.fecha_fin:
         raise HTTPException(
@@ -89,12 +156,33 @@ def update_evento(evento_id: int, evento: schemas.EventoCreate, db: Session = De
             detail="La fecha de inicio no puede ser posterior a la fecha de fin"
         )
     
-    for key, value in evento.dict().items():
+    for key, value in evento.model_dump().items():
         setattr(db_evento, key, value)
     
-    db.commit()
-    db.refresh(db_evento)
-    return db_evento
+    with traducir_errores_fk(db, MENSAJES_FK):
+        db.commit()
+    invalidar("eventos")
+    return _cargar_evento(db, db_evento.id_evento)
+
+@router.put("/eventos/{evento_id}/foto", response_model=schemas.Evento)
+def subir_foto_evento(evento_id: int, archivo: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Subir la foto del evento. Las variantes (srcset y miniatura) se generan en segundo plano.
+    """
+    db_evento = db.query(models.Evento).filter(models.Evento.id_evento == evento_id).first()
+    if db_evento is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento no encontrado"
+        )
+    
+    foto_anterior = db_evento.foto_evento
+    with imagen_subida(archivo, "eventos", db) as url:
+        db_evento.foto_evento = url
+        db.commit()
+    invalidar("eventos")
+    eliminar_imagen(foto_anterior)
+    return _cargar_evento(db, db_evento.id_evento)
 
 @router.delete("/eventos/{evento_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_evento(evento_id: int, db: Session = Depends(get_db)):
@@ -106,5 +194,8 @@ def delete_evento(evento_id: int, db: Session = Depends(get_db)):
         )
     
     db.delete(db_evento)
+    db.add(models.Eliminacion(entidad="evento", id_registro=db_evento.id_evento))
     db.commit()
+    invalidar("eventos")
+    eliminar_imagen(db_evento.foto_evento)
     return None 
\ No newline at end of file
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.core import config
+from app.core.cambios import difusor_cambios
+import asyncio
+import json
+
+router = APIRouter()
+
+@router.get("/eventos-cambios")
+async def stream_eventos_cambios(request: Request, entidad: Optional[str] = None):
+    """
+    Stream Server-Sent Events con los cambios de publicaciones y productos
+    (creación, actualización, aprobación, rechazo, cambio de estado y eliminación).
+    Se puede filtrar por entidad: 'publicacion' o 'producto'.
+    """
+    cola = difusor_cambios.suscribir()
+    
+    async def generar():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=config.CAMBIOS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Comentario keep-alive para proxies y balanceadores
+                    yield ": keep-alive\n\n"
+                    continue
+                if entidad and evento["entidad"] != entidad:
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            difusor_cambios.cancelar(cola)
+    
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from app.core.seguridad import requerir_administrador
+from app.core.limitador import limitador
+from app.schemas import schemas
+
+# Revela qué claves (IP, email) se están limitando: solo con el token de administrador
+router = APIRouter(dependencies=[Depends(requerir_administrador)])
+
+@router.get("/limitador/estadisticas", response_model=schemas.LimitadorEstadisticas)
+def estadisticas_limitador():
+    """
+    Peticiones permitidas y rechazadas por cada límite en este proceso
+    y número de claves (IP, email) con cubo activo. Exige la cabecera X-Depuracion,
+    como las rutas /debug; sin DEPURACION_TOKEN no existe.
+    """
+    return limitador.estadisticas()
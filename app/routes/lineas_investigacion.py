@@ -1,52 +1,211 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
+from pydantic import TypeAdapter
+from sqlalchemy import String, cast, distinct, func, literal, select, union, union_all
+from sqlalchemy.orm import Session, aliased, joinedload
 from typing import List, Optional
-from app.database.database import get_db
+from app.core.paginacion import Pagina, Paginacion, limite_coleccion, respuesta_streaming
+from app.core.cache import TAGS_LINEAS, TAGS_PORTAFOLIO, invalidar, respuesta_cacheada
+from app.core.referencias import eliminar_lote, traducir_errores_dependientes, traducir_errores_fk, verificar_dependientes
+from app.core.validadores import agregar_validadores, no_modificado, respuesta_no_modificado, validadores
+from app.core.imagenes import eliminar_imagen, imagen_subida
+from app.database.database import get_db, get_read_db
 from app.models import models
 from app.schemas import schemas
 
 router = APIRouter()
 
+# Mensajes de las foreign keys de LineaInvestigacion
+MENSAJES_FK = {
+    "id_responsable": "El responsable especificado no existe"
+}
+
+# Columnas que referencian una línea y la mantienen mientras existan
+DEPENDIENTES_LINEA = [models.Publicacion.id_linea, models.Producto.id_linea]
+MENSAJE_DEPENDIENTES = "No se puede eliminar la línea de investigación porque tiene publicaciones o productos asociados"
+
+lineas_adapter = TypeAdapter(List[schemas.LineaInvestigacion])
+portafolio_adapter = TypeAdapter(schemas.LineaPortafolio)
+
+# Línea con su responsable y las variantes del logo: unos 700 bytes
+PAGINACION_LINEAS = Paginacion(bytes_por_fila=700)
+
+def _cargar_linea(db: Session, linea_id: int):
+    # Relaciones de schemas.LineaInvestigacion en una sola consulta, en lugar de refresh() + cargas perezosas
+    return (
+        db.query(models.LineaInvestigacion)
+        .options(joinedload(models.LineaInvestigacion.responsable).joinedload(models.Usuario.rol))
+        .populate_existing()
+        .filter(models.LineaInvestigacion.id_linea == linea_id)
+        .one()
+    )
+
 @router.post("/lineas-investigacion/", response_model=schemas.LineaInvestigacion, status_code=status.HTTP_201_CREATED)
 def create_linea_investigacion(linea: schemas.LineaInvestigacionCreate, db: Session = Depends(get_db)):
-    # Verificar si el responsable existe
-    if linea.id_responsable:
-        responsable = db.query(models.Usuario).filter(models.Usuario.id_usuario == linea.id_responsable).first()
-        if not responsable:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="El responsable especificado no existe"
-            )
-    
-    db_linea = models.LineaInvestigacion(**linea.dict())
-    db.add(db_linea)
-    db.commit()
-    db.refresh(db_linea)
-    return db_linea
+    # La existencia del responsable la garantiza su foreign key; evita una consulta previa
+    db_linea = models.LineaInvestigacion(**linea.model_dump())
+    with traducir_errores_fk(db, MENSAJES_FK):
+        db.add(db_linea)
+        db.commit()
+    invalidar("lineas")
+    return _cargar_linea(db, db_linea.id_linea)
 
 @router.get("/lineas-investigacion/", response_model=List[schemas.LineaInvestigacion])
 def read_lineas_investigacion(
-    skip: int = 0,
-    limit: int = 100,
-    estado: Optional[models.LineaInvestigacionEstado] = None,
-    db: Session = Depends(get_db)
+    request: Request,
+    pagina: Pagina = Depends(PAGINACION_LINEAS),
+    estado: Optional[models.LineaInvestigacionEstado] = None
 ):
-    query = db.query(models.LineaInvestigacion)
-    if estado:
-        query = query.filter(models.LineaInvestigacion.estado == estado)
-    lineas = query.offset(skip).limit(limit).all()
-    return lineas
+    def filtrar(db: Session):
+        query = db.query(models.LineaInvestigacion).options(
+            joinedload(models.LineaInvestigacion.responsable).joinedload(models.Usuario.rol)
+        )
+        if estado:
+            query = query.filter(models.LineaInvestigacion.estado == estado)
+        return query
+    
+    # Páginas por encima del presupuesto: por lotes y sin caché
+    if pagina.streaming:
+        return respuesta_streaming(request, lineas_adapter, filtrar, pagina)
+    
+    # Respuesta cacheada; se invalida desde las rutas de escritura
+    def consultar(db: Session):
+        return pagina.aplicar(filtrar(db)).all()
+    
+    return respuesta_cacheada(request, lineas_adapter, TAGS_LINEAS, consultar, pagina=pagina)
+
+def _validadores_linea(db: Session, linea_id: int):
+    responsable = aliased(models.Usuario)
+    rol_responsable = aliased(models.Rol)
+    return db.execute(
+        select(
+            models.LineaInvestigacion.version,
+            responsable.version,
+            rol_responsable.version,
+            func.greatest(
+                models.LineaInvestigacion.fecha_actualizacion,
+                responsable.fecha_actualizacion,
+                rol_responsable.fecha_actualizacion
+            )
+        )
+        .outerjoin(responsable, models.LineaInvestigacion.id_responsable == responsable.id_usuario)
+        .outerjoin(rol_responsable, responsable.id_rol == rol_responsable.id_rol)
+        .where(models.LineaInvestigacion.id_linea == linea_id)
+    ).first()
 
 @router.get("/lineas-investigacion/{linea_id}", response_model=schemas.LineaInvestigacion)
-def read_linea_investigacion(linea_id: int, db: Session = Depends(get_db)):
+def read_linea_investigacion(linea_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # Validadores (ETag / Last-Modified) con una sola consulta estrecha, sin cargar relaciones
+    fila = _validadores_linea(db, linea_id)
+    if fila is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Línea de investigación no encontrada"
+        )
+    etag, ultima_modificacion = validadores(fila)
+    if no_modificado(request, etag, ultima_modificacion):
+        return respuesta_no_modificado(etag, ultima_modificacion)
+    
     db_linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == linea_id).first()
     if db_linea is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Línea de investigación no encontrada"
         )
+    agregar_validadores(response, etag, ultima_modificacion)
     return db_linea
 
+def _conteos_portafolio(db: Session, linea_id: int):
+    # Todos los conteos en una consulta: (grupo, clave, total) por cada GROUP BY
+    Publicacion = models.Publicacion
+    Producto = models.Producto
+    publicacion_aprobada = Publicacion.estado == models.PublicacionEstado.aprobada
+    producto_aprobado = Producto.estado_aprobacion == models.ProductoEstado.aprobado
+    investigadores = union(
+        select(Publicacion.id_autor_principal.label("id_usuario"))
+        .where(Publicacion.id_linea == linea_id, publicacion_aprobada),
+        select(Producto.id_responsable).where(Producto.id_linea == linea_id, producto_aprobado)
+    ).subquery()
+
+    filas = db.execute(union_all(
+        select(literal("publicaciones"), cast(Publicacion.estado, String), func.count())
+        .where(Publicacion.id_linea == linea_id)
+        .group_by(Publicacion.estado),
+        select(literal("productos"), cast(Producto.estado_aprobacion, String), func.count())
+        .where(Producto.id_linea == linea_id)
+        .group_by(Producto.estado_aprobacion),
+        select(literal("productos_por_desarrollo"), cast(Producto.estado_desarrollo, String), func.count())
+        .where(Producto.id_linea == linea_id, producto_aprobado)
+        .group_by(Producto.estado_desarrollo),
+        select(literal("investigadores"), literal(None, String), func.count(distinct(investigadores.c.id_usuario)))
+    )).all()
+
+    conteos = {
+        "publicaciones": {estado.value: 0 for estado in models.PublicacionEstado},
+        "productos": {estado.value: 0 for estado in models.ProductoEstado},
+        "productos_por_desarrollo": {estado.value: 0 for estado in models.ProductoEstadoDesarrollo},
+        "investigadores": 0
+    }
+    for grupo, clave, total in filas:
+        if clave is None:
+            conteos[grupo] = total
+        else:
+            conteos[grupo][clave] = total
+    return conteos
+
+@router.get("/lineas-investigacion/{linea_id}/portafolio", response_model=schemas.LineaPortafolio)
+def read_portafolio_linea(linea_id: int, request: Request, limit: int = Depends(limite_coleccion)):
+    """
+    Línea con su responsable, sus `limit` publicaciones y productos aprobados más recientes
+    y los conteos por estado (con los totales), en cuatro consultas fijas. Se cachea como
+    una unidad; las colecciones completas se recorren en /publicaciones/ y /productos/ con id_linea.
+    """
+    def consultar(db: Session):
+        linea = (
+            db.query(models.LineaInvestigacion)
+            .options(joinedload(models.LineaInvestigacion.responsable).joinedload(models.Usuario.rol))
+            .filter(models.LineaInvestigacion.id_linea == linea_id)
+            .first()
+        )
+        if linea is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Línea de investigación no encontrada"
+            )
+
+        publicaciones = (
+            db.query(models.Publicacion)
+            .options(joinedload(models.Publicacion.autor_principal).joinedload(models.Usuario.rol))
+            .filter(
+                models.Publicacion.id_linea == linea_id,
+                models.Publicacion.estado == models.PublicacionEstado.aprobada
+            )
+            .order_by(models.Publicacion.fecha_publicacion.desc().nulls_last(), models.Publicacion.id_publicacion.desc())
+            .limit(limit)
+            .all()
+        )
+        productos = (
+            db.query(models.Producto)
+            .options(
+                joinedload(models.Producto.responsable).joinedload(models.Usuario.rol),
+                joinedload(models.Producto.tipologia)
+            )
+            .filter(
+                models.Producto.id_linea == linea_id,
+                models.Producto.estado_aprobacion == models.ProductoEstado.aprobado
+            )
+            .order_by(models.Producto.fecha_creacion.desc().nulls_last(), models.Producto.id_producto.desc())
+            .limit(limit)
+            .all()
+        )
+        return {
+            "linea": linea,
+            "publicaciones": publicaciones,
+            "productos": productos,
+            "conteos": _conteos_portafolio(db, linea_id)
+        }
+
+    return respuesta_cacheada(request, portafolio_adapter, TAGS_PORTAFOLIO, consultar)
+
 @router.put("/lineas-investigacion/{linea_id}", response_model=schemas.LineaInvestigacion)
 def update_linea_investigacion(linea_id: int, linea: schemas.LineaInvestigacionCreate, db: Session = Depends(get_db)):
     db_linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == linea_id).first()
@@ -56,17 +215,8 @@ def update_linea_investigacion(linea_id: int, linea: schemas.LineaInvestigacionC
             detail="Línea de investigación no encontrada"
         )
     
-    # Verificar si el nuevo responsable existe
-    if linea.id_responsable:
-        responsable = db.query(models.Usuario).filter(models.Usuario.id_usuario == linea.id_responsable).first()
-        if not responsable:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="El responsable especificado no existe"
-            )
-    
     # Obtener los datos de la línea
-    linea_data = linea.dict()
+    linea_data = linea.model_dump()
     
     # Si imagen_logo es "string", mantener la imagen actual
     if linea_data.get('imagen_logo') == "string":
@@ -75,12 +225,17 @@ def update_linea_investigacion(linea_id: int, linea: schemas.LineaInvestigacionC
     for key, value in linea_data.items():
         setattr(db_linea, key, value)
     
-    db.commit()
-    db.refresh(db_linea)
-    return db_linea
+    with traducir_errores_fk(db, MENSAJES_FK):
+        db.commit()
+    invalidar("lineas")
+    return _cargar_linea(db, db_linea.id_linea)
 
-@router.delete("/lineas-investigacion/{linea_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_linea_investigacion(linea_id: int, db: Session = Depends(get_db)):
+@router.patch("/lineas-investigacion/{linea_id}", response_model=schemas.LineaInvestigacion)
+def patch_linea_investigacion(linea_id: int, linea: schemas.LineaInvestigacionUpdate, db: Session = Depends(get_db)):
+    """
+    Actualización parcial: solo se modifican los campos enviados
+    y el UPDATE incluye únicamente las columnas que cambian.
+    """
     db_linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == linea_id).first()
     if db_linea is None:
         raise HTTPException(
@@ -88,17 +243,62 @@ def delete_linea_investigacion(linea_id: int, db: Session = Depends(get_db)):
             detail="Línea de investigación no encontrada"
         )
     
-    # Verificar si hay publicaciones, productos o semilleros asociados
-    publicaciones = db.query(models.Publicacion).filter(models.Publicacion.id_linea == linea_id).first()
-    productos = db.query(models.Producto).filter(models.Producto.id_linea == linea_id).first()
-    # semilleros = db.query(models.Semillero).filter(models.Semillero.id_linea == linea_id).first()
+    for key, value in linea.model_dump(exclude_unset=True).items():
+        setattr(db_linea, key, value)
+    
+    # Sin cambios reales no hay UPDATE ni invalidación
+    if db.is_modified(db_linea):
+        with traducir_errores_fk(db, MENSAJES_FK):
+            db.commit()
+        invalidar("lineas")
+    return _cargar_linea(db, db_linea.id_linea)
+
+@router.put("/lineas-investigacion/{linea_id}/logo", response_model=schemas.LineaInvestigacion)
+def subir_logo_linea(linea_id: int, archivo: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Subir el logo de la línea. Las variantes (srcset y miniatura) se generan en segundo plano.
+    """
+    db_linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == linea_id).first()
+    if db_linea is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Línea de investigación no encontrada"
+        )
     
-    if publicaciones or productos: # Removed semilleros check
+    logo_anterior = db_linea.imagen_logo
+    with imagen_subida(archivo, "lineas", db) as url:
+        db_linea.imagen_logo = url
+        db.commit()
+    invalidar("lineas")
+    eliminar_imagen(logo_anterior)
+    return _cargar_linea(db, db_linea.id_linea)
+
+@router.delete("/lineas-investigacion/{linea_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_linea_investigacion(linea_id: int, db: Session = Depends(get_db)):
+    db_linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == linea_id).first()
+    if db_linea is None:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No se puede eliminar la línea de investigación porque tiene publicaciones o productos asociados" # Updated detail
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Línea de investigación no encontrada"
         )
     
-    db.delete(db_linea)
-    db.commit()
-    return None 
\ No newline at end of file
+    verificar_dependientes(db, DEPENDIENTES_LINEA, linea_id, MENSAJE_DEPENDIENTES)
+    with traducir_errores_dependientes(db, MENSAJE_DEPENDIENTES):
+        db.delete(db_linea)
+        db.commit()
+    invalidar("lineas")
+    eliminar_imagen(db_linea.imagen_logo)
+    return None
+
+@router.post("/lineas-investigacion/eliminar", response_model=List[schemas.ResultadoEliminacion])
+def delete_lineas_investigacion(lote: schemas.EliminacionLote, db: Session = Depends(get_db)):
+    """Eliminación por lotes para limpiezas administrativas; devuelve el resultado de cada id."""
+    resultados, eliminadas = eliminar_lote(
+        db, models.LineaInvestigacion.id_linea, lote.ids, DEPENDIENTES_LINEA,
+        "Línea de investigación no encontrada", MENSAJE_DEPENDIENTES
+    )
+    if eliminadas:
+        invalidar("lineas")
+    for linea in eliminadas:
+        eliminar_imagen(linea.imagen_logo)
+    return resultados
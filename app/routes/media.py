@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse
+from app.core import config
+from app.core.almacenamiento import CACHE_CONTROL_INMUTABLE, almacen
+from app.core.variantes import TIPOS_MIME
+
+router = APIRouter(prefix=config.IMAGENES_RUTA_LOCAL)
+
+def _respuesta_archivo(ruta, cache_control: str):
+    return FileResponse(
+        ruta,
+        media_type=TIPOS_MIME.get(ruta.suffix.lstrip(".")),
+        headers={"Cache-Control": cache_control}
+    )
+
+@router.get("/{clave:path}")
+def obtener_archivo(clave: str):
+    """
+    Sirve las imágenes del almacén local. Si se pide una variante que el pool
+    aún no ha generado, responde con el original sin permitir que se cachee.
+    """
+    try:
+        ruta = almacen.ruta(clave)
+    except ValueError:
+        ruta = None
+    if ruta is not None and ruta.is_file():
+        return _respuesta_archivo(ruta, CACHE_CONTROL_INMUTABLE)
+    
+    if ruta is not None and ruta.parent.is_dir():
+        original = next(ruta.parent.glob("original-*w.*"), None)
+        if original is not None:
+            return _respuesta_archivo(original, "no-cache")
+    
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Archivo no encontrado"
+    )
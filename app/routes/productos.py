@@ -1,113 +1,207 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased, joinedload
 from typing import List, Optional
-from app.database.database import get_db
+from app.core.orden import Ordenamiento
+from app.core.paginacion import Pagina, Paginacion, respuesta_streaming
+from app.core.cache import TAGS_PRODUCTOS, invalidar, respuesta_cacheada
+from app.core.cambios import publicar_cambio
+from app.core.referencias import traducir_errores_fk, verificar_referencias
+from app.core.validadores import agregar_validadores, no_modificado, respuesta_no_modificado, validadores
+from app.core.imagenes import eliminar_imagen, imagen_subida
+from app.database.database import get_db, get_read_db
 from app.models import models
 from app.schemas import schemas
 from datetime import datetime
 
 router = APIRouter()
 
+# Mensajes de las foreign keys de Producto, compartidos por la verificación previa y el commit
+MENSAJES_FK = {
+    "id_tipologia": "La tipología especificada no existe",
+    "id_linea": "La línea de investigación especificada no existe",
+    "id_responsable": "El responsable especificado no existe",
+    "id_aprobador": "El aprobador especificado no existe"
+}
+
+productos_adapter = TypeAdapter(List[schemas.ProductoResponse])
+
+# Campos de sort= admitidos; cada uno tiene su índice en app/database/migraciones.py
+ORDEN_PRODUCTOS = Ordenamiento(
+    models.Producto.id_producto,
+    [models.Producto.fecha_creacion, models.Producto.fecha_registro, models.Producto.nombre]
+)
+
+# Cada producto arrastra responsable, tipología, línea e imágenes: unos 2000 bytes serializado
+PAGINACION_PRODUCTOS = Paginacion(bytes_por_fila=2000)
+
+def _verificar_referencias(db: Session, datos: dict):
+    # Las claves ausentes (PATCH) se omiten
+    verificar_referencias(db, [
+        (models.Tipologia.id_tipologia, datos.get("id_tipologia"), MENSAJES_FK["id_tipologia"]),
+        (models.LineaInvestigacion.id_linea, datos.get("id_linea") or None, MENSAJES_FK["id_linea"]),
+        (models.Usuario.id_usuario, datos.get("id_responsable"), MENSAJES_FK["id_responsable"])
+    ])
+
+def _cargar_producto(db: Session, producto_id: int):
+    # Relaciones de schemas.Producto en una sola consulta, en lugar de refresh() + cargas perezosas
+    return (
+        db.query(models.Producto)
+        .options(
+            joinedload(models.Producto.responsable).joinedload(models.Usuario.rol),
+            joinedload(models.Producto.tipologia),
+            joinedload(models.Producto.linea).joinedload(models.LineaInvestigacion.responsable).joinedload(models.Usuario.rol)
+        )
+        .populate_existing()
+        .filter(models.Producto.id_producto == producto_id)
+        .one()
+    )
+
 @router.post("/productos/", response_model=schemas.Producto, status_code=status.HTTP_201_CREATED)
 def create_producto(producto: schemas.ProductoCreate, db: Session = Depends(get_db)):
-    # Verificar si la tipología existe
-    tipologia = db.query(models.Tipologia).filter(models.Tipologia.id_tipologia == producto.id_tipologia).first()
-    if not tipologia:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="La tipología especificada no existe"
-        )
+    # Verificar en una sola consulta que existen la tipología, la línea y el responsable
+    producto_data = producto.model_dump()
+    _verificar_referencias(db, producto_data)
     
-    # Verificar si la línea de investigación existe
-    if producto.id_linea:
-        linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == producto.id_linea).first()
-        if not linea:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="La línea de investigación especificada no existe"
-            )
-    
-    # Verificar si el responsable existe
-    responsable = db.query(models.Usuario).filter(models.Usuario.id_usuario == producto.id_responsable).first()
-    if not responsable:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El responsable especificado no existe"
-        )
-    
-    db_producto = models.Producto(**producto.dict())
-    db.add(db_producto)
-    db.commit()
-    db.refresh(db_producto)
-    return db_producto
+    db_producto = models.Producto(**producto_data)
+    with traducir_errores_fk(db, MENSAJES_FK):
+        db.add(db_producto)
+        db.flush()
+        publicar_cambio(db, "producto", db_producto.id_producto, "creado", db_producto.estado_aprobacion)
+        db.commit()
+    invalidar("productos")
+    return _cargar_producto(db, db_producto.id_producto)
+
+def _producto_response(prod):
+    # Respuesta con información del aprobador
+    aprobador = prod.aprobador
+    producto_dict = {
+        'id_producto': getattr(prod, 'id_producto'),
+        'nombre': getattr(prod, 'nombre'),
+        'descripcion': getattr(prod, 'descripcion'),
+        'id_tipologia': getattr(prod, 'id_tipologia'),
+        'id_linea': getattr(prod, 'id_linea'),
+        'fecha_creacion': getattr(prod, 'fecha_creacion'),
+        'enlace': getattr(prod, 'enlace'),
+        'repositorio': getattr(prod, 'repositorio'),
+        'imagen_referencia': getattr(prod, 'imagen_referencia'),
+        'id_responsable': getattr(prod, 'id_responsable'),
+        'estado_desarrollo': getattr(prod, 'estado_desarrollo'),
+        'estado_aprobacion': getattr(prod, 'estado_aprobacion'),
+        'fecha_registro': getattr(prod, 'fecha_registro'),
+        'fecha_aprobacion': getattr(prod, 'fecha_aprobacion'),
+        'id_aprobador': getattr(prod, 'id_aprobador'),
+        'aprobador_nombre': aprobador.nombre if aprobador else None,
+        'aprobador_apellido': aprobador.apellido if aprobador else None,
+        'responsable': prod.responsable,
+        'tipologia': prod.tipologia,
+        'linea': prod.linea
+    }
+    return schemas.ProductoResponse(**producto_dict)
 
 @router.get("/productos/", response_model=List[schemas.ProductoResponse])
 def read_productos(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    pagina: Pagina = Depends(PAGINACION_PRODUCTOS),
     estado_desarrollo: Optional[models.ProductoEstadoDesarrollo] = None,
     estado_aprobacion: Optional[models.ProductoEstado] = None,
     id_linea: Optional[int] = None,
     id_tipologia: Optional[int] = None,
     id_responsable: Optional[int] = None,
-    db: Session = Depends(get_db)
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    query = db.query(models.Producto)
-    
-    if estado_desarrollo:
-        query = query.filter(models.Producto.estado_desarrollo == estado_desarrollo)
-    if estado_aprobacion:
-        query = query.filter(models.Producto.estado_aprobacion == estado_aprobacion)
-    if id_linea:
-        query = query.filter(models.Producto.id_linea == id_linea)
-    if id_tipologia:
-        query = query.filter(models.Producto.id_tipologia == id_tipologia)
-    if id_responsable:
-        query = query.filter(models.Producto.id_responsable == id_responsable)
-    
-    productos = query.offset(skip).limit(limit).all()
-    
-    # Crear respuestas con información del aprobador
-    productos_response = []
-    for prod in productos:
-        aprobador_nombre = None
-        aprobador_apellido = None
+    def filtrar(db: Session):
+        # Las cuatro relaciones de la respuesta en la misma consulta, en lugar de cargas perezosas por fila
+        query = db.query(models.Producto).options(
+            joinedload(models.Producto.responsable).joinedload(models.Usuario.rol),
+            joinedload(models.Producto.tipologia),
+            joinedload(models.Producto.linea).joinedload(models.LineaInvestigacion.responsable).joinedload(models.Usuario.rol),
+            joinedload(models.Producto.aprobador)
+        )
         
-        id_aprobador = getattr(prod, 'id_aprobador', None)
-        if id_aprobador is not None:
-            aprobador = db.query(models.Usuario).filter(models.Usuario.id_usuario == id_aprobador).first()
-            if aprobador:
-                aprobador_nombre = aprobador.nombre
-                aprobador_apellido = aprobador.apellido
+        if estado_desarrollo:
+            query = query.filter(models.Producto.estado_desarrollo == estado_desarrollo)
+        if estado_aprobacion:
+            query = query.filter(models.Producto.estado_aprobacion == estado_aprobacion)
+        if id_linea:
+            query = query.filter(models.Producto.id_linea == id_linea)
+        if id_tipologia:
+            query = query.filter(models.Producto.id_tipologia == id_tipologia)
+        if id_responsable:
+            query = query.filter(models.Producto.id_responsable == id_responsable)
         
-        producto_dict = {
-            'id_producto': getattr(prod, 'id_producto'),
-            'nombre': getattr(prod, 'nombre'),
-            'descripcion': getattr(prod, 'descripcion'),
-            'id_tipologia': getattr(prod, 'id_tipologia'),
-            'id_linea': getattr(prod, 'id_linea'),
-            'fecha_creacion': getattr(prod, 'fecha_creacion'),
-            'enlace': getattr(prod, 'enlace'),
-            'repositorio': getattr(prod, 'repositorio'),
-            'imagen_referencia': getattr(prod, 'imagen_referencia'),
-            'id_responsable': getattr(prod, 'id_responsable'),
-            'estado_desarrollo': getattr(prod, 'estado_desarrollo'),
-            'estado_aprobacion': getattr(prod, 'estado_aprobacion'),
-            'fecha_registro': getattr(prod, 'fecha_registro'),
-            'fecha_aprobacion': getattr(prod, 'fecha_aprobacion'),
-            'id_aprobador': id_aprobador,
-            'aprobador_nombre': aprobador_nombre,
-            'aprobador_apellido': aprobador_apellido,
-            'responsable': prod.responsable,
-            'tipologia': prod.tipologia,
-            'linea': prod.linea
-        }
-        productos_response.append(schemas.ProductoResponse(**producto_dict))
+        return ORDEN_PRODUCTOS.aplicar(query, sort, cursor)
     
-    return productos_response
+    # Páginas por encima del presupuesto: por lotes y sin caché
+    if pagina.streaming:
+        return respuesta_streaming(
+            request, productos_adapter, filtrar, pagina, convertir=_producto_response,
+            cabeceras=lambda query: ORDEN_PRODUCTOS.cabeceras_consulta(query, pagina.skip, pagina.limit, sort)
+        )
+    
+    # Respuesta cacheada; se invalida desde las rutas de escritura
+    def consultar(db: Session):
+        return [_producto_response(prod) for prod in pagina.aplicar(filtrar(db)).all()]
+    
+    return respuesta_cacheada(
+        request, productos_adapter, TAGS_PRODUCTOS, consultar,
+        cabeceras=lambda filas: ORDEN_PRODUCTOS.cabeceras(filas, pagina.limit, sort),
+        pagina=pagina
+    )
+
+def _validadores_producto(db: Session, producto_id: int):
+    responsable = aliased(models.Usuario)
+    rol_responsable = aliased(models.Rol)
+    linea = aliased(models.LineaInvestigacion)
+    responsable_linea = aliased(models.Usuario)
+    rol_responsable_linea = aliased(models.Rol)
+    aprobador = aliased(models.Usuario)
+    return db.execute(
+        select(
+            models.Producto.version,
+            responsable.version,
+            rol_responsable.version,
+            models.Tipologia.version,
+            linea.version,
+            responsable_linea.version,
+            rol_responsable_linea.version,
+            aprobador.version,
+            func.greatest(
+                models.Producto.fecha_actualizacion,
+                responsable.fecha_actualizacion,
+                rol_responsable.fecha_actualizacion,
+                models.Tipologia.fecha_actualizacion,
+                linea.fecha_actualizacion,
+                responsable_linea.fecha_actualizacion,
+                rol_responsable_linea.fecha_actualizacion,
+                aprobador.fecha_actualizacion
+            )
+        )
+        .join(responsable, models.Producto.id_responsable == responsable.id_usuario)
+        .join(rol_responsable, responsable.id_rol == rol_responsable.id_rol)
+        .join(models.Tipologia, models.Producto.id_tipologia == models.Tipologia.id_tipologia)
+        .outerjoin(linea, models.Producto.id_linea == linea.id_linea)
+        .outerjoin(responsable_linea, linea.id_responsable == responsable_linea.id_usuario)
+        .outerjoin(rol_responsable_linea, responsable_linea.id_rol == rol_responsable_linea.id_rol)
+        .outerjoin(aprobador, models.Producto.id_aprobador == aprobador.id_usuario)
+        .where(models.Producto.id_producto == producto_id)
+    ).first()
 
 @router.get("/productos/{producto_id}", response_model=schemas.ProductoResponse)
-def read_producto(producto_id: int, db: Session = Depends(get_db)):
+def read_producto(producto_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # Validadores (ETag / Last-Modified) con una sola consulta estrecha, sin cargar relaciones
+    fila = _validadores_producto(db, producto_id)
+    if fila is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Producto no encontrado"
+        )
+    etag, ultima_modificacion = validadores(fila)
+    if no_modificado(request, etag, ultima_modificacion):
+        return respuesta_no_modificado(etag, ultima_modificacion)
+    
     db_producto = db.query(models.Producto).filter(models.Producto.id_producto == producto_id).first()
     if db_producto is None:
         raise HTTPException(
@@ -149,6 +243,7 @@ def read_producto(producto_id: int, db: Session = Depends(get_db)):
         'linea': db_producto.linea
     }
     
+    agregar_validadores(response, etag, ultima_modificacion)
     return schemas.ProductoResponse(**producto_dict)
 
 @router.put("/productos/{producto_id}", response_model=schemas.Producto)
@@ -160,37 +255,66 @@ def update_producto(producto_id: int, producto: schemas.ProductoCreate, db: Sess
             detail="Producto no encontrado"
         )
     
-    # Verificar si la tipología existe
-    tipologia = db.query(models.Tipologia).filter(models.Tipologia.id_tipologia == producto.id_tipologia).first()
-    if not tipologia:
+    # Verificar en una sola consulta que existen la tipología, la línea y el responsable
+    producto_data = producto.model_dump()
+    _verificar_referencias(db, producto_data)
+    
+    for key, value in producto_data.items():
+        setattr(db_producto, key, value)
+    
+    with traducir_errores_fk(db, MENSAJES_FK):
+        publicar_cambio(db, "producto", db_producto.id_producto, "actualizado", db_producto.estado_aprobacion)
+        db.commit()
+    invalidar("productos")
+    return _cargar_producto(db, db_producto.id_producto)
+
+@router.patch("/productos/{producto_id}", response_model=schemas.Producto)
+def patch_producto(producto_id: int, producto: schemas.ProductoUpdate, db: Session = Depends(get_db)):
+    """
+    Actualización parcial: solo se modifican los campos enviados
+    y el UPDATE incluye únicamente las columnas que cambian.
+    """
+    db_producto = db.query(models.Producto).filter(models.Producto.id_producto == producto_id).first()
+    if db_producto is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="La tipología especificada no existe"
+            detail="Producto no encontrado"
         )
     
-    # Verificar si la línea de investigación existe
-    if producto.id_linea:
-        linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == producto.id_linea).first()
-        if not linea:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="La línea de investigación especificada no existe"
-            )
+    producto_data = producto.model_dump(exclude_unset=True)
+    _verificar_referencias(db, producto_data)
     
-    # Verificar si el responsable existe
-    responsable = db.query(models.Usuario).filter(models.Usuario.id_usuario == producto.id_responsable).first()
-    if not responsable:
+    for key, value in producto_data.items():
+        setattr(db_producto, key, value)
+    
+    # Sin cambios reales no hay UPDATE, ni evento, ni invalidación
+    if db.is_modified(db_producto):
+        with traducir_errores_fk(db, MENSAJES_FK):
+            publicar_cambio(db, "producto", db_producto.id_producto, "actualizado", db_producto.estado_aprobacion)
+            db.commit()
+        invalidar("productos")
+    return _cargar_producto(db, db_producto.id_producto)
+
+@router.put("/productos/{producto_id}/imagen", response_model=schemas.Producto)
+def subir_imagen_producto(producto_id: int, archivo: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Subir la imagen de referencia. Las variantes (srcset y miniatura) se generan en segundo plano.
+    """
+    db_producto = db.query(models.Producto).filter(models.Producto.id_producto == producto_id).first()
+    if db_producto is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="El responsable especificado no existe"
+            detail="Producto no encontrado"
         )
     
-    for key, value in producto.dict().items():
-        setattr(db_producto, key, value)
-    
-    db.commit()
-    db.refresh(db_producto)
-    return db_producto
+    imagen_anterior = db_producto.imagen_referencia
+    with imagen_subida(archivo, "productos", db) as url:
+        db_producto.imagen_referencia = url
+        publicar_cambio(db, "producto", db_producto.id_producto, "actualizado", db_producto.estado_aprobacion)
+        db.commit()
+    invalidar("productos")
+    eliminar_imagen(imagen_anterior)
+    return _cargar_producto(db, db_producto.id_producto)
 
 @router.delete("/productos/{producto_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_producto(producto_id: int, db: Session = Depends(get_db)):
@@ -202,7 +326,11 @@ def delete_producto(producto_id: int, db: Session = Depends(get_db)):
         )
     
     db.delete(db_producto)
+    db.add(models.Eliminacion(entidad="producto", id_registro=db_producto.id_producto))
+    publicar_cambio(db, "producto", db_producto.id_producto, "eliminado")
     db.commit()
+    invalidar("productos")
+    eliminar_imagen(db_producto.imagen_referencia)
     return None
 
 @router.put("/productos/{producto_id}/estado", response_model=schemas.Producto)
@@ -219,9 +347,10 @@ def update_estado_producto(
         )
     
     setattr(db_producto, 'estado_desarrollo', estado)
+    publicar_cambio(db, "producto", db_producto.id_producto, "estado_actualizado", db_producto.estado_desarrollo)
     db.commit()
-    db.refresh(db_producto)
-    return db_producto
+    invalidar("productos")
+    return _cargar_producto(db, db_producto.id_producto)
 
 @router.put("/productos/{producto_id}/aprobar", response_model=schemas.Producto)
 def aprobar_producto(producto_id: int, id_aprobador: int, db: Session = Depends(get_db)):
@@ -232,21 +361,16 @@ def aprobar_producto(producto_id: int, id_aprobador: int, db: Session = Depends(
             detail="Producto no encontrado"
         )
     
-    # Verificar si el aprobador existe
-    aprobador = db.query(models.Usuario).filter(models.Usuario.id_usuario == id_aprobador).first()
-    if not aprobador:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El aprobador especificado no existe"
-        )
-    
     setattr(db_producto, 'estado_aprobacion', models.ProductoEstado.aprobado)
     setattr(db_producto, 'id_aprobador', id_aprobador)
     setattr(db_producto, 'fecha_aprobacion', datetime.utcnow())
     
-    db.commit()
-    db.refresh(db_producto)
-    return db_producto
+    # La existencia del aprobador la garantiza su foreign key
+    with traducir_errores_fk(db, MENSAJES_FK):
+        publicar_cambio(db, "producto", db_producto.id_producto, "aprobado", db_producto.estado_aprobacion)
+        db.commit()
+    invalidar("productos")
+    return _cargar_producto(db, db_producto.id_producto)
 
 @router.put("/productos/{producto_id}/rechazar", response_model=schemas.Producto)
 def rechazar_producto(producto_id: int, id_aprobador: int, db: Session = Depends(get_db)):
@@ -257,21 +381,16 @@ def rechazar_producto(producto_id: int, id_aprobador: int, db: Session = Depends
             detail="Producto no encontrado"
         )
     
-    # Verificar si el aprobador existe
-    aprobador = db.query(models.Usuario).filter(models.Usuario.id_usuario == id_aprobador).first()
-    if not aprobador:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El aprobador especificado no existe"
-        )
-    
     setattr(db_producto, 'estado_aprobacion', models.ProductoEstado.rechazado)
     setattr(db_producto, 'id_aprobador', id_aprobador)
     setattr(db_producto, 'fecha_aprobacion', datetime.utcnow())
     
-    db.commit()
-    db.refresh(db_producto)
-    return db_producto
+    # La existencia del aprobador la garantiza su foreign key
+    with traducir_errores_fk(db, MENSAJES_FK):
+        publicar_cambio(db, "producto", db_producto.id_producto, "rechazado", db_producto.estado_aprobacion)
+        db.commit()
+    invalidar("productos")
+    return _cargar_producto(db, db_producto.id_producto)
 
 @router.put("/productos/{producto_id}/estado-aprobacion", response_model=schemas.ProductoEstadoResponse)
 def actualizar_estado_aprobacion_producto(
@@ -310,9 +429,9 @@ def actualizar_estado_aprobacion_producto(
     # Actualizar el estado
     setattr(db_producto, 'estado_aprobacion', estado_update.estado)
     
+    publicar_cambio(db, "producto", db_producto.id_producto, "estado_actualizado", db_producto.estado_aprobacion)
     db.commit()
-    db.refresh(db_producto)
-    
+    invalidar("productos")
     # Crear mensaje según el estado
     mensaje = f"Estado de aprobación actualizado a '{estado_update.estado}'"
     if aprobador_nombre is not None and aprobador_apellido is not None:
@@ -1,101 +1,195 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased, joinedload
 from typing import List, Optional
-from app.database.database import get_db
+from app.core.orden import Ordenamiento
+from app.core.paginacion import Pagina, Paginacion, respuesta_streaming
+from app.core.cache import TAGS_PUBLICACIONES, invalidar, respuesta_cacheada
+from app.core.cambios import publicar_cambio
+from app.core.referencias import traducir_errores_fk, verificar_referencias
+from app.core.validadores import agregar_validadores, no_modificado, respuesta_no_modificado, validadores
+from app.database.database import get_db, get_read_db
 from app.models import models
 from app.schemas import schemas
 from datetime import datetime
 
 router = APIRouter()
 
+# Mensajes de las foreign keys de Publicacion, compartidos por la verificación previa y el commit
+MENSAJES_FK = {
+    "id_autor_principal": "El autor principal especificado no existe",
+    "id_linea": "La línea de investigación especificada no existe",
+    "id_aprobador": "El aprobador especificado no existe"
+}
+
+publicaciones_adapter = TypeAdapter(List[schemas.PublicacionResponse])
+
+# Campos de sort= admitidos; cada uno tiene su índice en app/database/migraciones.py
+ORDEN_PUBLICACIONES = Ordenamiento(
+    models.Publicacion.id_publicacion,
+    [models.Publicacion.fecha_publicacion, models.Publicacion.fecha_registro, models.Publicacion.titulo]
+)
+
+# Una publicación serializada con su autor y su línea ocupa unos 1500 bytes
+PAGINACION_PUBLICACIONES = Paginacion(bytes_por_fila=1500)
+
+def _verificar_referencias(db: Session, datos: dict):
+    # Las claves ausentes (PATCH) se omiten
+    verificar_referencias(db, [
+        (models.Usuario.id_usuario, datos.get("id_autor_principal"), MENSAJES_FK["id_autor_principal"]),
+        (models.LineaInvestigacion.id_linea, datos.get("id_linea") or None, MENSAJES_FK["id_linea"])
+    ])
+
+def _cargar_publicacion(db: Session, publicacion_id: int):
+    # Relaciones de schemas.Publicacion en una sola consulta, en lugar de refresh() + cargas perezosas
+    return (
+        db.query(models.Publicacion)
+        .options(
+            joinedload(models.Publicacion.autor_principal).joinedload(models.Usuario.rol),
+            joinedload(models.Publicacion.linea).joinedload(models.LineaInvestigacion.responsable).joinedload(models.Usuario.rol)
+        )
+        .populate_existing()
+        .filter(models.Publicacion.id_publicacion == publicacion_id)
+        .one()
+    )
+
 @router.post("/publicaciones/", response_model=schemas.Publicacion, status_code=status.HTTP_201_CREATED)
 def create_publicacion(publicacion: schemas.PublicacionCreate, db: Session = Depends(get_db)):
     """
     Crear una nueva publicación. 
     El estado por defecto es 'pendiente' y debe ser aprobado por un administrador.
     """
-    # Verificar si el autor principal existe
-    autor = db.query(models.Usuario).filter(models.Usuario.id_usuario == publicacion.id_autor_principal).first()
-    if not autor:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El autor principal especificado no existe"
-        )
-    
-    # Verificar si la línea de investigación existe
-    if publicacion.id_linea:
-        linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == publicacion.id_linea).first()
-        if not linea:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="La línea de investigación especificada no existe"
-            )
+    # Verificar en una sola consulta que existen el autor principal y la línea
+    publicacion_data = publicacion.model_dump()
+    _verificar_referencias(db, publicacion_data)
     
     # Crear la publicación con estado 'pendiente' por defecto
-    db_publicacion = models.Publicacion(**publicacion.dict())
-    db.add(db_publicacion)
-    db.commit()
-    db.refresh(db_publicacion)
-    return db_publicacion
+    db_publicacion = models.Publicacion(**publicacion_data)
+    with traducir_errores_fk(db, MENSAJES_FK):
+        db.add(db_publicacion)
+        db.flush()
+        publicar_cambio(db, "publicacion", db_publicacion.id_publicacion, "creado", db_publicacion.estado)
+        db.commit()
+    invalidar("publicaciones")
+    return _cargar_publicacion(db, db_publicacion.id_publicacion)
+
+def _publicacion_response(pub):
+    # Respuesta con información del aprobador
+    aprobador = pub.aprobador
+    publicacion_dict = {
+        'id_publicacion': getattr(pub, 'id_publicacion'),
+        'titulo': getattr(pub, 'titulo'),
+        'resumen': getattr(pub, 'resumen'),
+        'autores': getattr(pub, 'autores'),
+        'revista_conferencia': getattr(pub, 'revista_conferencia'),
+        'fecha_publicacion': getattr(pub, 'fecha_publicacion'),
+        'enlace': getattr(pub, 'enlace'),
+        'id_linea': getattr(pub, 'id_linea'),
+        'id_autor_principal': getattr(pub, 'id_autor_principal'),
+        'estado': getattr(pub, 'estado'),
+        'fecha_registro': getattr(pub, 'fecha_registro'),
+        'fecha_aprobacion': getattr(pub, 'fecha_aprobacion'),
+        'id_aprobador': getattr(pub, 'id_aprobador'),
+        'aprobador_nombre': aprobador.nombre if aprobador else None,
+        'aprobador_apellido': aprobador.apellido if aprobador else None,
+        'autor_principal': pub.autor_principal,
+        'linea': pub.linea
+    }
+    return schemas.PublicacionResponse(**publicacion_dict)
 
 @router.get("/publicaciones/", response_model=List[schemas.PublicacionResponse])
 def read_publicaciones(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    pagina: Pagina = Depends(PAGINACION_PUBLICACIONES),
     estado: Optional[models.PublicacionEstado] = None,
     id_linea: Optional[int] = None,
     id_autor: Optional[int] = None,
-    db: Session = Depends(get_db)
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    query = db.query(models.Publicacion)
-    
-    if estado:
-        query = query.filter(models.Publicacion.estado == estado)
-    if id_linea:
-        query = query.filter(models.Publicacion.id_linea == id_linea)
-    if id_autor:
-        query = query.filter(models.Publicacion.id_autor_principal == id_autor)
-    
-    publicaciones = query.offset(skip).limit(limit).all()
-    
-    # Crear respuestas con información del aprobador
-    publicaciones_response = []
-    for pub in publicaciones:
-        aprobador_nombre = None
-        aprobador_apellido = None
+    def filtrar(db: Session):
+        # Relaciones de la respuesta en la misma consulta, en lugar de cargas perezosas por fila
+        query = db.query(models.Publicacion).options(
+            joinedload(models.Publicacion.autor_principal).joinedload(models.Usuario.rol),
+            joinedload(models.Publicacion.linea).joinedload(models.LineaInvestigacion.responsable).joinedload(models.Usuario.rol),
+            joinedload(models.Publicacion.aprobador)
+        )
         
-        id_aprobador = getattr(pub, 'id_aprobador', None)
-        if id_aprobador is not None:
-            aprobador = db.query(models.Usuario).filter(models.Usuario.id_usuario == id_aprobador).first()
-            if aprobador:
-                aprobador_nombre = aprobador.nombre
-                aprobador_apellido = aprobador.apellido
+        if estado:
+            query = query.filter(models.Publicacion.estado == estado)
+        if id_linea:
+            query = query.filter(models.Publicacion.id_linea == id_linea)
+        if id_autor:
+            query = query.filter(models.Publicacion.id_autor_principal == id_autor)
         
-        publicacion_dict = {
-            'id_publicacion': getattr(pub, 'id_publicacion'),
-            'titulo': getattr(pub, 'titulo'),
-            'resumen': getattr(pub, 'resumen'),
-            'autores': getattr(pub, 'autores'),
-            'revista_conferencia': getattr(pub, 'revista_conferencia'),
-            'fecha_publicacion': getattr(pub, 'fecha_publicacion'),
-            'enlace': getattr(pub, 'enlace'),
-            'id_linea': getattr(pub, 'id_linea'),
-            'id_autor_principal': getattr(pub, 'id_autor_principal'),
-            'estado': getattr(pub, 'estado'),
-            'fecha_registro': getattr(pub, 'fecha_registro'),
-            'fecha_aprobacion': getattr(pub, 'fecha_aprobacion'),
-            'id_aprobador': id_aprobador,
-            'aprobador_nombre': aprobador_nombre,
-            'aprobador_apellido': aprobador_apellido,
-            'autor_principal': pub.autor_principal,
-            'linea': pub.linea
-        }
-        publicaciones_response.append(schemas.PublicacionResponse(**publicacion_dict))
+        return ORDEN_PUBLICACIONES.aplicar(query, sort, cursor)
+    
+    # Páginas por encima del presupuesto: por lotes y sin caché
+    if pagina.streaming:
+        return respuesta_streaming(
+            request, publicaciones_adapter, filtrar, pagina, convertir=_publicacion_response,
+            cabeceras=lambda query: ORDEN_PUBLICACIONES.cabeceras_consulta(query, pagina.skip, pagina.limit, sort)
+        )
+    
+    # Respuesta cacheada; se invalida desde las rutas de escritura
+    def consultar(db: Session):
+        return [_publicacion_response(pub) for pub in pagina.aplicar(filtrar(db)).all()]
     
-    return publicaciones_response
+    return respuesta_cacheada(
+        request, publicaciones_adapter, TAGS_PUBLICACIONES, consultar,
+        cabeceras=lambda filas: ORDEN_PUBLICACIONES.cabeceras(filas, pagina.limit, sort),
+        pagina=pagina
+    )
+
+def _validadores_publicacion(db: Session, publicacion_id: int):
+    autor = aliased(models.Usuario)
+    rol_autor = aliased(models.Rol)
+    linea = aliased(models.LineaInvestigacion)
+    responsable = aliased(models.Usuario)
+    rol_responsable = aliased(models.Rol)
+    aprobador = aliased(models.Usuario)
+    return db.execute(
+        select(
+            models.Publicacion.version,
+            autor.version,
+            rol_autor.version,
+            linea.version,
+            responsable.version,
+            rol_responsable.version,
+            aprobador.version,
+            func.greatest(
+                models.Publicacion.fecha_actualizacion,
+                autor.fecha_actualizacion,
+                rol_autor.fecha_actualizacion,
+                linea.fecha_actualizacion,
+                responsable.fecha_actualizacion,
+                rol_responsable.fecha_actualizacion,
+                aprobador.fecha_actualizacion
+            )
+        )
+        .join(autor, models.Publicacion.id_autor_principal == autor.id_usuario)
+        .join(rol_autor, autor.id_rol == rol_autor.id_rol)
+        .outerjoin(linea, models.Publicacion.id_linea == linea.id_linea)
+        .outerjoin(responsable, linea.id_responsable == responsable.id_usuario)
+        .outerjoin(rol_responsable, responsable.id_rol == rol_responsable.id_rol)
+        .outerjoin(aprobador, models.Publicacion.id_aprobador == aprobador.id_usuario)
+        .where(models.Publicacion.id_publicacion == publicacion_id)
+    ).first()
 
 @router.get("/publicaciones/{publicacion_id}", response_model=schemas.PublicacionResponse)
-def read_publicacion(publicacion_id: int, db: Session = Depends(get_db)):
+def read_publicacion(publicacion_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # Validadores (ETag / Last-Modified) con una sola consulta estrecha, sin cargar relaciones
+    fila = _validadores_publicacion(db, publicacion_id)
+    if fila is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Publicación no encontrada"
+        )
+    etag, ultima_modificacion = validadores(fila)
+    if no_modificado(request, etag, ultima_modificacion):
+        return respuesta_no_modificado(etag, ultima_modificacion)
+    
     db_publicacion = db.query(models.Publicacion).filter(models.Publicacion.id_publicacion == publicacion_id).first()
     if db_publicacion is None:
         raise HTTPException(
@@ -134,6 +228,7 @@ def read_publicacion(publicacion_id: int, db: Session = Depends(get_db)):
         'linea': db_publicacion.linea
     }
     
+    agregar_validadores(response, etag, ultima_modificacion)
     return schemas.PublicacionResponse(**publicacion_dict)
 
 @router.put("/publicaciones/{publicacion_id}", response_model=schemas.Publicacion)
@@ -145,29 +240,45 @@ def update_publicacion(publicacion_id: int, publicacion: schemas.PublicacionCrea
             detail="Publicación no encontrada"
         )
     
-    # Verificar si el autor principal existe
-    autor = db.query(models.Usuario).filter(models.Usuario.id_usuario == publicacion.id_autor_principal).first()
-    if not autor:
+    # Verificar en una sola consulta que existen el autor principal y la línea
+    publicacion_data = publicacion.model_dump()
+    _verificar_referencias(db, publicacion_data)
+    
+    for key, value in publicacion_data.items():
+        setattr(db_publicacion, key, value)
+    
+    with traducir_errores_fk(db, MENSAJES_FK):
+        publicar_cambio(db, "publicacion", db_publicacion.id_publicacion, "actualizado", db_publicacion.estado)
+        db.commit()
+    invalidar("publicaciones")
+    return _cargar_publicacion(db, db_publicacion.id_publicacion)
+
+@router.patch("/publicaciones/{publicacion_id}", response_model=schemas.Publicacion)
+def patch_publicacion(publicacion_id: int, publicacion: schemas.PublicacionUpdate, db: Session = Depends(get_db)):
+    """
+    Actualización parcial: solo se modifican los campos enviados
+    y el UPDATE incluye únicamente las columnas que cambian.
+    """
+    db_publicacion = db.query(models.Publicacion).filter(models.Publicacion.id_publicacion == publicacion_id).first()
+    if db_publicacion is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="El autor principal especificado no existe"
+            detail="Publicación no encontrada"
         )
     
-    # Verificar si la línea de investigación existe
-    if publicacion.id_linea:
-        linea = db.query(models.LineaInvestigacion).filter(models.LineaInvestigacion.id_linea == publicacion.id_linea).first()
-        if not linea:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="La línea de investigación especificada no existe"
-            )
+    publicacion_data = publicacion.model_dump(exclude_unset=True)
+    _verificar_referencias(db, publicacion_data)
     
-    for key, value in publicacion.dict().items():
+    for key, value in publicacion_data.items():
         setattr(db_publicacion, key, value)
     
-    db.commit()
-    db.refresh(db_publicacion)
-    return db_publicacion
+    # Sin cambios reales no hay UPDATE, ni evento, ni invalidación
+    if db.is_modified(db_publicacion):
+        with traducir_errores_fk(db, MENSAJES_FK):
+            publicar_cambio(db, "publicacion", db_publicacion.id_publicacion, "actualizado", db_publicacion.estado)
+            db.commit()
+        invalidar("publicaciones")
+    return _cargar_publicacion(db, db_publicacion.id_publicacion)
 
 @router.delete("/publicaciones/{publicacion_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_publicacion(publicacion_id: int, db: Session = Depends(get_db)):
@@ -179,7 +290,10 @@ def delete_publicacion(publicacion_id: int, db: Session = Depends(get_db)):
         )
     
     db.delete(db_publicacion)
+    db.add(models.Eliminacion(entidad="publicacion", id_registro=db_publicacion.id_publicacion))
+    publicar_cambio(db, "publicacion", db_publicacion.id_publicacion, "eliminado")
     db.commit()
+    invalidar("publicaciones")
     return None
 
 @router.put("/publicaciones/{publicacion_id}/aprobar", response_model=schemas.Publicacion)
@@ -191,21 +305,16 @@ def aprobar_publicacion(publicacion_id: int, id_aprobador: int, db: Session = De
             detail="Publicación no encontrada"
         )
     
-    # Verificar si el aprobador existe
-    aprobador = db.query(models.Usuario).filter(models.Usuario.id_usuario == id_aprobador).first()
-    if not aprobador:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El aprobador especificado no existe"
-        )
-    
     setattr(db_publicacion, 'estado', models.PublicacionEstado.aprobada)
     setattr(db_publicacion, 'id_aprobador', id_aprobador)
     setattr(db_publicacion, 'fecha_aprobacion', datetime.utcnow())
     
-    db.commit()
-    db.refresh(db_publicacion)
-    return db_publicacion
+    # La existencia del aprobador la garantiza su foreign key
+    with traducir_errores_fk(db, MENSAJES_FK):
+        publicar_cambio(db, "publicacion", db_publicacion.id_publicacion, "aprobado", db_publicacion.estado)
+        db.commit()
+    invalidar("publicaciones")
+    return _cargar_publicacion(db, db_publicacion.id_publicacion)
 
 @router.put("/publicaciones/{publicacion_id}/rechazar", response_model=schemas.Publicacion)
 def rechazar_publicacion(publicacion_id: int, id_aprobador: int, db: Session = Depends(get_db)):
@@ -216,21 +325,16 @@ def rechazar_publicacion(publicacion_id: int, id_aprobador: int, db: Session = D
             detail="Publicación no encontrada"
         )
     
-    # Verificar si el aprobador existe
-    aprobador = db.query(models.Usuario).filter(models.Usuario.id_usuario == id_aprobador).first()
-    if not aprobador:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El aprobador especificado no existe"
-        )
-    
     setattr(db_publicacion, 'estado', models.PublicacionEstado.rechazada)
     setattr(db_publicacion, 'id_aprobador', id_aprobador)
     setattr(db_publicacion, 'fecha_aprobacion', datetime.utcnow())
     
-    db.commit()
-    db.refresh(db_publicacion)
-    return db_publicacion
+    # La existencia del aprobador la garantiza su foreign key
+    with traducir_errores_fk(db, MENSAJES_FK):
+        publicar_cambio(db, "publicacion", db_publicacion.id_publicacion, "rechazado", db_publicacion.estado)
+        db.commit()
+    invalidar("publicaciones")
+    return _cargar_publicacion(db, db_publicacion.id_publicacion)
 
 @router.put("/publicaciones/{publicacion_id}/estado", response_model=schemas.PublicacionEstadoResponse)
 def actualizar_estado_publicacion(
@@ -269,9 +373,9 @@ def actualizar_estado_publicacion(
     # Actualizar el estado
     setattr(db_publicacion, 'estado', estado_update.estado)
     
+    publicar_cambio(db, "publicacion", db_publicacion.id_publicacion, "estado_actualizado", db_publicacion.estado)
     db.commit()
-    db.refresh(db_publicacion)
-    
+    invalidar("publicaciones")
     # Crear mensaje según el estado
     mensaje = f"Estado actualizado a '{estado_update.estado}'"
     if aprobador_nombre is not None and aprobador_apellido is not None:
@@ -1,12 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List
-from app.database.database import get_db
+from app.core.cache import invalidar
+from app.core.paginacion import Pagina, Paginacion
+from app.core.referencias import eliminar_lote, traducir_errores_dependientes, verificar_dependientes
+from app.database.database import get_db, get_read_db
 from app.models import models
 from app.schemas import schemas
 
 router = APIRouter()
 
+roles_adapter = TypeAdapter(List[schemas.Rol])
+
+# Los roles son filas pequeñas y pocas; el listado no se transmite por lotes y una página
+# que resulte mayor que el presupuesto (p. ej. por descripciones largas) se rechaza con 400
+PAGINACION_ROLES = Paginacion(bytes_por_fila=150, streaming=False)
+
+# Columnas que referencian un rol y lo mantienen mientras existan
+DEPENDIENTES_ROL = [models.Usuario.id_rol]
+MENSAJE_DEPENDIENTES = "No se puede eliminar el rol porque tiene usuarios asociados"
+
 @router.post("/roles/", response_model=schemas.Rol, status_code=status.HTTP_201_CREATED)
 def create_rol(rol: schemas.RolCreate, db: Session = Depends(get_db)):
     # Verificar si el nombre del rol ya existe
@@ -17,19 +31,20 @@ def create_rol(rol: schemas.RolCreate, db: Session = Depends(get_db)):
             detail="El nombre del rol ya existe"
         )
     
-    db_rol = models.Rol(**rol.dict())
+    db_rol = models.Rol(**rol.model_dump())
     db.add(db_rol)
     db.commit()
-    db.refresh(db_rol)
+    invalidar("roles")
     return db_rol
 
 @router.get("/roles/", response_model=List[schemas.Rol])
-def read_roles(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    roles = db.query(models.Rol).offset(skip).limit(limit).all()
-    return roles
+def read_roles(pagina: Pagina = Depends(PAGINACION_ROLES), db: Session = Depends(get_read_db)):
+    roles = pagina.aplicar(db.query(models.Rol)).all()
+    # Tamaño real de la página contra el presupuesto (la descripción no tiene límite de longitud)
+    return PAGINACION_ROLES.respuesta(roles_adapter, roles)
 
 @router.get("/roles/{rol_id}", response_model=schemas.Rol)
-def read_rol(rol_id: int, db: Session = Depends(get_db)):
+def read_rol(rol_id: int, db: Session = Depends(get_read_db)):
     db_rol = db.query(models.Rol).filter(models.Rol.id_rol == rol_id).first()
     if db_rol is None:
         raise HTTPException(
@@ -56,11 +71,11 @@ def update_rol(rol_id: int, rol: schemas.RolCreate, db: Session = Depends(get_db
                 detail="El nombre del rol ya existe"
             )
     
-    for key, value in rol.dict().items():
+    for key, value in rol.model_dump().items():
         setattr(db_rol, key, value)
     
     db.commit()
-    db.refresh(db_rol)
+    invalidar("roles")
     return db_rol
 
 @router.delete("/roles/{rol_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -72,14 +87,19 @@ def delete_rol(rol_id: int, db: Session = Depends(get_db)):
             detail="Rol no encontrado"
         )
     
-    # Verificar si hay usuarios asociados al rol
-    usuarios = db.query(models.Usuario).filter(models.Usuario.id_rol == rol_id).first()
-    if usuarios:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No se puede eliminar el rol porque tiene usuarios asociados"
-        )
-    
-    db.delete(db_rol)
-    db.commit()
-    return None 
\ No newline at end of file
+    verificar_dependientes(db, DEPENDIENTES_ROL, rol_id, MENSAJE_DEPENDIENTES)
+    with traducir_errores_dependientes(db, MENSAJE_DEPENDIENTES):
+        db.delete(db_rol)
+        db.commit()
+    invalidar("roles")
+    return None
+
+@router.post("/roles/eliminar", response_model=List[schemas.ResultadoEliminacion])
+def delete_roles(lote: schemas.EliminacionLote, db: Session = Depends(get_db)):
+    """Eliminación por lotes para limpiezas administrativas; devuelve el resultado de cada id."""
+    resultados, eliminados = eliminar_lote(
+        db, models.Rol.id_rol, lote.ids, DEPENDIENTES_ROL, "Rol no encontrado", MENSAJE_DEPENDIENTES
+    )
+    if eliminados:
+        invalidar("roles")
+    return resultados
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import text, tuple_
+from sqlalchemy.orm import Session
+from app.database.database import get_db
+from app.models import models
+from app.schemas import schemas
+
+router = APIRouter()
+
+ENTIDADES_SYNC = (
+    ("publicaciones", models.Publicacion),
+    ("productos", models.Producto),
+    ("eventos", models.Evento),
+    ("eliminados", models.Eliminacion)
+)
+
+def _posicion(fila) -> tuple:
+    # Las versiones son únicas entre todas las tablas: ordenan las filas de una misma transacción
+    return (fila.xid_sync, fila.version)
+
+@router.get("/sync", response_model=schemas.SyncResponse)
+def sync(
+    since: int = Query(0, ge=0),
+    since_version: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """
+    Devuelve las publicaciones, productos y eventos creados o modificados, y los
+    registros eliminados, desde la posición (`since`, `since_version`). El `cursor` y
+    el `cursor_version` de la respuesta se envían como `since` y `since_version` en la
+    siguiente llamada; si `hay_mas` es true quedan cambios pendientes y se debe volver
+    a llamar de inmediato. Cada entidad devuelve como mucho `limit` filas, también
+    cuando una sola transacción cambió más.
+
+    Solo se devuelven los cambios de transacciones anteriores a la más antigua que
+    sigue abierta en el servidor: mientras una transacción larga siga en curso, los
+    cambios posteriores esperan a que termine (statement_timeout e
+    idle_in_transaction_session_timeout acotan esa espera).
+    """
+    # Toda transacción con xid menor que la frontera ya terminó y las consultas
+    # siguientes ven sus cambios; las demás pueden seguir en curso. Se lee antes de
+    # consultar las filas.
+    frontera = db.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar_one()
+    desde = (since, since_version)
+
+    cambios = {
+        nombre: (
+            db.query(modelo)
+            .filter(tuple_(modelo.xid_sync, modelo.version) > desde, modelo.xid_sync < frontera)
+            .order_by(modelo.xid_sync, modelo.version)
+            .limit(limit)
+            .all()
+        )
+        for nombre, modelo in ENTIDADES_SYNC
+    }
+
+    # Si alguna entidad llenó el límite, se corta en su última posición para que
+    # el cursor no salte cambios de las demás entidades
+    corte = min(
+        (_posicion(filas[-1]) for filas in cambios.values() if len(filas) == limit),
+        default=None
+    )
+    hay_mas = corte is not None
+    if hay_mas:
+        cambios = {nombre: [fila for fila in filas if _posicion(fila) <= corte] for nombre, filas in cambios.items()}
+        cursor = corte
+    else:
+        # Todo lo anterior a la frontera ya se envió: la próxima llamada empieza en ella
+        cursor = max(desde, (frontera, 0))
+
+    return schemas.SyncResponse(cursor=cursor[0], cursor_version=cursor[1], hay_mas=hay_mas, **cambios)
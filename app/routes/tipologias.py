@@ -1,12 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List
-from app.database.database import get_db
+from app.core.cache import invalidar
+from app.core.paginacion import Pagina, Paginacion
+from app.core.referencias import traducir_errores_dependientes, verificar_dependientes
+from app.database.database import get_db, get_read_db
 from app.models import models
 from app.schemas import schemas
 
 router = APIRouter()
 
+tipologias_adapter = TypeAdapter(List[schemas.Tipologia])
+
+# Catálogo pequeño: páginas por encima del presupuesto se rechazan en lugar de transmitirse
+PAGINACION_TIPOLOGIAS = Paginacion(bytes_por_fila=100, streaming=False)
+
+MENSAJE_DEPENDIENTES = "No se puede eliminar la tipología porque tiene productos asociados"
+
 @router.post("/tipologias/", response_model=schemas.Tipologia, status_code=status.HTTP_201_CREATED)
 def create_tipologia(tipologia: schemas.TipologiaCreate, db: Session = Depends(get_db)):
     # Verificar si el nombre de la tipología ya existe
@@ -17,19 +28,20 @@ def create_tipologia(tipologia: schemas.TipologiaCreate, db: Session = Depends(g
             detail="El nombre de la tipología ya existe"
         )
     
-    db_tipologia = models.Tipologia(**tipologia.dict())
+    db_tipologia = models.Tipologia(**tipologia.model_dump())
     db.add(db_tipologia)
     db.commit()
-    db.refresh(db_tipologia)
+    invalidar("tipologias")
     return db_tipologia
 
 @router.get("/tipologias/", response_model=List[schemas.Tipologia])
-def read_tipologias(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    tipologias = db.query(models.Tipologia).offset(skip).limit(limit).all()
-    return tipologias
+def read_tipologias(pagina: Pagina = Depends(PAGINACION_TIPOLOGIAS), db: Session = Depends(get_read_db)):
+    tipologias = pagina.aplicar(db.query(models.Tipologia)).all()
+    # El presupuesto se comprueba con el cuerpo ya serializado, no solo con la estimación
+    return PAGINACION_TIPOLOGIAS.respuesta(tipologias_adapter, tipologias)
 
 @router.get("/tipologias/{tipologia_id}", response_model=schemas.Tipologia)
-def read_tipologia(tipologia_id: int, db: Session = Depends(get_db)):
+def read_tipologia(tipologia_id: int, db: Session = Depends(get_read_db)):
     db_tipologia = db.query(models.Tipologia).filter(models.Tipologia.id_tipologia == tipologia_id).first()
     if db_tipologia is None:
         raise HTTPException(
@@ -56,11 +68,11 @@ def update_tipologia(tipologia_id: int, tipologia: schemas.TipologiaCreate, db:
                 detail="El nombre de la tipología ya existe"
             )
     
-    for key, value in tipologia.dict().items():
+    for key, value in tipologia.model_dump().items():
         setattr(db_tipologia, key, value)
     
     db.commit()
-    db.refresh(db_tipologia)
+    invalidar("tipologias")
     return db_tipologia
 
 @router.delete("/tipologias/{tipologia_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -72,14 +84,9 @@ def delete_tipologia(tipologia_id: int, db: Session = Depends(get_db)):
             detail="Tipología no encontrada"
         )
     
-    # Verificar si hay productos asociados a la tipología
-    productos = db.query(models.Producto).filter(models.Producto.id_tipologia == tipologia_id).first()
-    if productos:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No se puede eliminar la tipología porque tiene productos asociados"
-        )
-    
-    db.delete(db_tipologia)
-    db.commit()
+    verificar_dependientes(db, [models.Producto.id_tipologia], tipologia_id, MENSAJE_DEPENDIENTES)
+    with traducir_errores_dependientes(db, MENSAJE_DEPENDIENTES):
+        db.delete(db_tipologia)
+        db.commit()
+    invalidar("tipologias")
     return None 
\ No newline at end of file
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.core.seguridad import requerir_administrador
+from app.core.trabajos import cola_trabajos
+from app.database.database import get_db
+from app.schemas import schemas
+
+# Estado operativo de la cola: solo con el token de administrador, como /limitador/estadisticas
+router = APIRouter(dependencies=[Depends(requerir_administrador)])
+
+@router.get("/trabajos/estadisticas", response_model=schemas.TrabajosEstadisticas)
+def estadisticas_trabajos(db: Session = Depends(get_db)):
+    """
+    Profundidad de la cola de trabajos por estado y retraso (en segundos) del
+    trabajo disponible más antiguo. `trabajadores` son los hilos de este proceso.
+    Exige la cabecera X-Depuracion; sin DEPURACION_TOKEN no existe.
+    """
+    return cola_trabajos.estadisticas(db)
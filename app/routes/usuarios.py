@@ -1,12 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.database.database import get_db
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
+from app.core.cache import invalidar
+from app.core.coalescencia import serializar
+from app.core.orden import Ordenamiento
+from app.core.paginacion import Pagina, Paginacion, limite_coleccion, respuesta_streaming
+from app.core.referencias import eliminar_lote, traducir_errores_dependientes, traducir_errores_fk, verificar_dependientes
+from app.core.validadores import agregar_validadores, no_modificado, respuesta_no_modificado, validadores
+from app.core.imagenes import eliminar_imagen, imagen_subida
+from app.database.database import get_db, get_read_db, sesion_lectura
 from app.models import models
 from app.schemas import schemas
 
 router = APIRouter()
 
+# Mensajes de las foreign keys de Usuario
+MENSAJES_FK = {
+    "id_rol": "El rol especificado no existe"
+}
+
+# Columnas NOT NULL que referencian un usuario y lo mantienen mientras existan. Las opcionales
+# (aprobador, responsable de línea) no bloquean el borrado: el ORM las deja en NULL
+DEPENDIENTES_USUARIO = [
+    models.Publicacion.id_autor_principal,
+    models.Producto.id_responsable,
+    models.Evento.id_creador
+]
+MENSAJE_DEPENDIENTES = "No se puede eliminar el usuario porque es autor de publicaciones, responsable de productos o creador de eventos"
+
+usuarios_adapter = TypeAdapter(List[schemas.Usuario])
+
+# Campos de sort= admitidos; cada uno tiene su índice en app/database/migraciones.py
+ORDEN_USUARIOS = Ordenamiento(
+    models.Usuario.id_usuario,
+    [models.Usuario.fecha_registro, models.Usuario.apellido, models.Usuario.nombre]
+)
+
+# Usuario con su rol y las variantes de la foto de perfil: unos 500 bytes
+PAGINACION_USUARIOS = Paginacion(bytes_por_fila=500)
+
+def _cargar_usuario(db: Session, usuario_id: int):
+    # Relaciones de schemas.Usuario en una sola consulta, en lugar de refresh() + carga perezosa del rol
+    return (
+        db.query(models.Usuario)
+        .options(joinedload(models.Usuario.rol))
+        .populate_existing()
+        .filter(models.Usuario.id_usuario == usuario_id)
+        .one()
+    )
+
 @router.post("/usuarios/", response_model=schemas.Usuario, status_code=status.HTTP_201_CREATED)
 def create_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_db)):
     # Verificar si el email ya existe
@@ -19,28 +63,153 @@ def create_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_db)
     
     # Crear nuevo usuario
     db_usuario = models.Usuario(
-        **usuario.dict()
+        **usuario.model_dump()
     )
     db.add(db_usuario)
     db.commit()
-    db.refresh(db_usuario)
-    return db_usuario
+    invalidar("usuarios")
+    return _cargar_usuario(db, db_usuario.id_usuario)
 
 @router.get("/usuarios/", response_model=List[schemas.Usuario])
-def read_usuarios(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    usuarios = db.query(models.Usuario).offset(skip).limit(limit).all()
-    return usuarios
+def read_usuarios(
+    request: Request,
+    pagina: Pagina = Depends(PAGINACION_USUARIOS),
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    def filtrar(db: Session):
+        query = db.query(models.Usuario).options(joinedload(models.Usuario.rol))
+        return ORDEN_USUARIOS.aplicar(query, sort, cursor)
+
+    # Páginas por encima del presupuesto: por lotes
+    if pagina.streaming:
+        return respuesta_streaming(
+            request, usuarios_adapter, filtrar, pagina,
+            cabeceras=lambda query: ORDEN_USUARIOS.cabeceras_consulta(query, pagina.skip, pagina.limit, sort)
+        )
+
+    with sesion_lectura(request) as db:
+        usuarios = pagina.aplicar(filtrar(db)).all()
+        # Serializado directo a JSON con el adaptador construido al importar el módulo
+        cuerpo = serializar(usuarios_adapter, usuarios)
+        pagina.medir(len(cuerpo), len(usuarios))
+        return Response(
+            content=cuerpo,
+            media_type="application/json",
+            headers=ORDEN_USUARIOS.cabeceras(usuarios, pagina.limit, sort)
+        )
+
+def _validadores_usuario(db: Session, usuario_id: int):
+    return db.execute(
+        select(
+            models.Usuario.version,
+            models.Rol.version,
+            func.greatest(models.Usuario.fecha_actualizacion, models.Rol.fecha_actualizacion)
+        )
+        .join(models.Rol, models.Usuario.id_rol == models.Rol.id_rol)
+        .where(models.Usuario.id_usuario == usuario_id)
+    ).first()
 
 @router.get("/usuarios/{usuario_id}", response_model=schemas.Usuario)
-def read_usuario(usuario_id: int, db: Session = Depends(get_db)):
+def read_usuario(usuario_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # Validadores (ETag / Last-Modified) con una sola consulta estrecha, sin cargar relaciones
+    fila = _validadores_usuario(db, usuario_id)
+    if fila is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    etag, ultima_modificacion = validadores(fila)
+    if no_modificado(request, etag, ultima_modificacion):
+        return respuesta_no_modificado(etag, ultima_modificacion)
+    
     db_usuario = db.query(models.Usuario).filter(models.Usuario.id_usuario == usuario_id).first()
     if db_usuario is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario no encontrado"
         )
+    agregar_validadores(response, etag, ultima_modificacion)
     return db_usuario
 
+def _resumen_perfil(db: Session, usuario_id: int) -> dict:
+    # Lee los contadores desnormalizados de EstadisticaUsuario en lugar de agregar las tablas
+    resumen = {
+        entidad: {"total": 0, "por_estado": {}, "por_anio": {}}
+        for entidad in models.ESTADISTICAS_USUARIO
+    }
+    filas = db.query(models.EstadisticaUsuario).filter(
+        models.EstadisticaUsuario.id_usuario == usuario_id,
+        models.EstadisticaUsuario.total > 0
+    ).all()
+    for fila in filas:
+        conteo = resumen[fila.entidad]
+        anio = str(fila.anio) if fila.anio else "sin_fecha"
+        conteo["total"] += fila.total
+        por_anio = conteo["por_anio"].setdefault(anio, {})
+        if fila.estado:
+            conteo["por_estado"][fila.estado] = conteo["por_estado"].get(fila.estado, 0) + fila.total
+            por_anio[fila.estado] = fila.total
+        else:
+            por_anio["total"] = fila.total
+    return resumen
+
+@router.get("/usuarios/{usuario_id}/perfil", response_model=schemas.UsuarioPerfil)
+def read_perfil_usuario(usuario_id: int, limit: int = Depends(limite_coleccion), db: Session = Depends(get_read_db)):
+    """
+    Usuario con sus `limit` publicaciones (como autor principal), productos, eventos y
+    líneas más recientes, más el resumen por año y estado con los totales. Cada colección
+    es una consulta con LIMIT y el resumen sale de la tabla de contadores.
+    """
+    db_usuario = (
+        db.query(models.Usuario)
+        .options(joinedload(models.Usuario.rol))
+        .filter(models.Usuario.id_usuario == usuario_id)
+        .first()
+    )
+    if db_usuario is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    publicaciones = (
+        db.query(models.Publicacion)
+        .filter(models.Publicacion.id_autor_principal == usuario_id)
+        .order_by(models.Publicacion.fecha_publicacion.desc().nulls_last(), models.Publicacion.id_publicacion.desc())
+        .limit(limit)
+        .all()
+    )
+    productos = (
+        db.query(models.Producto)
+        .options(joinedload(models.Producto.tipologia))
+        .filter(models.Producto.id_responsable == usuario_id)
+        .order_by(models.Producto.fecha_creacion.desc().nulls_last(), models.Producto.id_producto.desc())
+        .limit(limit)
+        .all()
+    )
+    eventos = (
+        db.query(models.Evento)
+        .filter(models.Evento.id_creador == usuario_id)
+        .order_by(models.Evento.fecha_inicio.desc().nulls_last(), models.Evento.id_evento.desc())
+        .limit(limit)
+        .all()
+    )
+    lineas = (
+        db.query(models.LineaInvestigacion)
+        .filter(models.LineaInvestigacion.id_responsable == usuario_id)
+        .order_by(models.LineaInvestigacion.id_linea.desc())
+        .limit(limit)
+        .all()
+    )
+    return {
+        "usuario": db_usuario,
+        "publicaciones": publicaciones,
+        "productos": productos,
+        "eventos": eventos,
+        "lineas_investigacion": lineas,
+        "resumen": _resumen_perfil(db, usuario_id)
+    }
+
 @router.put("/usuarios/{usuario_id}", response_model=schemas.Usuario)
 def update_usuario(usuario_id: int, usuario: schemas.UsuarioCreate, db: Session = Depends(get_db)):
     db_usuario = db.query(models.Usuario).filter(models.Usuario.id_usuario == usuario_id).first()
@@ -51,7 +220,7 @@ def update_usuario(usuario_id: int, usuario: schemas.UsuarioCreate, db: Session
         )
     
     # Actualizar datos del usuario
-    usuario_data = usuario.dict()
+    usuario_data = usuario.model_dump()
     
     # Si el password es "string", mantener la contraseña actual
     if usuario_data.get('password') == "string":
@@ -65,8 +234,65 @@ def update_usuario(usuario_id: int, usuario: schemas.UsuarioCreate, db: Session
         setattr(db_usuario, key, value)
     
     db.commit()
-    db.refresh(db_usuario)
-    return db_usuario
+    invalidar("usuarios")
+    return _cargar_usuario(db, db_usuario.id_usuario)
+
+@router.patch("/usuarios/{usuario_id}", response_model=schemas.Usuario)
+def patch_usuario(usuario_id: int, usuario: schemas.UsuarioUpdate, db: Session = Depends(get_db)):
+    """
+    Actualización parcial: solo se modifican los campos enviados
+    y el UPDATE incluye únicamente las columnas que cambian.
+    """
+    db_usuario = db.query(models.Usuario).filter(models.Usuario.id_usuario == usuario_id).first()
+    if db_usuario is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    usuario_data = usuario.model_dump(exclude_unset=True)
+    
+    # Verificar que el nuevo email no esté registrado por otro usuario
+    if "email" in usuario_data and usuario_data["email"] != db_usuario.email:
+        existente = db.query(models.Usuario.id_usuario).filter(
+            models.Usuario.email == usuario_data["email"],
+            models.Usuario.id_usuario != usuario_id
+        ).first()
+        if existente:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El email ya está registrado"
+            )
+    
+    for key, value in usuario_data.items():
+        setattr(db_usuario, key, value)
+    
+    # Sin cambios reales no hay UPDATE ni invalidación
+    if db.is_modified(db_usuario):
+        with traducir_errores_fk(db, MENSAJES_FK):
+            db.commit()
+        invalidar("usuarios")
+    return _cargar_usuario(db, db_usuario.id_usuario)
+
+@router.put("/usuarios/{usuario_id}/foto-perfil", response_model=schemas.Usuario)
+def subir_foto_perfil(usuario_id: int, archivo: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Subir la foto de perfil. Las variantes (srcset y miniatura) se generan en segundo plano.
+    """
+    db_usuario = db.query(models.Usuario).filter(models.Usuario.id_usuario == usuario_id).first()
+    if db_usuario is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    foto_anterior = db_usuario.foto_perfil
+    with imagen_subida(archivo, "usuarios", db) as url:
+        db_usuario.foto_perfil = url
+        db.commit()
+    invalidar("usuarios")
+    eliminar_imagen(foto_anterior)
+    return _cargar_usuario(db, db_usuario.id_usuario)
 
 @router.delete("/usuarios/{usuario_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_usuario(usuario_id: int, db: Session = Depends(get_db)):
@@ -77,6 +303,22 @@ def delete_usuario(usuario_id: int, db: Session = Depends(get_db)):
             detail="Usuario no encontrado"
         )
     
-    db.delete(db_usuario)
-    db.commit()
-    return None 
\ No newline at end of file
+    verificar_dependientes(db, DEPENDIENTES_USUARIO, usuario_id, MENSAJE_DEPENDIENTES)
+    with traducir_errores_dependientes(db, MENSAJE_DEPENDIENTES):
+        db.delete(db_usuario)
+        db.commit()
+    invalidar("usuarios")
+    eliminar_imagen(db_usuario.foto_perfil)
+    return None
+
+@router.post("/usuarios/eliminar", response_model=List[schemas.ResultadoEliminacion])
+def delete_usuarios(lote: schemas.EliminacionLote, db: Session = Depends(get_db)):
+    """Eliminación por lotes para limpiezas administrativas; devuelve el resultado de cada id."""
+    resultados, eliminados = eliminar_lote(
+        db, models.Usuario.id_usuario, lote.ids, DEPENDIENTES_USUARIO, "Usuario no encontrado", MENSAJE_DEPENDIENTES
+    )
+    if eliminados:
+        invalidar("usuarios")
+    for usuario in eliminados:
+        eliminar_imagen(usuario.foto_perfil)
+    return resultados
@@ -1,38 +1,16 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, computed_field
+from typing import Any, Dict, Optional, List
 from datetime import datetime, date
-from enum import Enum
-
-# Enums
-class UsuarioEstado(str, Enum):
-    activo = "activo"
-    inactivo = "inactivo"
-    pendiente = "pendiente"
-
-class LineaInvestigacionEstado(str, Enum):
-    activa = "activa"
-    inactiva = "inactiva"
-
-class PublicacionEstado(str, Enum):
-    pendiente = "pendiente"
-    aprobada = "aprobada"
-    rechazada = "rechazada"
-
-class ProductoEstadoDesarrollo(str, Enum):
-    idea = "idea"
-    desarrollo = "desarrollo"
-    pruebas = "pruebas"
-    completado = "completado"
-
-class ProductoEstado(str, Enum):
-    pendiente = "pendiente"
-    aprobado = "aprobado"
-    rechazado = "rechazado"
-
-class SemilleroEstado(str, Enum):
-    activo = "activo"
-    inactivo = "inactivo"
-    en_proceso = "en_proceso"
+from app.core import config
+from app.core.variantes import variantes_imagen
+from app.models.enums import (
+    UsuarioEstado,
+    LineaInvestigacionEstado,
+    PublicacionEstado,
+    ProductoEstadoDesarrollo,
+    ProductoEstado,
+    SemilleroEstado
+)
 
 # Base Schemas
 class RolBase(BaseModel):
@@ -123,14 +101,68 @@ class ProductoCreate(ProductoBase):
 class SemilleroCreate(SemilleroBase):
     pass
 
+# Update Schemas (PATCH): solo se aplican los campos enviados (exclude_unset).
+# Los campos obligatorios se declaran `tipo = None` en lugar de Optional para rechazar un null explícito.
+class UsuarioUpdate(BaseModel):
+    nombre: str = None
+    apellido: str = None
+    email: EmailStr = None
+    password: str = None
+    telefono: Optional[str] = None
+    institucion: Optional[str] = None
+    especialidad: Optional[str] = None
+    foto_perfil: Optional[str] = None
+    id_rol: int = None
+    estado: UsuarioEstado = None
+
+class LineaInvestigacionUpdate(BaseModel):
+    nombre: str = None
+    descripcion: Optional[str] = None
+    imagen_logo: Optional[str] = None
+    id_responsable: Optional[int] = None
+
+class PublicacionUpdate(BaseModel):
+    titulo: str = None
+    resumen: Optional[str] = None
+    autores: str = None
+    revista_conferencia: Optional[str] = None
+    fecha_publicacion: Optional[date] = None
+    enlace: Optional[str] = None
+    id_linea: Optional[int] = None
+    id_autor_principal: int = None
+
+class ProductoUpdate(BaseModel):
+    nombre: str = None
+    descripcion: Optional[str] = None
+    id_tipologia: int = None
+    id_linea: Optional[int] = None
+    fecha_creacion: Optional[date] = None
+    enlace: Optional[str] = None
+    repositorio: Optional[str] = None
+    imagen_referencia: Optional[str] = None
+    id_responsable: int = None
+    estado_desarrollo: ProductoEstadoDesarrollo = None
+
+# Variantes de una imagen subida: miniatura y srcset por formato (avif, webp)
+class ImagenVariantes(BaseModel):
+    original: str
+    miniatura: str
+    srcset: Dict[str, str]
+
+def _variantes(url: Optional[str]) -> Optional[ImagenVariantes]:
+    variantes = variantes_imagen(url)
+    return ImagenVariantes(**variantes) if variantes else None
+
 # Response Schemas
 class Rol(RolBase):
     id_rol: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Usuario(UsuarioBase):
+    # El email ya se validó al escribirlo; con EmailStr cada usuario serializado (también los
+    # anidados en publicaciones, productos y eventos) pasaría otra vez por email_validator
+    email: str
     id_usuario: int
     id_rol: int
     password: str
@@ -139,8 +171,12 @@ class Usuario(UsuarioBase):
     ultimo_acceso: Optional[datetime] = None
     rol: Rol
 
-    class Config:
-        from_attributes = True
+    @computed_field
+    @property
+    def foto_perfil_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.foto_perfil)
+
+    model_config = ConfigDict(from_attributes=True)
 
 class LineaInvestigacion(LineaInvestigacionBase):
     id_linea: int
@@ -148,8 +184,12 @@ class LineaInvestigacion(LineaInvestigacionBase):
     estado: LineaInvestigacionEstado
     responsable: Optional[Usuario] = None
 
-    class Config:
-        from_attributes = True
+    @computed_field
+    @property
+    def imagen_logo_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.imagen_logo)
+
+    model_config = ConfigDict(from_attributes=True)
 
 class Publicacion(PublicacionBase):
     id_publicacion: int
@@ -161,8 +201,7 @@ class Publicacion(PublicacionBase):
     autor_principal: Usuario
     linea: Optional[LineaInvestigacion] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Schema mejorado para respuestas GET de publicaciones
 class PublicacionResponse(PublicacionBase):
@@ -177,8 +216,7 @@ class PublicacionResponse(PublicacionBase):
     autor_principal: Usuario
     linea: Optional[LineaInvestigacion] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Evento(EventoBase):
     id_evento: int
@@ -186,14 +224,17 @@ class Evento(EventoBase):
     fecha_registro: datetime
     creador: Usuario
 
-    class Config:
-        from_attributes = True
+    @computed_field
+    @property
+    def foto_evento_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.foto_evento)
+
+    model_config = ConfigDict(from_attributes=True)
 
 class Tipologia(TipologiaBase):
     id_tipologia: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Producto(ProductoBase):
     id_producto: int
@@ -207,8 +248,12 @@ class Producto(ProductoBase):
     tipologia: Tipologia
     linea: Optional[LineaInvestigacion] = None
 
-    class Config:
-        from_attributes = True
+    @computed_field
+    @property
+    def imagen_referencia_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.imagen_referencia)
+
+    model_config = ConfigDict(from_attributes=True)
 
 # Schema mejorado para respuestas GET de productos
 class ProductoResponse(ProductoBase):
@@ -225,16 +270,19 @@ class ProductoResponse(ProductoBase):
     tipologia: Tipologia
     linea: Optional[LineaInvestigacion] = None
 
-    class Config:
-        from_attributes = True
+    @computed_field
+    @property
+    def imagen_referencia_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.imagen_referencia)
+
+    model_config = ConfigDict(from_attributes=True)
 
 class Semillero(SemilleroBase):
     id_semillero: int
     estado: SemilleroEstado
     linea: Optional[LineaInvestigacion] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Carrusel Schemas
 class CarruselFotoBase(BaseModel):
@@ -248,8 +296,12 @@ class CarruselFoto(CarruselFotoBase):
     id: int
     fecha_creacion: datetime
 
-    class Config:
-        from_attributes = True
+    @computed_field
+    @property
+    def variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.url)
+
+    model_config = ConfigDict(from_attributes=True)
 
 class LoginResponse(BaseModel):
     success: bool
@@ -278,8 +330,7 @@ class PublicacionEstadoResponse(BaseModel):
     aprobador_apellido: Optional[str] = None
     mensaje: str
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Schema para actualizar estado de productos
 class ProductoEstadoUpdate(BaseModel):
@@ -296,5 +347,218 @@ class ProductoEstadoResponse(BaseModel):
     aprobador_apellido: Optional[str] = None
     mensaje: str
 
-    class Config:
-        from_attributes = True 
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# Schemas para la sincronización incremental (/sync)
+class PublicacionSync(PublicacionBase):
+    id_publicacion: int
+    id_autor_principal: int
+    estado: PublicacionEstado
+    fecha_registro: datetime
+    fecha_aprobacion: Optional[datetime] = None
+    id_aprobador: Optional[int] = None
+    version: int
+    fecha_actualizacion: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ProductoSync(ProductoBase):
+    id_producto: int
+    id_responsable: int
+    estado_desarrollo: ProductoEstadoDesarrollo
+    estado_aprobacion: ProductoEstado
+    fecha_registro: datetime
+    fecha_aprobacion: Optional[datetime] = None
+    id_aprobador: Optional[int] = None
+    version: int
+    fecha_actualizacion: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class EventoSync(EventoBase):
+    id_evento: int
+    fecha_registro: datetime
+    version: int
+    fecha_actualizacion: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class EliminacionSync(BaseModel):
+    entidad: str
+    id_registro: int
+    version: int
+    fecha_eliminacion: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class SyncResponse(BaseModel):
+    cursor: int
+    cursor_version: int
+    hay_mas: bool
+    publicaciones: List[PublicacionSync]
+    productos: List[ProductoSync]
+    eventos: List[EventoSync]
+    eliminados: List[EliminacionSync]
+
+# Estado de la cola de trabajos en segundo plano
+class TrabajosEstadisticas(BaseModel):
+    pendientes: int
+    disponibles: int
+    en_proceso: int
+    completados: int
+    fallidos: int
+    retraso_segundos: float
+    trabajadores: int
+
+# Contadores del limitador de peticiones
+class LimiteEstadisticas(BaseModel):
+    capacidad: int
+    tasa: float
+    permitidas: int
+    rechazadas: int
+
+class LimitadorEstadisticas(BaseModel):
+    backend: str
+    claves: Optional[int] = None
+    limites: Dict[str, LimiteEstadisticas]
+
+# Resultado de la búsqueda global (/buscar)
+class ResultadoBusqueda(BaseModel):
+    tipo: str
+    id: int
+    titulo: str
+    subtitulo: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+# Portafolio de una línea de investigación: la línea no se repite dentro de cada elemento
+class PortafolioPublicacion(PublicacionBase):
+    id_publicacion: int
+    id_autor_principal: int
+    estado: PublicacionEstado
+    fecha_registro: datetime
+    fecha_aprobacion: Optional[datetime] = None
+    autor_principal: Usuario
+
+    model_config = ConfigDict(from_attributes=True)
+
+class PortafolioProducto(ProductoBase):
+    id_producto: int
+    id_responsable: int
+    estado_desarrollo: ProductoEstadoDesarrollo
+    estado_aprobacion: ProductoEstado
+    fecha_registro: datetime
+    fecha_aprobacion: Optional[datetime] = None
+    responsable: Usuario
+    tipologia: Tipologia
+
+    @computed_field
+    @property
+    def imagen_referencia_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.imagen_referencia)
+
+    model_config = ConfigDict(from_attributes=True)
+
+class PortafolioConteos(BaseModel):
+    publicaciones: Dict[str, int]
+    productos: Dict[str, int]
+    productos_por_desarrollo: Dict[str, int]
+    investigadores: int
+
+class LineaPortafolio(BaseModel):
+    linea: LineaInvestigacion
+    publicaciones: List[PortafolioPublicacion]
+    productos: List[PortafolioProducto]
+    conteos: PortafolioConteos
+
+# Perfil de un investigador: sus elementos sin repetir el usuario dentro de cada uno
+class PerfilPublicacion(PublicacionBase):
+    id_publicacion: int
+    estado: PublicacionEstado
+    fecha_registro: datetime
+    fecha_aprobacion: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class PerfilProducto(ProductoBase):
+    id_producto: int
+    estado_desarrollo: ProductoEstadoDesarrollo
+    estado_aprobacion: ProductoEstado
+    fecha_registro: datetime
+    tipologia: Tipologia
+
+    @computed_field
+    @property
+    def imagen_referencia_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.imagen_referencia)
+
+    model_config = ConfigDict(from_attributes=True)
+
+class PerfilEvento(EventoBase):
+    id_evento: int
+    fecha_registro: datetime
+
+    @computed_field
+    @property
+    def foto_evento_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.foto_evento)
+
+    model_config = ConfigDict(from_attributes=True)
+
+class PerfilLinea(LineaInvestigacionBase):
+    id_linea: int
+    fecha_creacion: datetime
+    estado: LineaInvestigacionEstado
+
+    @computed_field
+    @property
+    def imagen_logo_variantes(self) -> Optional[ImagenVariantes]:
+        return _variantes(self.imagen_logo)
+
+    model_config = ConfigDict(from_attributes=True)
+
+# Conteos de una entidad; por_anio usa "sin_fecha" para los elementos sin fecha
+class PerfilResumen(BaseModel):
+    total: int
+    por_estado: Dict[str, int]
+    por_anio: Dict[str, Dict[str, int]]
+
+class UsuarioPerfil(BaseModel):
+    usuario: Usuario
+    publicaciones: List[PerfilPublicacion]
+    productos: List[PerfilProducto]
+    eventos: List[PerfilEvento]
+    lineas_investigacion: List[PerfilLinea]
+    resumen: Dict[str, PerfilResumen]
+
+# Eliminación por lotes: un resultado por id (eliminado, no_encontrado o con_dependientes)
+class EliminacionLote(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=config.ELIMINACION_LOTE_MAX)
+
+class ResultadoEliminacion(BaseModel):
+    id: int
+    estado: str
+    detalle: Optional[str] = None
+
+# Capturas de /debug/slow-queries; los parámetros se devuelven tal como llegaron al driver
+class ConsultaCapturada(BaseModel):
+    sql: str
+    parametros: Any = None
+    duracion_ms: float
+    plan: Optional[List[str]] = None
+    error: Optional[str] = None
+
+class CapturaDepuracion(BaseModel):
+    id: int
+    pid: int
+    metodo: str
+    ruta: str
+    fecha: datetime
+    muestreada: bool
+    resultado: Optional[str] = None
+    duracion_ms: float
+    duracion_sql_ms: float
+    consultas: List[ConsultaCapturada]
+
+class MuestreoDepuracion(BaseModel):
+    fraccion: float = Field(..., ge=0, le=1)
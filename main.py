@@ -1,12 +1,22 @@
 from fastapi import FastAPI
+from sqlalchemy.exc import OperationalError
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import roles, usuarios, lineas_investigacion, publicaciones, eventos, tipologias, productos, auth, carrusel
-from app.database.database import init_db, engine
-from app.models import models
+from app.routes import roles, usuarios, lineas_investigacion, publicaciones, eventos, tipologias, productos, auth, carrusel, eventos_cambios, sync
+from app.database.database import init_db
+from app.core import config
+from app.core.cambios import escucha_cambios
+from app.core.compresion import CompresionMiddleware
+from app.core.escritura_reciente import EscrituraRecienteMiddleware
+from app.core.limitador import LIMITE_ESCRITURA, LimitadorEscriturasMiddleware
+from app.core.limites import LimiteRuta, LimitesMiddleware, consulta_cancelada_handler
+from app.core.orden import CABECERA_CURSOR
+from app.core.routers_perezosos import cargar_perezosos, incluir_perezoso
+from app.core.trabajos import cola_trabajos
+from app.core.ultimo_acceso import registro_ultimo_acceso
 
-# Crear las tablas y datos por defecto
-models.Base.metadata.create_all(bind=engine)
-init_db()
+# Crear las tablas, aplicar migraciones y datos por defecto (solo con DB_INICIALIZAR=true)
+if config.DB_INICIALIZAR:
+    init_db()
 
 app = FastAPI(
     title="GIIT API",
@@ -14,6 +24,38 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Captura de SQL y planes para /debug/slow-queries (solo con DEPURACION_TOKEN). Es el
+# middleware más interno: la duración no incluye la espera en los límites de concurrencia
+if config.DEPURACION_TOKEN:
+    from app.core.depuracion import DepuracionMiddleware, registro_lentas
+    app.add_middleware(DepuracionMiddleware, registro=registro_lentas)
+
+# Límites por ruta: concurrencia máxima por proceso y plazo (segundos) de cada petición.
+# Se aplica la primera regla que coincide; el plazo llega a PostgreSQL como statement_timeout.
+LIMITES_RUTAS = [
+    # Streams SSE y archivos: la conexión dura lo que el cliente necesite
+    LimiteRuta("/eventos-cambios"),
+    LimiteRuta(config.IMAGENES_RUTA_LOCAL),
+    # Lecturas pesadas: pocas a la vez para no agotar el pool de conexiones
+    LimiteRuta("/sync", metodos=("GET",), concurrencia=4, plazo=10),
+    LimiteRuta("/publicaciones/", metodos=("GET",), concurrencia=16, plazo=5),
+    LimiteRuta("/productos/", metodos=("GET",), concurrencia=16, plazo=5),
+    LimiteRuta("/eventos/", metodos=("GET",), concurrencia=16, plazo=5),
+    LimiteRuta("/lineas-investigacion/", metodos=("GET",), concurrencia=16, plazo=5),
+    # Autocompletado: una consulta por tecla, debe responder rápido o no responder
+    LimiteRuta("/buscar", metodos=("GET",), concurrencia=32, plazo=2),
+    # Subidas de imágenes: el cuerpo puede tardar en llegar
+    LimiteRuta("/carrusel/imagen", metodos=("POST",), concurrencia=4, plazo=60),
+    LimiteRuta("/", metodos=("PUT",), concurrencia=4, plazo=60, sufijos=("/foto-perfil", "/foto", "/imagen", "/logo")),
+    # Resto de rutas
+    LimiteRuta("/", concurrencia=config.LIMITES_CONCURRENCIA, plazo=config.LIMITES_PLAZO),
+]
+app.add_middleware(LimitesMiddleware, reglas=LIMITES_RUTAS, retry_after=config.LIMITES_RETRY_AFTER)
+app.add_exception_handler(OperationalError, consulta_cancelada_handler)
+
+# Token bucket por IP para las escrituras; /login queda fuera porque tiene sus propios límites por IP y email
+app.add_middleware(LimitadorEscriturasMiddleware, limite=LIMITE_ESCRITURA, excluidas=("/login",))
+
 # Configuración de CORS
 app.add_middleware(
     CORSMiddleware,
@@ -21,8 +63,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permite todos los métodos HTTP
     allow_headers=["*"],  # Permite todos los headers
+    expose_headers=[CABECERA_CURSOR],
 )
 
+# Compresión de respuestas grandes (br/zstd/gzip)
+app.add_middleware(
+    CompresionMiddleware,
+    minimo_bytes=config.COMPRESION_MINIMO_BYTES,
+    tipos=config.COMPRESION_TIPOS,
+    algoritmos=config.COMPRESION_ALGORITMOS,
+    nivel_gzip=config.COMPRESION_NIVEL_GZIP,
+    nivel_brotli=config.COMPRESION_NIVEL_BROTLI,
+    nivel_zstd=config.COMPRESION_NIVEL_ZSTD
+)
+
+# Read-your-writes: tras una escritura, el cliente lee de la primaria por unos segundos
+if config.DB_REPLICA_URLS:
+    app.add_middleware(EscrituraRecienteMiddleware, ventana=config.DB_REPLICA_VENTANA_ESCRITURA)
+
+@app.on_event("startup")
+def iniciar_tareas_fondo():
+    registro_ultimo_acceso.iniciar()
+    # Sin canales suscritos (CAMBIOS_NOTIFY y CACHE_NOTIFY desactivados) no arranca
+    escucha_cambios.iniciar()
+    if config.TRABAJOS_ACTIVOS:
+        cola_trabajos.iniciar()
+    if config.DEPURACION_TOKEN:
+        registro_lentas.iniciar()
+
+@app.on_event("shutdown")
+def detener_tareas_fondo():
+    registro_ultimo_acceso.detener()
+    escucha_cambios.detener()
+    cola_trabajos.detener()
+    if config.DEPURACION_TOKEN:
+        registro_lentas.detener()
+
 # Incluir routers con tags
 app.include_router(auth.router, tags=["Autenticación"])
 app.include_router(roles.router, tags=["Roles"])
@@ -33,6 +109,35 @@ app.include_router(eventos.router, tags=["Eventos"])
 app.include_router(tipologias.router, tags=["Tipologías"])
 app.include_router(productos.router, tags=["Productos"])
 app.include_router(carrusel.router, tags=["Carrusel"])
+app.include_router(eventos_cambios.router, tags=["Eventos de cambios"])
+app.include_router(sync.router, tags=["Sincronización"])
+
+# Routers opcionales: solo existen si su función está activada, y su módulo se importa
+# en la primera petición a su prefijo (o al generar el esquema OpenAPI), no al arrancar
+if config.TRABAJOS_ESTADISTICAS:
+    incluir_perezoso(app, "/trabajos", "app.routes.trabajos", tags=["Trabajos"])
+
+if config.LIMITADOR_BACKEND != "ninguno":
+    incluir_perezoso(app, "/limitador", "app.routes.limitador", tags=["Limitador"])
+
+if config.BUSQUEDA_ACTIVA:
+    incluir_perezoso(app, "/buscar", "app.routes.busqueda", tags=["Búsqueda"])
+
+# Sin DEPURACION_TOKEN las rutas /debug no existen
+if config.DEPURACION_TOKEN:
+    incluir_perezoso(app, "/debug", "app.routes.depuracion", tags=["Depuración"], include_in_schema=False)
+
+# Con el almacén local, la API sirve también los archivos de imagen
+if config.IMAGENES_ALMACEN == "local":
+    incluir_perezoso(app, config.IMAGENES_RUTA_LOCAL, "app.routes.media", tags=["Archivos"], include_in_schema=False)
+
+_generar_openapi = app.openapi
+
+def openapi():
+    cargar_perezosos(app)
+    return _generar_openapi()
+
+app.openapi = openapi
 
 @app.get("/", tags=["General"])
 async def root():
@@ -0,0 +1,18 @@
+import os
+import pytest
+
+# Las pruebas que necesitan una base de datos real piden la fixture base_de_datos
+BASE_DE_DATOS = bool(os.environ.get("DB_HOST"))
+
+# app.database.database crea el engine al importarse, sin conectarse: las pruebas
+# unitarias usan estos valores cuando no hay una base de datos configurada
+for variable, valor in (
+    ("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("DB_NAME", "giit"), ("DB_USER", "giit"), ("DB_PASSWORD", "")
+):
+    os.environ.setdefault(variable, valor)
+
+
+@pytest.fixture(scope="session")
+def base_de_datos():
+    if not BASE_DE_DATOS:
+        pytest.skip("Se necesita una base de datos (DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD)")
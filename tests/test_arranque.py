@@ -0,0 +1,37 @@
+import os
+import pytest
+from app.core.perfil_arranque import medir
+
+# Milisegundos máximos desde importar main hasta responder la primera petición con datos
+PRESUPUESTO_MS = float(os.environ.get("ARRANQUE_PRESUPUESTO_MS", "1500"))
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def arranque(base_de_datos):
+    tiempos, lineas = medir(RAIZ)
+    return tiempos, lineas
+
+
+def test_primera_peticion_con_base_de_datos_responde(arranque):
+    tiempos, _ = arranque
+    assert tiempos["estado"] == 200
+
+
+def test_arranque_dentro_del_presupuesto(arranque):
+    tiempos, _ = arranque
+    total_ms = (tiempos["importacion"] + tiempos["primera_peticion"]) * 1000
+    assert total_ms <= PRESUPUESTO_MS, (
+        f"importación {tiempos['importacion'] * 1000:.1f} ms + primera petición "
+        f"{tiempos['primera_peticion'] * 1000:.1f} ms superan {PRESUPUESTO_MS:.0f} ms"
+    )
+
+
+def test_sin_inicializar_no_se_importan_los_modulos_opcionales(arranque):
+    _, lineas = arranque
+    importados = {linea.rsplit("|", 1)[-1].strip() for linea in lineas if linea.startswith("import time:")}
+    assert "app.database.migraciones" not in importados
+    # Los routers opcionales se importan en su primera petición, aunque estén activados
+    for modulo in ("busqueda", "trabajos", "limitador", "depuracion", "media"):
+        assert f"app.routes.{modulo}" not in importados
@@ -0,0 +1,78 @@
+import time
+from app.core.cache import CacheMemoria, CacheRespuestas
+
+
+def test_lru_acotada_por_entradas():
+    cache = CacheMemoria(max_entradas=2, max_bytes=1024)
+    cache.guardar("a", b"1", ttl=60)
+    cache.guardar("b", b"2", ttl=60)
+    # Leer "a" la hace la más reciente: la siguiente en salir es "b"
+    assert cache.obtener("a") == b"1"
+    cache.guardar("c", b"3", ttl=60)
+    assert cache.obtener("b") is None
+    assert cache.obtener("a") == b"1"
+    assert cache.obtener("c") == b"3"
+
+
+def test_lru_acotada_por_bytes():
+    cache = CacheMemoria(max_entradas=10, max_bytes=10)
+    cache.guardar("a", b"x" * 4, ttl=60)
+    cache.guardar("b", b"x" * 4, ttl=60)
+    cache.guardar("c", b"x" * 4, ttl=60)
+    assert cache.obtener("a") is None
+    assert cache.obtener("b") is not None
+    assert cache.obtener("c") is not None
+
+    # Una entrada mayor que el máximo no se guarda ni desaloja a las demás
+    cache.guardar("d", b"x" * 11, ttl=60)
+    assert cache.obtener("d") is None
+    assert cache.obtener("b") is not None
+
+
+def test_reemplazar_una_entrada_no_duplica_sus_bytes():
+    cache = CacheMemoria(max_entradas=10, max_bytes=10)
+    for _ in range(5):
+        cache.guardar("a", b"x" * 4, ttl=60)
+    cache.guardar("b", b"x" * 4, ttl=60)
+    assert cache.obtener("a") is not None
+    assert cache.obtener("b") is not None
+
+
+def test_las_entradas_expiran():
+    cache = CacheMemoria(max_entradas=10, max_bytes=1024)
+    cache.guardar("a", b"1", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.obtener("a") is None
+
+
+def test_invalidar_una_etiqueta_cambia_la_clave():
+    cache = CacheRespuestas(CacheMemoria(max_entradas=10, max_bytes=1024), ttl=60)
+    clave = cache.clave("lectura:/publicaciones/?", ("publicaciones", "usuarios"))
+    cache.guardar(clave, b"[]")
+    assert cache.obtener(clave) == b"[]"
+
+    cache.invalidar("eventos")
+    assert cache.clave("lectura:/publicaciones/?", ("publicaciones", "usuarios")) == clave
+
+    cache.invalidar("usuarios")
+    nueva = cache.clave("lectura:/publicaciones/?", ("publicaciones", "usuarios"))
+    assert nueva != clave
+    assert cache.obtener(nueva) is None
+
+
+def test_vaciar_conserva_las_versiones():
+    backend = CacheMemoria(max_entradas=10, max_bytes=1024)
+    backend.incrementar("usuarios")
+    backend.guardar("a", b"1", ttl=60)
+    backend.vaciar()
+    assert backend.obtener("a") is None
+    assert backend.versiones(["usuarios", "roles"]) == [1, 0]
+
+
+def test_sin_backend_no_cachea():
+    cache = CacheRespuestas(None, ttl=60)
+    clave = cache.clave("lectura:/eventos/?", ("eventos",))
+    assert clave is None
+    cache.guardar(clave, b"[]")
+    assert cache.obtener(clave) is None
+    cache.invalidar("eventos")
@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi import HTTPException
+from app.core.coalescencia import GrupoCoalescencia
+
+CLAVE = "lectura:/publicaciones/?limit=10"
+
+
+class Consulta:
+    """Función de prueba: cuenta sus ejecuciones y no termina hasta que se libera."""
+
+    def __init__(self, resultado=b"[]", error=None):
+        self.resultado = resultado
+        self.error = error
+        self.ejecuciones = 0
+        self.iniciada = threading.Event()
+        self.liberar = threading.Event()
+
+    def __call__(self):
+        self.ejecuciones += 1
+        self.iniciada.set()
+        self.liberar.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.resultado
+
+
+def _concurrentes(grupo, consulta, seguidoras: int, plazo: float = None) -> list:
+    """Lanza una llamada líder y `seguidoras` con la misma clave; devuelve sus resultados o excepciones."""
+    def llamar():
+        try:
+            return grupo.ejecutar(CLAVE, consulta, plazo)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(seguidoras + 1) as hilos:
+        lider = hilos.submit(llamar)
+        assert consulta.iniciada.wait(5)
+        resto = [hilos.submit(llamar) for _ in range(seguidoras)]
+        # Dar tiempo a que las seguidoras lleguen a esperar a la líder
+        time.sleep(0.05)
+        consulta.liberar.set()
+        return [lider.result()] + [futuro.result() for futuro in resto]
+
+
+def test_llamadas_concurrentes_comparten_una_ejecucion():
+    consulta = Consulta(resultado=b'[{"id": 1}]')
+    resultados = _concurrentes(GrupoCoalescencia(), consulta, seguidoras=4)
+    assert consulta.ejecuciones == 1
+    assert all(resultado is consulta.resultado for resultado in resultados)
+
+
+def test_el_error_de_la_lider_llega_a_las_seguidoras():
+    error = ValueError("fallo")
+    consulta = Consulta(error=error)
+    grupo = GrupoCoalescencia(ttl=60)
+    resultados = _concurrentes(grupo, consulta, seguidoras=2)
+    assert consulta.ejecuciones == 1
+    assert all(resultado is error for resultado in resultados)
+
+    # Los errores no se reutilizan: la siguiente llamada vuelve a ejecutar
+    assert grupo.ejecutar(CLAVE, lambda: b"[]") == b"[]"
+
+
+def test_sin_ttl_no_se_reutiliza_el_resultado():
+    grupo = GrupoCoalescencia()
+    llamadas = []
+    for _ in range(2):
+        grupo.ejecutar(CLAVE, lambda: llamadas.append(1))
+    assert len(llamadas) == 2
+
+
+def test_con_ttl_se_reutiliza_hasta_que_expira():
+    grupo = GrupoCoalescencia(ttl=0.05)
+    assert grupo.ejecutar(CLAVE, lambda: b"1") == b"1"
+    assert grupo.ejecutar(CLAVE, lambda: b"2") == b"1"
+    time.sleep(0.06)
+    assert grupo.ejecutar(CLAVE, lambda: b"3") == b"3"
+
+
+def test_olvidar_descarta_los_resultados_de_la_ruta():
+    grupo = GrupoCoalescencia(ttl=60)
+    grupo.ejecutar(CLAVE, lambda: b"1")
+    grupo.ejecutar("lectura:/eventos/?", lambda: b"1")
+    grupo.olvidar("/publicaciones/")
+    assert grupo.ejecutar(CLAVE, lambda: b"2") == b"2"
+    assert grupo.ejecutar("lectura:/eventos/?", lambda: b"2") == b"1"
+
+
+def test_la_seguidora_responde_504_al_vencer_su_plazo():
+    consulta = Consulta()
+    resultados = _concurrentes(GrupoCoalescencia(), consulta, seguidoras=1, plazo=time.monotonic() + 0.01)
+    lider, seguidora = resultados
+    assert lider == consulta.resultado
+    assert isinstance(seguidora, HTTPException)
+    assert seguidora.status_code == 504
+    assert "Retry-After" in seguidora.headers
+
+
+def test_sin_plazo_la_espera_se_acota_con_espera_max():
+    consulta = Consulta()
+    resultados = _concurrentes(GrupoCoalescencia(espera_max=0.01), consulta, seguidoras=1)
+    assert isinstance(resultados[1], HTTPException)
+    assert resultados[1].status_code == 504
+
+
+@pytest.mark.parametrize("ttl", [0, 60])
+def test_la_clave_queda_libre_tras_un_error(ttl):
+    def fallar():
+        raise RuntimeError()
+
+    grupo = GrupoCoalescencia(ttl=ttl)
+    with pytest.raises(RuntimeError):
+        grupo.ejecutar(CLAVE, fallar)
+    assert grupo.ejecutar(CLAVE, lambda: b"ok") == b"ok"
@@ -0,0 +1,114 @@
+import asyncio
+import gzip
+from starlette.requests import Request
+from app.core.compresion import CompresionMiddleware
+from app.core.validadores import etag_codificado, no_modificado
+
+CUERPO = b'{"datos": "' + b"x" * 4096 + b'"}'
+
+
+def _app(bloques, estado=200, etag=None):
+    async def app(scope, receive, send):
+        cabeceras = [(b"content-type", b"application/json")]
+        if etag is not None:
+            cabeceras.append((b"etag", etag.encode()))
+        await send({"type": "http.response.start", "status": estado, "headers": cabeceras})
+        for i, bloque in enumerate(bloques):
+            await send({"type": "http.response.body", "body": bloque, "more_body": i < len(bloques) - 1})
+    return app
+
+
+def _scope(cabeceras: dict) -> dict:
+    return {
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(nombre.lower().encode(), valor.encode()) for nombre, valor in cabeceras.items()]
+    }
+
+
+def _peticion(app, cabeceras: dict):
+    """Ejecuta el middleware sobre `app` y devuelve (estado, cabeceras, cuerpo) de la respuesta."""
+    mensajes = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        mensajes.append(mensaje)
+
+    asyncio.run(CompresionMiddleware(app, minimo_bytes=1024)(_scope(cabeceras), receive, send))
+    inicio = mensajes[0]
+    cabeceras_respuesta = {nombre.decode(): valor.decode() for nombre, valor in inicio["headers"]}
+    cuerpo = b"".join(mensaje.get("body", b"") for mensaje in mensajes[1:])
+    return inicio["status"], cabeceras_respuesta, cuerpo
+
+
+def test_elegir_codificacion():
+    middleware = CompresionMiddleware(None, algoritmos=["gzip"])
+    assert middleware.elegir_codificacion("gzip, deflate") == "gzip"
+    assert middleware.elegir_codificacion("GZIP;q=0.5") == "gzip"
+    assert middleware.elegir_codificacion("*") == "gzip"
+    assert middleware.elegir_codificacion("gzip;q=0") is None
+    assert middleware.elegir_codificacion("*, gzip;q=0") is None
+    assert middleware.elegir_codificacion("gzip;q=abc") is None
+    assert middleware.elegir_codificacion("deflate") is None
+    assert middleware.elegir_codificacion("") is None
+
+
+def test_comprime_respuesta_grande_con_su_propio_etag():
+    estado, cabeceras, cuerpo = _peticion(_app([CUERPO], etag='"3-7"'), {"Accept-Encoding": "gzip"})
+    assert estado == 200
+    assert cabeceras["content-encoding"] == "gzip"
+    assert cabeceras["etag"] == '"3-7-gzip"'
+    assert "Accept-Encoding" in cabeceras["vary"]
+    assert int(cabeceras["content-length"]) == len(cuerpo)
+    assert gzip.decompress(cuerpo) == CUERPO
+
+
+def test_no_comprime_respuesta_pequena():
+    estado, cabeceras, cuerpo = _peticion(_app([b'{"ok": true}'], etag='"3"'), {"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in cabeceras
+    assert cabeceras["etag"] == '"3"'
+    assert cuerpo == b'{"ok": true}'
+
+
+def test_sin_accept_encoding_no_comprime():
+    _, cabeceras, cuerpo = _peticion(_app([CUERPO], etag='"3"'), {})
+    assert "content-encoding" not in cabeceras
+    assert cabeceras["etag"] == '"3"'
+    assert cuerpo == CUERPO
+
+
+def test_comprime_respuesta_por_bloques():
+    bloques = [CUERPO[:1000], CUERPO[1000:3000], CUERPO[3000:]]
+    _, cabeceras, cuerpo = _peticion(_app(bloques), {"Accept-Encoding": "gzip"})
+    assert cabeceras["content-encoding"] == "gzip"
+    assert "content-length" not in cabeceras
+    assert gzip.decompress(cuerpo) == CUERPO
+
+
+def test_304_repite_el_etag_codificado_que_envio_el_cliente():
+    cabeceras_peticion = {"Accept-Encoding": "gzip", "If-None-Match": '"3-gzip"'}
+    estado, cabeceras, _ = _peticion(_app([b""], estado=304, etag='"3"'), cabeceras_peticion)
+    assert estado == 304
+    assert cabeceras["etag"] == '"3-gzip"'
+
+    cabeceras_peticion["If-None-Match"] = '"3"'
+    _, cabeceras, _ = _peticion(_app([b""], estado=304, etag='"3"'), cabeceras_peticion)
+    assert cabeceras["etag"] == '"3"'
+
+
+def test_etag_codificado():
+    assert etag_codificado('"3-7"', "br") == '"3-7-br"'
+    assert etag_codificado('W/"3"', "gzip") == 'W/"3-gzip"'
+
+
+def test_no_modificado_acepta_el_etag_de_cualquier_codificacion():
+    def peticion(if_none_match):
+        return Request(_scope({"If-None-Match": if_none_match}))
+
+    assert no_modificado(peticion('"3-7"'), '"3-7"')
+    assert no_modificado(peticion('"3-7-gzip"'), '"3-7"')
+    assert no_modificado(peticion('"1", W/"3-7-br"'), '"3-7"')
+    assert no_modificado(peticion("*"), '"3-7"')
+    assert not no_modificado(peticion('"3-8-gzip"'), '"3-7"')
+    assert not no_modificado(peticion('"3-7-deflate"'), '"3-7"')
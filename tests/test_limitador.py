@@ -0,0 +1,89 @@
+import pytest
+from app.core import limitador as modulo_limitador
+from app.core.limitador import CubosMemoria, Limitador
+
+
+class Reloj:
+    """Sustituye a time.monotonic en app.core.limitador para avanzar el tiempo a mano."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self) -> float:
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(modulo_limitador, "time", reloj)
+    return reloj
+
+
+def test_admite_la_rafaga_y_despues_rechaza(reloj):
+    cubos = CubosMemoria(max_claves=100)
+    for _ in range(5):
+        assert cubos.consumir("ip:1", capacidad=5, tasa=1) == 0
+    assert cubos.consumir("ip:1", capacidad=5, tasa=1) == pytest.approx(1)
+    # Las claves no comparten cubo
+    assert cubos.consumir("ip:2", capacidad=5, tasa=1) == 0
+
+
+def test_repone_tokens_segun_la_tasa(reloj):
+    cubos = CubosMemoria(max_claves=100)
+    for _ in range(2):
+        cubos.consumir("ip:1", capacidad=2, tasa=0.5)
+    assert cubos.consumir("ip:1", capacidad=2, tasa=0.5) == pytest.approx(2)
+
+    reloj.ahora += 1
+    assert cubos.consumir("ip:1", capacidad=2, tasa=0.5) == pytest.approx(1)
+    reloj.ahora += 1
+    assert cubos.consumir("ip:1", capacidad=2, tasa=0.5) == 0
+
+    # Tras mucho tiempo el cubo no pasa de su capacidad
+    reloj.ahora += 3600
+    for _ in range(2):
+        assert cubos.consumir("ip:1", capacidad=2, tasa=0.5) == 0
+    assert cubos.consumir("ip:1", capacidad=2, tasa=0.5) > 0
+
+
+def test_la_purga_descarta_primero_los_cubos_llenos(reloj):
+    cubos = CubosMemoria(max_claves=10)
+    # Un cubo agotado que se rellena en 100 s
+    for _ in range(3):
+        cubos.consumir("agotada", capacidad=2, tasa=0.02)
+    for i in range(8):
+        cubos.consumir(f"ip:{i}", capacidad=1, tasa=1)
+    reloj.ahora += 10
+    cubos.consumir("ip:nueva", capacidad=1, tasa=1)
+    cubos.consumir("ip:otra", capacidad=1, tasa=1)
+
+    # Los cubos de capacidad 1 ya se habían llenado: la purga los quita y conserva el agotado
+    assert cubos.claves() == 3
+    assert cubos.consumir("agotada", capacidad=2, tasa=0.02) > 0
+
+
+def test_la_purga_acota_las_claves_activas(reloj):
+    cubos = CubosMemoria(max_claves=10)
+    for i in range(50):
+        cubos.consumir(f"ip:{i}", capacidad=5, tasa=0.01)
+    assert cubos.claves() <= 10
+    # Se conservan las usadas más recientemente
+    assert cubos.consumir("ip:49", capacidad=5, tasa=0.01) == 0
+    assert cubos.claves() <= 10
+
+
+def test_limitador_cuenta_permitidas_y_rechazadas(reloj):
+    limitador = Limitador(CubosMemoria(max_claves=100))
+    limite = limitador.limite("login_ip", capacidad=1, tasa=1)
+    assert limitador.consumir(limite, "1.2.3.4") == 0
+    assert limitador.consumir(limite, "1.2.3.4") > 0
+    estadisticas = limitador.estadisticas()["limites"]["login_ip"]
+    assert (estadisticas["permitidas"], estadisticas["rechazadas"]) == (1, 1)
+
+
+def test_limitador_sin_backend_no_limita():
+    limitador = Limitador(None)
+    limite = limitador.limite("escritura", capacidad=1, tasa=1)
+    for _ in range(3):
+        assert limitador.consumir(limite, "1.2.3.4") == 0
@@ -0,0 +1,82 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from app.core.orden import CABECERA_CURSOR, Ordenamiento
+from app.models import models
+
+ORDEN = Ordenamiento(
+    models.Evento.id_evento,
+    [models.Evento.fecha_inicio, models.Evento.fecha_registro, models.Evento.nombre]
+)
+
+
+def _evento(id_evento, fecha_inicio=None, fecha_registro=None, nombre="Congreso"):
+    return SimpleNamespace(id_evento=id_evento, fecha_inicio=fecha_inicio, fecha_registro=fecha_registro, nombre=nombre)
+
+
+def _sql(consulta) -> str:
+    return str(consulta.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.parametrize("sort, ultima, valores", [
+    (None, _evento(7), [7]),
+    ("nombre", _evento(7, nombre="Á, \"b\""), ["Á, \"b\"", 7]),
+    ("-fecha_inicio", _evento(7, fecha_inicio=date(2024, 5, 1)), [date(2024, 5, 1), 7]),
+    ("fecha_registro", _evento(7, fecha_registro=datetime(2024, 5, 1, 10, 30, 15, 250)), [datetime(2024, 5, 1, 10, 30, 15, 250), 7]),
+])
+def test_el_cursor_se_decodifica_con_los_valores_de_la_ultima_fila(sort, ultima, valores):
+    cursor = ORDEN.siguiente_cursor([_evento(1), ultima], limit=2, sort=sort)
+    # Base64 para URL sin relleno: se puede pasar tal cual en ?cursor=
+    assert cursor.isascii() and "=" not in cursor and "+" not in cursor and "/" not in cursor
+    campo, _ = ORDEN._campo(sort)
+    assert ORDEN._decodificar(cursor, sort, campo) == valores
+
+
+def test_fecha_nula_se_ordena_como_la_mas_antigua():
+    cursor = ORDEN.siguiente_cursor([_evento(3)], limit=1, sort="fecha_inicio")
+    campo, _ = ORDEN._campo("fecha_inicio")
+    fecha, id_evento = ORDEN._decodificar(cursor, "fecha_inicio", campo)
+    assert "-infinity" in str(fecha)
+    assert id_evento == 3
+
+
+def test_sin_pagina_completa_no_hay_cursor():
+    assert ORDEN.siguiente_cursor([], limit=10) is None
+    assert ORDEN.siguiente_cursor([_evento(1)], limit=10) is None
+    assert ORDEN.cabeceras([_evento(1)], limit=10) == {}
+    assert CABECERA_CURSOR in ORDEN.cabeceras([_evento(1)], limit=1)
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", "bm9qc29u", "eyJzb3J0IjpudWxsfQ", "eyJzb3J0IjpudWxsLCJ2YWxvcmVzIjpbIngiXX0"])
+def test_cursor_corrupto_es_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        ORDEN.aplicar(select(models.Evento), cursor=cursor)
+    assert error.value.status_code == 400
+
+
+def test_cursor_de_otro_orden_es_400():
+    cursor = ORDEN.siguiente_cursor([_evento(5, nombre="b")], limit=1, sort="nombre")
+    with pytest.raises(HTTPException) as error:
+        ORDEN.aplicar(select(models.Evento), sort="-nombre", cursor=cursor)
+    assert error.value.status_code == 400
+
+
+def test_orden_no_permitido_es_400():
+    with pytest.raises(HTTPException) as error:
+        ORDEN.aplicar(select(models.Evento), sort="descripcion")
+    assert error.value.status_code == 400
+
+
+def test_aplicar_continua_tras_el_cursor_en_el_sentido_del_orden():
+    cursor = ORDEN.siguiente_cursor([_evento(5, nombre="b")], limit=1, sort="-nombre")
+    sql = _sql(ORDEN.aplicar(select(models.Evento), sort="-nombre", cursor=cursor))
+    assert '("Eventos".nombre, "Eventos".id_evento) < (\'b\', 5)' in sql
+    assert 'ORDER BY "Eventos".nombre DESC, "Eventos".id_evento DESC' in sql
+
+    cursor = ORDEN.siguiente_cursor([_evento(5)], limit=1)
+    sql = _sql(ORDEN.aplicar(select(models.Evento), cursor=cursor))
+    assert '("Eventos".id_evento) > (5)' in sql
+    assert 'ORDER BY "Eventos".id_evento' in sql
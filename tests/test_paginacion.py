@@ -0,0 +1,95 @@
+from typing import List
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel, TypeAdapter
+from app.core import config
+from app.core.paginacion import PESO_MEDIDA, Paginacion, limite_coleccion
+
+
+class Fila(BaseModel):
+    texto: str
+
+
+ADAPTADOR = TypeAdapter(List[Fila])
+
+
+@pytest.fixture(autouse=True)
+def presupuesto(monkeypatch):
+    monkeypatch.setattr(config, "PAGINACION_PRESUPUESTO_BYTES", 10_000)
+    monkeypatch.setattr(config, "PAGINACION_LIMITE_MAX", 5000)
+    monkeypatch.setattr(config, "COLECCION_LIMITE_MAX", 500)
+
+
+def test_pagina_dentro_del_presupuesto_se_materializa():
+    pagina = Paginacion(bytes_por_fila=100)(skip=20, limit=100)
+    assert (pagina.skip, pagina.limit, pagina.streaming) == (20, 100, False)
+
+
+def test_pagina_sobre_el_presupuesto_se_transmite_por_lotes():
+    assert Paginacion(bytes_por_fila=100)(skip=0, limit=101).streaming
+
+
+def test_sin_streaming_la_pagina_sobre_el_presupuesto_es_400():
+    paginacion = Paginacion(bytes_por_fila=100, streaming=False)
+    with pytest.raises(HTTPException) as error:
+        paginacion(skip=0, limit=101)
+    assert error.value.status_code == 400
+    assert "limit <= 100" in error.value.detail
+
+
+def test_limit_sobre_el_maximo_es_400():
+    with pytest.raises(HTTPException) as error:
+        Paginacion(bytes_por_fila=1)(skip=0, limit=5001)
+    assert error.value.status_code == 400
+
+
+def test_limite_presupuesto():
+    assert Paginacion(bytes_por_fila=300).limite_presupuesto == 33
+    # Filas mayores que todo el presupuesto: al menos una por página
+    assert Paginacion(bytes_por_fila=50_000).limite_presupuesto == 1
+
+
+def test_medir_acerca_la_estimacion_al_tamano_real():
+    paginacion = Paginacion(bytes_por_fila=100)
+    paginacion.medir(bytes_pagina=20_000, filas=100)
+    assert paginacion.bytes_por_fila == pytest.approx(100 + PESO_MEDIDA * (200 - 100))
+    for _ in range(50):
+        paginacion.medir(bytes_pagina=20_000, filas=100)
+    assert paginacion.bytes_por_fila == pytest.approx(200, rel=0.01)
+
+    # Una página vacía no dice nada del tamaño por fila
+    paginacion.medir(bytes_pagina=2, filas=0)
+    assert paginacion.bytes_por_fila == pytest.approx(200, rel=0.01)
+
+    # Con la estimación corregida, la misma página ya supera el presupuesto
+    assert paginacion(skip=0, limit=100).streaming
+
+
+def test_pagina_medida_informa_a_su_paginacion():
+    paginacion = Paginacion(bytes_por_fila=100)
+    pagina = paginacion(skip=0, limit=10)
+    pagina.medir(bytes_pagina=5000, filas=10)
+    assert paginacion.bytes_por_fila > 100
+
+
+def test_respuesta_rechaza_la_pagina_que_supera_el_presupuesto_real():
+    # La estimación (10 bytes por fila) no la detecta; el cuerpo serializado sí
+    paginacion = Paginacion(bytes_por_fila=10, streaming=False)
+    filas = [{"texto": "x" * 200} for _ in range(paginacion(skip=0, limit=100).limit)]
+    with pytest.raises(HTTPException) as error:
+        paginacion.respuesta(ADAPTADOR, filas)
+    assert error.value.status_code == 400
+    assert paginacion.bytes_por_fila > 10
+
+
+def test_respuesta_dentro_del_presupuesto():
+    respuesta = Paginacion(bytes_por_fila=10, streaming=False).respuesta(ADAPTADOR, [{"texto": "a"}])
+    assert respuesta.body == b'[{"texto":"a"}]'
+    assert respuesta.media_type == "application/json"
+
+
+def test_limite_coleccion():
+    assert limite_coleccion(limit=500) == 500
+    with pytest.raises(HTTPException) as error:
+        limite_coleccion(limit=501)
+    assert error.value.status_code == 400